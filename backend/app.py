@@ -1,14 +1,86 @@
-from flask import Flask, jsonify, send_from_directory
+from flask import Flask, Response, g, jsonify, request, send_from_directory
 from flask_cors import CORS
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import desc
-from database import engine, Event
+from archive import archive_boundary, iter_archived_events, needs_archives, read_archived_events, read_archives
+from broadcast import HEARTBEAT, RETRY_PREAMBLE, parse_last_event_id
+from cache import ResponseCache, cached_response
+from database import Session, read_data_version
+from metrics import API_QUERY_SECONDS, API_SERIALIZATION_SECONDS, CONTENT_TYPE, observe_request, render_metrics
+from queries import QueryError, build_events_query, parse_event_params
+from rollups import parse_rollup_params, query_rollups
+from scheduler import read_schedules
+from search import parse_search_params, search_events
+from serialization import (
+    STREAM_HEADER, encode_json, fragment_cache, render_page, render_stream_batch, stream_footer
+)
+from stats import compute_stats, parse_stats_params
+import broadcast
+import config
 import os
+import profiler
+import re
+import time
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-Session = sessionmaker(bind=engine)
+# Rows fetched per round trip when streaming large result sets
+STREAM_BATCH_SIZE = 500
+
+# Rendered API responses, invalidated whenever ingest bumps the data version
+response_cache = ResponseCache(max_entries=config.API_CACHE_ENTRIES)
+
+# Stats include a rolling 24 hour count, so cached copies also expire with time
+STATS_CACHE_TTL = 60
+
+def route_label():
+    """
+    The matched route pattern of the current request, such as
+    /api/events/latest/{limit}, used to label its metrics.
+    """
+    if request.url_rule is None:
+        return 'unmatched'
+    return re.sub(r'<(?:[^:<>]+:)?([^<>]+)>', r'{\1}', request.url_rule.rule)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """
+    Record the time and size of each response. Streamed responses are
+    recorded once their last chunk has been sent.
+    """
+    start_time = g.pop('request_start', None)
+    if start_time is None:
+        return response
+    route = route_label()
+    status = response.status_code
+    if not response.is_streamed:
+        observe_request(route, status, time.perf_counter() - start_time, response.content_length)
+        return response
+
+    chunks = response.response
+
+    def measured():
+        size = 0
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            observe_request(route, status, time.perf_counter() - start_time, size)
+
+    response.response = measured()
+    return response
+
+def current_data_version():
+    """Read the data version that ingest bumps on every insert."""
+    session = Session()
+    try:
+        return read_data_version(session)
+    finally:
+        session.close()
 
 @app.route('/')
 def index():
@@ -17,39 +89,66 @@ def index():
     """
     return send_from_directory('../frontend', 'index.html')
 
-@app.route('/api/events', methods=['GET'])
-def get_events():
+def stream_events(params, ndjson=False):
     """
-    Endpoint to retrieve all events from the database, ordered by most recent first.
+    Stream matching events without materializing the whole result set.
     
+    Args:
+        params (dict): Options accepted by queries.build_events_query
+        ndjson (bool): Emit one JSON object per line instead of a JSON document
+        
     Returns:
-        JSON: A list of events with id, title, location, datetime, channel, and status.
+        Response: A chunked response that reads rows in batches of STREAM_BATCH_SIZE,
+        from the events table, then from the archives
+    """
+    fields = params['fields']
+
+    def generate():
+        session = Session()
+        try:
+            archives = read_archives(session)
+            stmt = build_events_query(**params, after=archive_boundary(archives))
+            count = 0
+            if not ndjson:
+                yield STREAM_HEADER
+            for rows in session.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE)).partitions():
+                yield render_stream_batch(rows, fields, count == 0, ndjson)
+                count += len(rows)
+            if needs_archives(params, archives, count):
+                for rows in iter_archived_events(params, archives, STREAM_BATCH_SIZE):
+                    yield render_stream_batch(rows, fields, count == 0, ndjson)
+                    count += len(rows)
+            if not ndjson:
+                yield stream_footer(count)
+        finally:
+            session.close()
+
+    mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+    return Response(generate(), mimetype=mimetype)
+
+def query_events(params):
+    """
+    Run an events query and build a paginated JSON response. Pages past the
+    events table continue into the archives (see archive.py).
+    
+    Args:
+        params (dict): Options accepted by queries.build_events_query
+        
+    Returns:
+        JSON: The page of events and, when more may follow, the cursor for the next page
     """
     session = Session()
     try:
-        # Query all events from the database, ordered by datetime descending
-        events = session.query(Event).order_by(desc(Event.datetime)).all()
-
-        # Convert the events into a list of dictionaries
-        events_list = [
-            {
-                'id': event.id,
-                'title': event.title,
-                'location': event.location,
-                'datetime': event.datetime.strftime('%Y-%m-%d %H:%M:%S'),
-                'datetime_readable': event.datetime.strftime('%B %d, %Y at %I:%M %p'),
-                'channel': event.channel,
-                'status': event.status
-            }
-            for event in events
-        ]
-
-        # Return the events as JSON
-        return jsonify({
-            'success': True,
-            'count': len(events_list),
-            'events': events_list
-        })
+        route = route_label()
+        with API_QUERY_SECONDS.time(route=route):
+            archives = read_archives(session)
+            rows = session.execute(build_events_query(**params, after=archive_boundary(archives))).all()
+            if needs_archives(params, archives, len(rows)):
+                limit = None if params['limit'] is None else params['limit'] - len(rows)
+                rows += read_archived_events(params, archives, limit)
+        with API_SERIALIZATION_SECONDS.time(route=route):
+            body = render_page(rows, params)
+        return Response(body, mimetype='application/json')
     
     except Exception as e:
         return jsonify({
@@ -60,7 +159,75 @@ def get_events():
     finally:
         session.close()
 
+@app.route('/api/events', methods=['GET'])
+@cached_response(response_cache, current_data_version)
+def get_events():
+    """
+    Endpoint to retrieve events from the database, ordered by most recent first.
+    
+    Query parameters:
+        before: Cursor (`<datetime>,<id>`) returned as `next_cursor` by the previous page
+        limit: Page size; without it every matching event is streamed
+        since, until: ISO 8601 bounds on the event datetime
+        status, channel: Exact-match filters
+        q: Case-insensitive substring of the title
+        fields: Comma separated subset of id, title, location, datetime, channel, status
+        format: `ndjson` to stream one event per line
+    
+    Returns:
+        JSON: A list of events with id, title, location, datetime, channel, and status.
+    """
+    try:
+        params = parse_event_params(request.args)
+    except QueryError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    if request.args.get('format') == 'ndjson':
+        return stream_events(params, ndjson=True)
+    if params['limit'] is None:
+        return stream_events(params)
+    return query_events(params)
+
+@app.route('/api/events/stream')
+def stream_live_events():
+    """
+    Server-Sent Events stream of newly ingested and updated events.
+    
+    Each `events` message carries the rows changed by one ingest, with the
+    data version as its id. Reconnecting EventSource clients send it back as
+    Last-Event-ID (or `last_event_id` in the query string) to replay what they
+    missed; a `reset` message means too much was missed and the client should
+    reload through /api/events.
+    
+    Every open stream holds a worker thread here; serve many subscribers
+    from async_app.py instead.
+    
+    Returns:
+        Response: A text/event-stream response
+    """
+    broadcast.activate()
+    last_event_id = parse_last_event_id(
+        request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    )
+
+    def generate():
+        subscription = broadcast.hub.subscribe(last_event_id)
+        try:
+            yield RETRY_PREAMBLE
+            while not subscription.overflowed:
+                messages = subscription.get(config.STREAM_HEARTBEAT)
+                yield ''.join(messages) or HEARTBEAT
+        finally:
+            broadcast.hub.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/events/latest/<int:limit>')
+@cached_response(response_cache, current_data_version)
 def get_latest_events(limit):
     """
     Endpoint to retrieve the latest N events.
@@ -71,28 +238,78 @@ def get_latest_events(limit):
     Returns:
         JSON: A list of the latest events
     """
+    return query_events(parse_event_params({}, limit=limit))
+
+@app.route('/api/stats')
+@cached_response(response_cache, current_data_version, ttl=STATS_CACHE_TTL)
+def get_stats():
+    """
+    Endpoint to get statistics about the events.
+    
+    Query parameters:
+        since, until: ISO 8601 window for the breakdowns (all time by default)
+        bucket: `hour` or `day` to include a timeline of event counts
+    
+    Returns:
+        JSON: Statistics including total count, status, type and channel breakdowns, etc.
+    """
+    try:
+        params = parse_stats_params(request.args)
+    except QueryError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
     session = Session()
     try:
-        events = session.query(Event).order_by(desc(Event.datetime)).limit(limit).all()
-        
-        events_list = [
-            {
-                'id': event.id,
-                'title': event.title,
-                'location': event.location,
-                'datetime': event.datetime.strftime('%Y-%m-%d %H:%M:%S'),
-                'datetime_readable': event.datetime.strftime('%B %d, %Y at %I:%M %p'),
-                'channel': event.channel,
-                'status': event.status
-            }
-            for event in events
-        ]
-        
+        route = route_label()
+        with API_QUERY_SECONDS.time(route=route):
+            stats = compute_stats(session, **params)
+        with API_SERIALIZATION_SECONDS.time(route=route):
+            body = encode_json({'success': True, **stats})
+        return Response(body, mimetype='application/json')
+    
+    except Exception as e:
         return jsonify({
-            'success': True,
-            'count': len(events_list),
-            'events': events_list
-        })
+            'success': False,
+            'error': str(e)
+        }), 500
+    
+    finally:
+        session.close()
+
+@app.route('/api/rollups')
+@cached_response(response_cache, current_data_version, ttl=STATS_CACHE_TTL)
+def get_rollups():
+    """
+    Endpoint to get hourly or daily event counts from the rollup tables.
+    
+    Query parameters:
+        bucket: `hour` or `day` (default)
+        since, until: ISO 8601 window (the last day of hours or 30 days by default)
+        type, channel: Exact-match filters on incident type and channel
+        by: Comma separated dimensions (type, channel) to break buckets down by
+    
+    Returns:
+        JSON: Counts per bucket in ascending order
+    """
+    try:
+        params = parse_rollup_params(request.args)
+    except QueryError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    session = Session()
+    try:
+        route = route_label()
+        with API_QUERY_SECONDS.time(route=route):
+            rollups = query_rollups(session, **params)
+        with API_SERIALIZATION_SECONDS.time(route=route):
+            body = encode_json({'success': True, 'bucket': params['bucket'], 'rollups': rollups})
+        return Response(body, mimetype='application/json')
     
     except Exception as e:
         return jsonify({
@@ -103,37 +320,76 @@ def get_latest_events(limit):
     finally:
         session.close()
 
-@app.route('/api/stats')
-def get_stats():
+@app.route('/api/search')
+@cached_response(response_cache, current_data_version)
+def get_search():
     """
-    Endpoint to get statistics about the events.
+    Endpoint to search events by text and location.
+    
+    Query parameters:
+        q: Words that must all appear in the title or location
+        bbox: min_lon,min_lat,max_lon,max_lat box around geocoded events
+        near, radius: lat,lon point and radius in km (default 1) around geocoded events
+        since, until: ISO 8601 window
+        limit: Page size (default 50)
+        before: Cursor returned as next_cursor by the previous page
     
     Returns:
-        JSON: Statistics including total count, status breakdown, etc.
+        JSON: Matching events, most recently inserted first, with coordinates
     """
+    try:
+        params = parse_search_params(request.args)
+    except QueryError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
     session = Session()
     try:
-        total_events = session.query(Event).count()
-        
-        # Get status breakdown
-        status_counts = {}
-        statuses = session.query(Event.status).distinct().all()
-        for status_tuple in statuses:
-            status = status_tuple[0]
-            count = session.query(Event).filter(Event.status == status).count()
-            status_counts[status] = count
-        
-        # Get recent activity (last 24 hours)
-        from datetime import datetime, timedelta
-        yesterday = datetime.now() - timedelta(days=1)
-        recent_count = session.query(Event).filter(Event.datetime >= yesterday).count()
-        
+        route = route_label()
+        with API_QUERY_SECONDS.time(route=route):
+            result = search_events(session, **params)
+        with API_SERIALIZATION_SECONDS.time(route=route):
+            body = encode_json(result)
+        return Response(body, mimetype='application/json')
+    
+    except Exception as e:
         return jsonify({
-            'success': True,
-            'total_events': total_events,
-            'status_breakdown': status_counts,
-            'recent_24h': recent_count
-        })
+            'success': False,
+            'error': str(e)
+        }), 500
+    
+    finally:
+        session.close()
+
+@app.route('/api/cache')
+def get_cache_stats():
+    """
+    Endpoint to inspect the response cache.
+    
+    Returns:
+        JSON: Entry count, capacity and hit/miss/eviction counters
+    """
+    return jsonify({
+        'success': True,
+        'data_version': current_data_version(),
+        **response_cache.stats(),
+        'serialization': fragment_cache.stats()
+    })
+
+@app.route('/api/scraper')
+def get_scraper_schedule():
+    """
+    Endpoint to inspect the scraper's adaptive schedule.
+    
+    Returns:
+        JSON: Per source, the current interval, recent change rate, failure
+        streak and the times of the last and next scrape
+    """
+    session = Session()
+    try:
+        return jsonify({'success': True, 'sources': read_schedules(session)})
     
     except Exception as e:
         return jsonify({
@@ -144,6 +400,39 @@ def get_stats():
     finally:
         session.close()
 
+@app.route('/metrics')
+def get_metrics():
+    """
+    Endpoint for Prometheus to scrape.
+    
+    Returns:
+        Response: Scraper stage and API route metrics of every process, in the
+        Prometheus text format
+    """
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+@app.route('/debug/profile')
+def get_profile():
+    """
+    Endpoint to sample the stacks of this worker, when PROFILER_ENABLED is set.
+    
+    Query parameters:
+        seconds: How long to sample (default 10, at most PROFILER_MAX_SECONDS)
+    
+    Returns:
+        Response: Folded stacks for flamegraph.pl or speedscope
+    """
+    if not config.PROFILER_ENABLED:
+        return not_found(None)
+    try:
+        seconds = profiler.parse_duration(request.args.get('seconds'))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    return Response(profiler.profile(seconds).folded(), mimetype='text/plain')
+
 # Backwards compatibility endpoints (without /api prefix)
 @app.route('/events', methods=['GET'])
 def get_events_legacy():
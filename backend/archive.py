@@ -0,0 +1,463 @@
+"""
+Retention: moves events older than RETENTION_DAYS out of the events table
+into monthly archives, so the table the API queries stays small.
+
+    python archive.py                  # archive old events, then reclaim the freed space
+    python archive.py --days 90        # keep 90 days instead of RETENTION_DAYS
+    python archive.py --list           # archived months and their row counts
+    python archive.py --vacuum         # one-time VACUUM enabling incremental vacuum
+
+On SQLite each month is a database file in ARCHIVE_DIR (events-2024-01.db),
+on PostgreSQL a schema (events_archive_2024_01). Either holds events,
+event_units, units and unit_states tables in the main schema's layout, so
+build_events_query runs against it unchanged. The event_archives table of the
+main database lists the months and the newest datetime archived in each.
+
+Events move in batches of ARCHIVE_BATCH_SIZE, oldest first. Each batch is
+copied into the archives of its months, then deleted from events, together
+with its event_units and event_points rows, in the transaction that also
+advances event_archives. Queries read archived events up to the newest
+archived datetime and the events table after it, so an interrupted run never
+shows an event twice or loses one; the next run picks up where it stopped.
+An event is only deleted once its copy has been read back from the archive
+and it has not changed since; a changed one is copied again by the next run.
+An archive holding another incident under the same id fails the batch.
+Events inserted later with an older datetime (a backfill, say) are only
+visible once archived.
+
+The scraper runs this every ARCHIVE_INTERVAL seconds for at most
+ARCHIVE_RUN_BUDGET seconds, then returns freed pages to the filesystem with
+PRAGMA incremental_vacuum, a few at a time, so writers are never locked out
+for long. Geocodes, rollups and the running counters are kept: /api/stats
+all-time totals and /api/rollups still cover the archived history, while
+search and windowed stats only cover the events table.
+"""
+from sqlalchemy import bindparam, delete, func, select, text
+from contextlib import contextmanager
+from collections import defaultdict
+from datetime import datetime, timedelta
+import argparse
+import logging
+import os
+import threading
+import time
+
+from database import (
+    Base, Event, EventArchive, EventUnit, Unit, UnitState, bump_data_version, create_database_engine,
+    engine, event_points, insert
+)
+from queries import build_events_query
+from rollups import compact_rollups
+import config
+
+logger = logging.getLogger(__name__)
+
+# Tables every monthly archive holds
+ARCHIVE_TABLES = [Event.__table__, EventUnit.__table__, Unit.__table__, UnitState.__table__]
+
+# Longest a retention run started by the scraper takes before yielding, in seconds;
+# an unfinished run carries on after the next cycle
+ARCHIVE_RUN_BUDGET = 30
+
+def archive_directory():
+    """ARCHIVE_DIR, or an `archive` directory next to the SQLite database file."""
+    if config.ARCHIVE_DIR:
+        return config.ARCHIVE_DIR
+    database_path = engine.url.database or ''
+    return os.path.join(os.path.dirname(os.path.abspath(database_path)), 'archive')
+
+def archive_name(month):
+    """Name of a month's archive: a file name on SQLite, a schema name on PostgreSQL."""
+    if engine.dialect.name == 'postgresql':
+        return f"events_archive_{month.replace('-', '_')}"
+    return f"events-{month}.db"
+
+_archive_engines = {}
+_archive_engines_lock = threading.Lock()
+
+def _archive_engine(month):
+    """The engine of a month's SQLite archive file, created on first use."""
+    with _archive_engines_lock:
+        archive_engine = _archive_engines.get(month)
+        if archive_engine is None:
+            path = os.path.join(archive_directory(), archive_name(month))
+            archive_engine = _archive_engines[month] = create_database_engine(f"sqlite:///{path}")
+        return archive_engine
+
+@contextmanager
+def archive_connection(month, create=False):
+    """
+    Connect to a month's archive, in which the events, event_units, units and
+    unit_states tables are the archived ones.
+
+    Args:
+        month (str): YYYY-MM
+        create (bool): Create the archive and its tables if missing
+    """
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as connection:
+            connection = connection.execution_options(schema_translate_map={None: archive_name(month)})
+            if create:
+                connection.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{archive_name(month)}"'))
+                Base.metadata.create_all(connection, tables=ARCHIVE_TABLES)
+                connection.commit()
+            yield connection
+        return
+
+    if create:
+        os.makedirs(archive_directory(), exist_ok=True)
+        Base.metadata.create_all(_archive_engine(month), tables=ARCHIVE_TABLES)
+    with _archive_engine(month).connect() as connection:
+        yield connection
+
+def read_archives(session):
+    """
+    Returns:
+        list: A dict per archived month (month, first_datetime, last_datetime),
+        newest first; empty when nothing has been archived
+    """
+    rows = session.execute(
+        select(EventArchive.month, EventArchive.first_datetime, EventArchive.last_datetime)
+        .order_by(EventArchive.month.desc())
+    ).mappings().all()
+    return [dict(row) for row in rows]
+
+def archive_boundary(archives):
+    """Newest archived datetime; events after it are in the events table."""
+    return max((archive['last_datetime'] for archive in archives), default=None)
+
+def needs_archives(params, archives, fetched):
+    """
+    Whether a query must also read archived events.
+
+    Args:
+        params (dict): Options the query was built from
+        archives (list): As returned by read_archives
+        fetched (int): Rows the events table returned
+    """
+    if not archives or (params['limit'] is not None and fetched >= params['limit']):
+        return False
+    return params['since'] is None or params['since'] <= archive_boundary(archives)
+
+def _month_overlaps(archive, params):
+    """Whether a month's archive can hold events matching the query's time bounds."""
+    if params['since'] is not None and archive['last_datetime'] < params['since']:
+        return False
+    if params['until'] is not None and archive['first_datetime'] >= params['until']:
+        return False
+    if params['before'] is not None and archive['first_datetime'] > params['before'][0]:
+        return False
+    return True
+
+def read_archived_events(params, archives, limit=None):
+    """
+    Run an events query against the archives, newest month first.
+
+    Args:
+        params (dict): Options accepted by queries.build_events_query
+        archives (list): As returned by read_archives
+        limit (int): Most rows to return; None for all
+
+    Returns:
+        list: Rows shaped like those of the events table, most recent first,
+        all older than any event left in the events table
+    """
+    boundary = archive_boundary(archives)
+    rows = []
+    for archive in archives:
+        if not _month_overlaps(archive, params):
+            continue
+        remaining = None if limit is None else limit - len(rows)
+        stmt = build_events_query(**dict(params, limit=remaining), through=boundary)
+        with archive_connection(archive['month']) as connection:
+            rows.extend(connection.execute(stmt).all())
+        if limit is not None and len(rows) >= limit:
+            break
+    return rows
+
+def iter_archived_events(params, archives, batch_size):
+    """
+    Run an unlimited events query against the archives, batch_size rows at a
+    time, each batch continuing from the last row of the previous one.
+
+    Yields:
+        list: Rows, most recent first
+    """
+    params = dict(params)
+    while True:
+        rows = read_archived_events(params, archives, batch_size)
+        if rows:
+            yield rows
+        if len(rows) < batch_size:
+            return
+        params['before'] = (rows[-1].datetime, rows[-1].id)
+
+def _batch_edge(connection, cutoff, batch_size):
+    """
+    Datetime before which the next batch of events to archive lies: the
+    cutoff or, when more than batch_size events are older, the datetime of the
+    first event past the batch, so that events sharing a datetime are archived
+    together. None when nothing is older than the cutoff.
+    """
+    events = Event.__table__
+    older = select(events.c.datetime).where(events.c.datetime < cutoff).order_by(events.c.datetime)
+    first = connection.execute(older.limit(1)).scalar()
+    if first is None:
+        return None
+    edge = connection.execute(older.offset(batch_size).limit(1)).scalar()
+    if edge == first:
+        # More than a batch of events share the oldest datetime
+        edge = connection.execute(
+            select(func.min(events.c.datetime)).where(events.c.datetime > first, events.c.datetime < cutoff)
+        ).scalar()
+    return edge or cutoff
+
+class ArchiveConflictError(Exception):
+    """A month's archive holds another incident under the id of an event being archived."""
+
+def _copy_to_archive(month, rows, units):
+    """
+    Copy events and their unit rows into a month's archive. Copies of the same
+    incidents, left by an interrupted run or older versions of changed events,
+    are replaced.
+
+    Raises:
+        ArchiveConflictError: If an id is taken by another incident; nothing is copied then
+    """
+    ids = [row['id'] for row in rows]
+    unit_ids = {row['unit_id'] for row in units}
+    state_ids = {row['state_id'] for row in units}
+    with engine.connect() as connection:
+        names = {
+            model: connection.execute(select(model.id, model.name).where(model.id.in_(model_ids))).mappings().all()
+            for model, model_ids in ((Unit, unit_ids), (UnitState, state_ids)) if model_ids
+        }
+    archived = Event.__table__
+    with archive_connection(month, create=True) as connection:
+        for model, rows_to_copy in names.items():
+            connection.execute(insert(model).on_conflict_do_nothing(), [dict(row) for row in rows_to_copy])
+        stmt = insert(Event)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=['id'],
+            set_={column.name: stmt.excluded[column.name] for column in archived.columns if column.name != 'id'},
+            where=archived.c.incident_key == stmt.excluded.incident_key
+        ), [dict(row) for row in rows])
+        stored = dict(connection.execute(
+            select(archived.c.id, archived.c.incident_key).where(archived.c.id.in_(ids))
+        ).all())
+        conflicts = [row['id'] for row in rows if stored.get(row['id']) != row['incident_key']]
+        if conflicts:
+            connection.rollback()
+            raise ArchiveConflictError(f"Archive {month} holds other events under ids {conflicts[:10]}")
+        connection.execute(delete(EventUnit).where(EventUnit.event_id.in_(ids)))
+        if units:
+            connection.execute(insert(EventUnit), [dict(row) for row in units])
+        connection.commit()
+
+def archive_batch(cutoff, batch_size=None):
+    """
+    Move the oldest batch of events older than `cutoff` into the archives.
+
+    Returns:
+        int: Events moved; 0 when none are older than the cutoff, or all of
+        them changed while being copied
+
+    Raises:
+        ArchiveConflictError: If an archive holds another incident under one of the batch's ids
+    """
+    batch_size = batch_size or config.ARCHIVE_BATCH_SIZE
+    events = Event.__table__
+    with engine.connect() as connection:
+        edge = _batch_edge(connection, cutoff, batch_size)
+        if edge is None:
+            return 0
+        rows = connection.execute(
+            select(events).where(events.c.datetime < edge).order_by(events.c.datetime, events.c.id)
+        ).mappings().all()
+        ids = [row['id'] for row in rows]
+        units = connection.execute(
+            select(EventUnit.__table__).where(EventUnit.event_id.in_(ids))
+        ).mappings().all()
+
+    months = defaultdict(list)
+    for row in rows:
+        months[row['datetime'].strftime('%Y-%m')].append(row)
+    units_by_event = defaultdict(list)
+    for row in units:
+        units_by_event[row['event_id']].append(row)
+    for month, month_rows in months.items():
+        _copy_to_archive(month, month_rows,
+                         [unit for row in month_rows for unit in units_by_event[row['id']]])
+
+    # Scalar min/max of two values
+    least, greatest = (func.least, func.greatest) if engine.dialect.name == 'postgresql' else (func.min, func.max)
+    with engine.begin() as connection:
+        # Only rows unchanged since they were copied; the archive holds an older version of the others
+        connection.execute(
+            delete(events).where(events.c.id == bindparam('row_id'),
+                                 events.c.data_version.is_not_distinct_from(bindparam('version'))),
+            [{'row_id': row['id'], 'version': row['data_version']} for row in rows]
+        )
+        kept = set(connection.execute(select(events.c.id).where(events.c.id.in_(ids))).scalars())
+        moved = [event_id for event_id in ids if event_id not in kept]
+        connection.execute(delete(EventUnit).where(EventUnit.event_id.in_(moved)))
+        connection.execute(delete(event_points).where(event_points.c.id.in_(moved)))
+        for month, month_rows in months.items():
+            first, last = month_rows[0]['datetime'], month_rows[-1]['datetime']
+            stmt = insert(EventArchive).values(month=month, first_datetime=first, last_datetime=last,
+                                               archived_at=datetime.now())
+            connection.execute(stmt.on_conflict_do_update(index_elements=['month'], set_={
+                'first_datetime': least(EventArchive.first_datetime, stmt.excluded.first_datetime),
+                'last_datetime': greatest(EventArchive.last_datetime, stmt.excluded.last_datetime),
+                'archived_at': stmt.excluded.archived_at
+            }))
+        # Cached responses may include the moved events' search and stats entries
+        bump_data_version(connection)
+    return len(moved)
+
+def archive_events(retention_days=None, batch_size=None, budget=None, now=None):
+    """
+    Archive every event older than the retention period.
+
+    Args:
+        retention_days (int): Days of events to keep; defaults to RETENTION_DAYS
+        batch_size (int): Events moved per transaction; defaults to ARCHIVE_BATCH_SIZE
+        budget (float): Seconds after which to stop between batches; None runs to the end
+        now (datetime): Reference time for the cutoff
+
+    Returns:
+        tuple: (events moved, whether older events remain)
+    """
+    retention_days = config.RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return 0, False
+    cutoff = (now or datetime.now()) - timedelta(days=retention_days)
+    # Archived events are out of reach of the incremental rollup compaction
+    compact_rollups()
+
+    start_time = time.monotonic()
+    moved = 0
+    while True:
+        count = archive_batch(cutoff, batch_size)
+        moved += count
+        if not count:
+            return moved, False
+        if budget is not None and time.monotonic() - start_time >= budget:
+            return moved, True
+
+def incremental_vacuum_enabled():
+    """Whether the SQLite database returns freed pages through incremental_vacuum."""
+    if engine.dialect.name != 'sqlite':
+        return False
+    with engine.connect() as connection:
+        return connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2
+
+def reclaim_space(pages=None, budget=None):
+    """
+    Return free pages of the SQLite database to the filesystem, `pages` at a
+    time, each step in its own short transaction. PostgreSQL's autovacuum
+    makes the space reusable on its own.
+
+    Returns:
+        int: Pages released
+    """
+    if not incremental_vacuum_enabled():
+        return 0
+    pages = pages or config.ARCHIVE_VACUUM_PAGES
+    start_time = time.monotonic()
+    released = 0
+    connection = engine.raw_connection()
+    try:
+        sqlite_connection = connection.driver_connection
+        while True:
+            free = sqlite_connection.execute("PRAGMA freelist_count").fetchone()[0]
+            if not free or (budget is not None and time.monotonic() - start_time >= budget):
+                return released
+            # execute() steps the pragma once, releasing a single page; executescript runs it to the end
+            sqlite_connection.executescript(f"PRAGMA incremental_vacuum({pages});")
+            released += min(free, pages)
+    finally:
+        connection.close()
+
+def enable_incremental_vacuum():
+    """
+    Switch an existing SQLite database to incremental auto-vacuum. Databases
+    created since archive.py existed already use it. This rewrites the whole
+    file under an exclusive lock, so run it once, while the scraper is stopped.
+    """
+    with engine.connect() as connection:
+        connection.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        connection.exec_driver_sql("VACUUM")
+
+class RetentionJob:
+    """
+    Runs the retention policy from the scraper every ARCHIVE_INTERVAL seconds,
+    in slices of at most ARCHIVE_RUN_BUDGET seconds.
+    """
+
+    def __init__(self, interval=None):
+        self.interval = interval or config.ARCHIVE_INTERVAL
+        self.next_due = time.monotonic()
+        self._lock = threading.Lock()
+
+    def run_if_due(self):
+        """
+        Archive and reclaim space if a run is due, logging rather than raising.
+
+        Returns:
+            int: Events archived
+        """
+        if config.RETENTION_DAYS <= 0 or time.monotonic() < self.next_due:
+            return 0
+        if not self._lock.acquire(blocking=False):
+            return 0
+        try:
+            moved, unfinished = archive_events(budget=ARCHIVE_RUN_BUDGET)
+            released = 0 if unfinished else reclaim_space(budget=ARCHIVE_RUN_BUDGET)
+            if moved or released:
+                logger.info(f"Archived {moved} events, released {released} free pages")
+            # An unfinished run continues after the next cycle
+            self.next_due = time.monotonic() + (0 if unfinished else self.interval)
+            return moved
+        except Exception as e:
+            logger.error(f"Archiving failed: {e}")
+            self.next_due = time.monotonic() + self.interval
+            return 0
+        finally:
+            self._lock.release()
+
+def count_archived_events(month):
+    """Events stored in a month's archive."""
+    with archive_connection(month) as connection:
+        return connection.execute(select(func.count()).select_from(Event)).scalar_one()
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Move old events into monthly archives")
+    parser.add_argument('--days', type=int, default=config.RETENTION_DAYS,
+                        help="Days of events to keep in the events table (default RETENTION_DAYS)")
+    parser.add_argument('--list', action='store_true', help="List the archived months")
+    parser.add_argument('--vacuum', action='store_true',
+                        help="Rewrite the SQLite database once so that freed space can be reclaimed incrementally")
+    args = parser.parse_args()
+
+    if args.list:
+        with engine.connect() as connection:
+            archives = read_archives(connection)
+        for archive in archives:
+            print(f"{archive['month']}  {count_archived_events(archive['month']):>9} events  "
+                  f"{archive['first_datetime']} - {archive['last_datetime']}")
+    elif args.vacuum:
+        enable_incremental_vacuum()
+        logger.info("Incremental vacuum enabled")
+    else:
+        if args.days <= 0:
+            raise SystemExit("Set RETENTION_DAYS or pass --days to archive events")
+        start_time = time.perf_counter()
+        moved, _ = archive_events(args.days)
+        logger.info(f"Archived {moved} events in {time.perf_counter() - start_time:.2f} seconds")
+        if engine.dialect.name == 'sqlite' and not incremental_vacuum_enabled():
+            logger.warning("The database does not use incremental vacuum; run archive.py --vacuum once "
+                           "to return freed space to the filesystem")
+        else:
+            logger.info(f"Released {reclaim_space()} free pages")
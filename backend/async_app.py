@@ -0,0 +1,426 @@
+"""
+asyncio variant of the events API, served by uvicorn instead of gunicorn.
+
+Exposes the same endpoints and payloads as app.py, built from the same query
+and serialization code, but database access goes through an asyncio driver
+(aiosqlite or asyncpg), so a request waiting on the database or on a slow
+client does not hold a worker thread:
+
+    uvicorn async_app:app --workers 4
+    python serve.py --async
+"""
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Match, Route
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from contextlib import asynccontextmanager
+from functools import wraps
+from archive import archive_boundary, needs_archives, read_archived_events, read_archives
+from broadcast import HEARTBEAT, RETRY_PREAMBLE, AsyncSubscription, parse_last_event_id
+from cache import ResponseCache, cache_key, stream_etag
+from compression import choose_encoding, compress_stream_async, encoded_body, representation_etag
+from database import create_async_database_engine, read_data_version
+from metrics import API_QUERY_SECONDS, API_SERIALIZATION_SECONDS, CONTENT_TYPE, observe_request, render_metrics
+from profiler import SamplingProfiler, parse_duration
+from queries import QueryError, build_events_query, parse_event_params
+from rollups import parse_rollup_params, query_rollups
+from scheduler import read_schedules
+from search import parse_search_params, search_events
+from serialization import (
+    STREAM_HEADER, encode_json, fragment_cache, render_page, render_stream_batch, stream_footer
+)
+from stats import compute_stats, parse_stats_params
+import asyncio
+import broadcast
+import config
+import os
+import re
+import time
+
+async_engine = create_async_database_engine()
+AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+# Rows fetched per round trip when streaming large result sets
+STREAM_BATCH_SIZE = 500
+
+# Rendered API responses, invalidated whenever ingest bumps the data version
+response_cache = ResponseCache(max_entries=config.API_CACHE_ENTRIES)
+
+# Stats include a rolling 24 hour count, so cached copies also expire with time
+STATS_CACHE_TTL = 60
+
+FRONTEND_INDEX = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend', 'index.html')
+
+async def current_data_version():
+    """Read the data version that ingest bumps on every insert."""
+    async with AsyncSession() as session:
+        return await session.run_sync(read_data_version)
+
+def error_response(message, status_code):
+    """JSON error body in the same shape as the Flask app's."""
+    return JSONResponse({'success': False, 'error': message}, status_code=status_code)
+
+def _etag_matches(request, etag):
+    """Check the request's If-None-Match header against a strong ETag."""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or f'"{etag}"' in tags
+
+def _entry_response(request, entry):
+    """
+    Build a response for a cache entry, compressed if the client accepts it,
+    honouring If-None-Match.
+    """
+    body, encoding = encoded_body(entry, choose_encoding(request.headers.get('accept-encoding')))
+    etag = representation_etag(entry['etag'], encoding)
+    headers = {'ETag': f'"{etag}"', 'Vary': 'Accept-Encoding'}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if encoding is not None:
+        headers['Content-Encoding'] = encoding
+    return Response(body, media_type=entry['mimetype'], headers=headers)
+
+def cached_response(cache, get_version, ttl=None):
+    """
+    Async counterpart of cache.cached_response for Starlette endpoints.
+
+    Args:
+        cache (ResponseCache): Cache to store rendered responses in
+        get_version (callable): Coroutine function returning the current data version
+        ttl (float): Optional lifetime in seconds for clock-dependent views
+
+    Returns:
+        callable: The decorator
+    """
+    def decorator(endpoint):
+        @wraps(endpoint)
+        async def wrapper(request):
+            key = cache_key(request.url.path, request.query_params.multi_items())
+            version = await get_version()
+
+            entry = cache.get(key, version)
+            if entry is not None:
+                return _entry_response(request, entry)
+
+            response = await endpoint(request)
+            if response.status_code != 200:
+                return response
+
+            if isinstance(response, StreamingResponse):
+                # The row generator has not started yet, so a 304 reads nothing
+                encoding = choose_encoding(request.headers.get('accept-encoding'))
+                etag = representation_etag(stream_etag(key, version), encoding)
+                if _etag_matches(request, etag):
+                    return Response(status_code=304, headers={'ETag': f'"{etag}"', 'Vary': 'Accept-Encoding'})
+                if encoding is not None:
+                    response.body_iterator = compress_stream_async(response.body_iterator, encoding)
+                    response.headers['Content-Encoding'] = encoding
+                response.headers['ETag'] = f'"{etag}"'
+                response.headers['Vary'] = 'Accept-Encoding'
+                return response
+
+            entry = cache.put(key, version, response.body, response.media_type, ttl)
+            return _entry_response(request, entry)
+        return wrapper
+    return decorator
+
+def stream_events(params, ndjson=False):
+    """
+    Stream matching events without materializing the whole result set.
+
+    Args:
+        params (dict): Options accepted by queries.build_events_query
+        ndjson (bool): Emit one JSON object per line instead of a JSON document
+
+    Returns:
+        StreamingResponse: A chunked response that reads rows in batches of STREAM_BATCH_SIZE
+
+    Each batch is a separate keyset-paginated query on a short-lived session,
+    so a slow client holds no pooled connection while its socket drains.
+    Batches past the events table are read from the archives.
+    """
+    fields = params['fields']
+
+    async def generate():
+        count = 0
+        batch_params = dict(params)
+        async with AsyncSession() as session:
+            archives = await session.run_sync(read_archives)
+        boundary = archive_boundary(archives)
+        archived = False
+        if not ndjson:
+            yield STREAM_HEADER
+        while True:
+            remaining = None if params['limit'] is None else params['limit'] - count
+            batch_params['limit'] = STREAM_BATCH_SIZE if remaining is None else min(STREAM_BATCH_SIZE, remaining)
+            if batch_params['limit'] <= 0:
+                break
+            if archived:
+                # The archives are read through the synchronous engine
+                rows = await asyncio.to_thread(read_archived_events, batch_params, archives, batch_params['limit'])
+            else:
+                async with AsyncSession() as session:
+                    rows = (await session.execute(build_events_query(**batch_params, after=boundary))).all()
+            yield render_stream_batch(rows, fields, count == 0, ndjson)
+            count += len(rows)
+            if rows:
+                batch_params['before'] = (rows[-1].datetime, rows[-1].id)
+            if len(rows) < batch_params['limit']:
+                if archived or not needs_archives(params, archives, count):
+                    break
+                archived = True
+        if not ndjson:
+            yield stream_footer(count)
+
+    media_type = 'application/x-ndjson' if ndjson else 'application/json'
+    return StreamingResponse(generate(), media_type=media_type)
+
+async def query_events(params, route):
+    """
+    Run an events query and build a paginated JSON response. Pages past the
+    events table continue into the archives (see archive.py).
+
+    Args:
+        params (dict): Options accepted by queries.build_events_query
+        route (str): Route pattern the query's metrics are labelled with
+
+    Returns:
+        JSONResponse: The page of events and, when more may follow, the cursor for the next page
+    """
+    try:
+        with API_QUERY_SECONDS.time(route=route):
+            async with AsyncSession() as session:
+                archives = await session.run_sync(read_archives)
+                rows = (await session.execute(build_events_query(**params, after=archive_boundary(archives)))).all()
+            if needs_archives(params, archives, len(rows)):
+                limit = None if params['limit'] is None else params['limit'] - len(rows)
+                rows += await asyncio.to_thread(read_archived_events, params, archives, limit)
+        with API_SERIALIZATION_SECONDS.time(route=route):
+            body = render_page(rows, params)
+        return Response(body, media_type='application/json')
+    except Exception as e:
+        return error_response(str(e), 500)
+
+async def index(request):
+    """Serve the main frontend page."""
+    return FileResponse(FRONTEND_INDEX)
+
+@cached_response(response_cache, current_data_version)
+async def get_events(request):
+    """Same as app.get_events: filtered, cursor-paginated or streamed events."""
+    try:
+        params = parse_event_params(request.query_params)
+    except QueryError as e:
+        return error_response(str(e), 400)
+
+    if request.query_params.get('format') == 'ndjson':
+        return stream_events(params, ndjson=True)
+    if params['limit'] is None:
+        return stream_events(params)
+    return await query_events(params, route_label(request))
+
+async def stream_live_events(request):
+    """Same as app.stream_live_events, without holding a thread per subscriber."""
+    broadcast.activate()
+    last_event_id = parse_last_event_id(
+        request.headers.get('last-event-id') or request.query_params.get('last_event_id')
+    )
+
+    async def generate():
+        subscription = broadcast.hub.subscribe(last_event_id, AsyncSubscription)
+        try:
+            yield RETRY_PREAMBLE
+            while not subscription.overflowed:
+                messages = await subscription.get(config.STREAM_HEARTBEAT)
+                yield ''.join(messages) or HEARTBEAT
+        finally:
+            broadcast.hub.unsubscribe(subscription)
+
+    return StreamingResponse(generate(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@cached_response(response_cache, current_data_version)
+async def get_latest_events(request):
+    """Same as app.get_latest_events: the latest N events."""
+    return await query_events(parse_event_params({}, limit=request.path_params['limit']), route_label(request))
+
+@cached_response(response_cache, current_data_version, ttl=STATS_CACHE_TTL)
+async def get_stats(request):
+    """Same as app.get_stats, with compute_stats run on the async connection."""
+    try:
+        params = parse_stats_params(request.query_params)
+    except QueryError as e:
+        return error_response(str(e), 400)
+
+    route = route_label(request)
+    try:
+        with API_QUERY_SECONDS.time(route=route):
+            async with AsyncSession() as session:
+                stats = await session.run_sync(compute_stats, **params)
+        with API_SERIALIZATION_SECONDS.time(route=route):
+            body = encode_json({'success': True, **stats})
+        return Response(body, media_type='application/json')
+    except Exception as e:
+        return error_response(str(e), 500)
+
+@cached_response(response_cache, current_data_version, ttl=STATS_CACHE_TTL)
+async def get_rollups(request):
+    """Same as app.get_rollups: hourly or daily counts from the rollup tables."""
+    try:
+        params = parse_rollup_params(request.query_params)
+    except QueryError as e:
+        return error_response(str(e), 400)
+
+    route = route_label(request)
+    try:
+        with API_QUERY_SECONDS.time(route=route):
+            async with AsyncSession() as session:
+                rollups = await session.run_sync(query_rollups, **params)
+        with API_SERIALIZATION_SECONDS.time(route=route):
+            body = encode_json({'success': True, 'bucket': params['bucket'], 'rollups': rollups})
+        return Response(body, media_type='application/json')
+    except Exception as e:
+        return error_response(str(e), 500)
+
+@cached_response(response_cache, current_data_version)
+async def get_search(request):
+    """Same as app.get_search: events matching text and location filters."""
+    try:
+        params = parse_search_params(request.query_params)
+    except QueryError as e:
+        return error_response(str(e), 400)
+
+    route = route_label(request)
+    try:
+        with API_QUERY_SECONDS.time(route=route):
+            async with AsyncSession() as session:
+                result = await session.run_sync(search_events, **params)
+        with API_SERIALIZATION_SECONDS.time(route=route):
+            body = encode_json(result)
+        return Response(body, media_type='application/json')
+    except Exception as e:
+        return error_response(str(e), 500)
+
+async def get_cache_stats(request):
+    """Entry count, capacity and hit/miss/eviction counters of the response cache."""
+    return JSONResponse({
+        'success': True,
+        'data_version': await current_data_version(),
+        **response_cache.stats(),
+        'serialization': fragment_cache.stats()
+    })
+
+async def get_scraper_schedule(request):
+    """Same as app.get_scraper_schedule: the scraper's adaptive schedule per source."""
+    try:
+        async with AsyncSession() as session:
+            schedules = await session.run_sync(read_schedules)
+        return JSONResponse({'success': True, 'sources': schedules})
+    except Exception as e:
+        return error_response(str(e), 500)
+
+async def get_metrics(request):
+    """Same as app.get_metrics: metrics of every process in the Prometheus text format."""
+    return Response(render_metrics(), headers={'Content-Type': CONTENT_TYPE})
+
+async def get_profile(request):
+    """Same as app.get_profile, sampling while the event loop keeps serving."""
+    if not config.PROFILER_ENABLED:
+        return await not_found(request, None)
+    try:
+        seconds = parse_duration(request.query_params.get('seconds'))
+    except ValueError as e:
+        return error_response(str(e), 400)
+    with SamplingProfiler() as profiler:
+        await asyncio.sleep(seconds)
+    return Response(profiler.folded(), media_type='text/plain')
+
+async def not_found(request, exc):
+    """Handle 404 errors by returning JSON instead of HTML"""
+    return error_response('Endpoint not found', 404)
+
+async def internal_error(request, exc):
+    """Handle 500 errors by returning JSON instead of HTML"""
+    return error_response('Internal server error', 500)
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await async_engine.dispose()
+
+routes = [
+    Route('/', index),
+    Route('/api/events', get_events),
+    Route('/api/events/stream', stream_live_events),
+    Route('/api/events/latest/{limit:int}', get_latest_events),
+    Route('/api/stats', get_stats),
+    Route('/api/rollups', get_rollups),
+    Route('/api/search', get_search),
+    Route('/api/cache', get_cache_stats),
+    Route('/api/scraper', get_scraper_schedule),
+    Route('/metrics', get_metrics),
+    Route('/debug/profile', get_profile),
+    # Backwards compatibility endpoints (without /api prefix)
+    Route('/events', get_events),
+    Route('/events/latest/{limit:int}', get_latest_events),
+    Route('/stats', get_stats)
+]
+
+# Metric label of each route, with parameters written as in app.route_label: {limit}
+route_labels = [(route, re.sub(r'\{([^:{}]+)(?::[^{}]+)?\}', r'{\1}', route.path)) for route in routes]
+
+def route_label(request_or_scope):
+    """The pattern of the route matching a request, used to label its metrics."""
+    scope = getattr(request_or_scope, 'scope', request_or_scope)
+    for route, label in route_labels:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return label
+    return 'unmatched'
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the time and size of each response, the
+    counterpart of app.record_request_metrics. Streamed responses are
+    recorded once their last chunk has been sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def measured_send(message):
+            nonlocal status, size
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                size += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, measured_send)
+        finally:
+            observe_request(route_label(scope), status, time.perf_counter() - start_time, size)
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*']), Middleware(MetricsMiddleware)],
+    exception_handlers={404: not_found, 500: internal_error},
+    lifespan=lifespan
+)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=5000)
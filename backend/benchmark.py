@@ -0,0 +1,919 @@
+"""
+Micro-benchmarks for the scraper and API hot paths.
+
+Run from the backend directory, e.g.:
+
+    python benchmark.py parse --rows 500
+    python benchmark.py parse --snapshot dashboard.html
+    python benchmark.py concurrency --seconds 10
+    python benchmark.py load --url http://127.0.0.1:5000 --clients 32
+    python benchmark.py compare --workers 2 --clients 32 --slow-clients 200
+    python benchmark.py push --subscribers 300
+    python benchmark.py serialize --rows 10000
+    python benchmark.py search --rows 1000000
+    python benchmark.py datetimes --strings 500000
+    python benchmark.py sources --sources 8 --rows 300
+    python benchmark.py schedule --days 14
+    python benchmark.py retention --years 3 --days 30
+
+Benchmarks that touch the database use a throwaway SQLite file unless
+DATABASE_URL is already set.
+"""
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+import argparse
+import csv
+import io
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+def time_call(func, repeat):
+    """
+    Call `func` `repeat` times.
+
+    Returns:
+        tuple: (result of the last call, list of per-call durations in seconds)
+    """
+    durations = []
+    result = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start_time)
+    return result, durations
+
+def report(name, durations, items=None):
+    """Print best/median timings and, when `items` is given, items per second."""
+    best = min(durations)
+    line = f"{name:<24} best {best * 1000:9.2f} ms   median {statistics.median(durations) * 1000:9.2f} ms"
+    if items:
+        line += f"   {items / best:12,.0f} items/s"
+    print(line)
+
+def percentile(values, fraction):
+    """Return the value at `fraction` (0-1) of the sorted values."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def report_latencies(name, latencies):
+    """Print request count and p50/p95/p99/max latency in milliseconds."""
+    if not latencies:
+        print(f"{name:<24} no requests completed")
+        return
+    print(f"{name:<24} n={len(latencies):<7} "
+          f"p50 {percentile(latencies, 0.50) * 1000:8.2f} ms   "
+          f"p95 {percentile(latencies, 0.95) * 1000:8.2f} ms   "
+          f"p99 {percentile(latencies, 0.99) * 1000:8.2f} ms   "
+          f"max {max(latencies) * 1000:8.2f} ms")
+
+def use_scratch_database():
+    """Point DATABASE_URL at a temporary SQLite file unless one is configured."""
+    if 'DATABASE_URL' not in os.environ:
+        path = os.path.join(tempfile.mkdtemp(prefix='fires-bench-'), 'bench.db')
+        os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+    print(f"Database: {os.environ['DATABASE_URL']}")
+
+def synthetic_events(count, start=datetime(2024, 1, 1), seed=0):
+    """Generate `count` distinct event dicts shaped like scraped dashboard rows."""
+    rng = random.Random(seed)
+    types = ['MEDICAL', 'BRUSH FIRE', 'NATURAL GAS LEAK', 'VEHICLE ACCIDENT', 'STRUCTURE FIRE']
+    states = ['Dispatched', 'Enroute', 'On Scene', 'Command', 'Available']
+    streets = ['E BASELINE RD ,TMP', 'N 7TH ST ,PHX', 'E CACTUS RD ,PHX', 'W THOMAS RD ,PHX', 'S MILL AVE ,TMP']
+    return [
+        {
+            "title": rng.choice(types),
+            "location": f"{rng.randint(100, 9999)} {rng.choice(streets)}",
+            "datetime": start + timedelta(seconds=37 * i),
+            "channel": f"Channel A{rng.randint(1, 9)}",
+            "status": ' '.join(f'E{rng.randint(1, 300)}: {rng.choice(states)}'
+                               for _ in range(rng.randint(1, 3)))
+        }
+        for i in range(count)
+    ]
+
+def seed_database(rows):
+    """Insert `rows` synthetic events, one simulated day per 1000 rows."""
+    from check_duplicates import insert_events_bulk
+
+    with redirect_stdout(io.StringIO()):
+        for start in range(0, rows, 1000):
+            insert_events_bulk(synthetic_events(min(1000, rows - start),
+                                                start=datetime(2023, 1, 1) + timedelta(days=start // 1000),
+                                                seed=start))
+
+def synthetic_dashboard(rows, filler_widgets=200, seed=0):
+    """
+    Build an HTML page shaped like the rendered ArcGIS dashboard: a large amount
+    of unrelated widget markup plus .external-html tables holding `rows` incidents.
+    """
+    rng = random.Random(seed)
+    types = ['MEDICAL', 'BRUSH FIRE', 'NATURAL GAS LEAK', 'VEHICLE ACCIDENT', 'STRUCTURE FIRE']
+    states = ['Dispatched', 'Enroute', 'On Scene', 'Command', 'Available']
+    start = datetime(2024, 8, 22)
+
+    paths = '<path d="M0 0L10 10"/>' * 20
+    payload = 'x' * 200
+    filler = ''.join(
+        f'<div class="widget" id="w{i}"><div class="header"><span>Widget {i}</span></div>'
+        f'<svg><g>{paths}</g></svg>'
+        f'<script>var cfg{i} = {{"id": {i}, "data": "{payload}"}};</script></div>'
+        for i in range(filler_widgets)
+    )
+
+    table_rows = []
+    for i in range(rows):
+        when = start + timedelta(minutes=7 * i)
+        units = ' '.join(f'E{rng.randint(1, 300)}: {rng.choice(states)}' for _ in range(rng.randint(1, 3)))
+        table_rows.append(
+            f'<tr><td>{rng.choice(types)}</td><td>{rng.randint(100, 9999)} E BASELINE RD ,TMP</td>'
+            f'<td>{when.strftime("%m/%d/%Y, %I:%M %p")}</td><td>Channel A{rng.randint(1, 9)}</td>'
+            f'<td>{units}</td></tr>'
+        )
+
+    tables = ''.join(
+        '<div class="external-html"><table><tr><th>Type</th><th>Location</th><th>Time</th>'
+        '<th>Channel</th><th>Units</th></tr>' + ''.join(table_rows[i::2]) + '</table></div>'
+        for i in range(2)
+    )
+    return f'<html><head><title>Dashboard</title></head><body>{filler}{tables}</body></html>'
+
+def bench_parse(args):
+    """Compare table extraction parsers on a dashboard snapshot."""
+    import table_parser
+
+    if args.snapshot:
+        with open(args.snapshot, encoding='utf-8') as snapshot:
+            html = snapshot.read()
+    else:
+        html = synthetic_dashboard(args.rows)
+    print(f"Snapshot: {len(html) / 1024:.0f} KiB")
+
+    parsers = [('beautifulsoup', table_parser.parse_table_rows_bs4)]
+    if table_parser.lxml is not None:
+        parsers.append(('lxml', table_parser.parse_table_rows_lxml))
+    if table_parser.HTMLParser is not None:
+        parsers.append(('selectolax', table_parser.parse_table_rows_selectolax))
+
+    expected = None
+    for name, parser in parsers:
+        rows, durations = time_call(lambda: parser(html), args.repeat)
+        if expected is None:
+            expected = rows
+        elif rows != expected:
+            print(f"{name}: rows differ from beautifulsoup output")
+        report(name, durations, len(rows or []))
+    print(f"Rows extracted: {len(expected or [])}")
+    print("The in-page TABLE_EXTRACT_SCRIPT path needs a live browser and is not timed here.")
+
+def bench_concurrency(args):
+    """Measure API latency percentiles with and without ingest running."""
+    use_scratch_database()
+    from app import app, response_cache
+    from check_duplicates import insert_events_bulk
+
+    # Measure the database path, not the response cache
+    response_cache.max_entries = 0
+    endpoints = ['/api/events?limit=50', '/api/events/latest/50', '/api/stats?bucket=hour',
+                 '/api/events?limit=50&q=fire']
+    seed_database(args.seed_rows)
+
+    def run(with_writer):
+        stop = threading.Event()
+        latencies = []
+        batches = []
+
+        def reader(index):
+            client = app.test_client()
+            request_number = index
+            while not stop.is_set():
+                start_time = time.perf_counter()
+                client.get(endpoints[request_number % len(endpoints)]).get_data()
+                latencies.append(time.perf_counter() - start_time)
+                request_number += 1
+
+        def writer():
+            batch_number = 0
+            while not stop.is_set():
+                events = synthetic_events(args.batch_size, start=datetime.now() + timedelta(days=batch_number),
+                                          seed=100000 + batch_number)
+                start_time = time.perf_counter()
+                insert_events_bulk(events)
+                batches.append(time.perf_counter() - start_time)
+                batch_number += 1
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+        if with_writer:
+            threads.append(threading.Thread(target=writer))
+        with redirect_stdout(io.StringIO()):
+            for thread in threads:
+                thread.start()
+            time.sleep(args.seconds)
+            stop.set()
+            for thread in threads:
+                thread.join()
+        return latencies, batches
+
+    idle, _ = run(with_writer=False)
+    busy, batches = run(with_writer=True)
+    report_latencies('API, no ingest', idle)
+    report_latencies('API, during ingest', busy)
+    report_latencies(f'ingest ({args.batch_size}-row batches)', batches)
+
+def run_load(url, endpoints, clients, seconds, slow_clients=0):
+    """
+    Drive a running API server with `clients` back-to-back requesters while
+    `slow_clients` download the full NDJSON export a chunk at a time, and
+    report throughput and latency per endpoint.
+    """
+    import requests
+
+    stop = threading.Event()
+    latencies = {endpoint: [] for endpoint in endpoints}
+    errors = []
+
+    def client(index):
+        session = requests.Session()
+        request_number = index
+        while not stop.is_set():
+            endpoint = endpoints[request_number % len(endpoints)]
+            start_time = time.perf_counter()
+            try:
+                response = session.get(url + endpoint, timeout=30)
+                response.content
+                if response.status_code == 200:
+                    latencies[endpoint].append(time.perf_counter() - start_time)
+                else:
+                    errors.append(response.status_code)
+            except requests.RequestException as e:
+                errors.append(type(e).__name__)
+            request_number += 1
+        session.close()
+
+    def slow_client():
+        while not stop.is_set():
+            try:
+                with requests.get(url + '/api/events?format=ndjson', stream=True, timeout=30) as response:
+                    for _ in response.iter_content(4096):
+                        if stop.is_set():
+                            break
+                        time.sleep(0.1)
+            except requests.RequestException:
+                time.sleep(0.1)
+
+    threads = [threading.Thread(target=slow_client) for _ in range(slow_clients)]
+    threads += [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads[:slow_clients]:
+        thread.start()
+    if slow_clients:
+        # Let the slow downloads open before measuring
+        time.sleep(1)
+
+    start_time = time.perf_counter()
+    for thread in threads[slow_clients:]:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    elapsed = time.perf_counter() - start_time
+    for thread in threads:
+        thread.join()
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"{clients} clients, {slow_clients} slow clients, {elapsed:.1f}s: "
+          f"{total / elapsed:,.0f} requests/s, {len(errors)} errors")
+    for endpoint, values in latencies.items():
+        report_latencies(endpoint, values)
+    report_latencies('all', [value for values in latencies.values() for value in values])
+
+def bench_load(args):
+    """Load-test a running API server and report throughput and latency per endpoint."""
+    endpoints = args.endpoint or ['/api/events?limit=50', '/api/events/latest/50', '/api/stats']
+    run_load(args.url, endpoints, args.clients, args.seconds, args.slow_clients)
+
+def wait_for_server(url, timeout=30):
+    """Poll `url` until the server answers or `timeout` seconds pass."""
+    import requests
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url + '/api/cache', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start within {timeout}s")
+
+def bench_compare(args):
+    """Load-test the Flask and asyncio APIs side by side with the same number of worker processes."""
+    use_scratch_database()
+    seed_database(args.seed_rows)
+
+    endpoints = args.endpoint or ['/api/events?limit=50', '/api/events/latest/50', '/api/stats?bucket=hour',
+                                  '/api/events?limit=50&q=fire']
+    # Measure the database path unless the response cache is asked for
+    env = dict(os.environ, API_CACHE_ENTRIES=os.environ.get('API_CACHE_ENTRIES', '256') if args.cache else '0')
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+
+    for name, flags in (('flask (gunicorn gthread)', []), ('async (uvicorn)', ['--async'])):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        url = f"http://127.0.0.1:{port}"
+        process = subprocess.Popen(
+            [sys.executable, 'serve.py', '--no-scraper', '--bind', f'127.0.0.1:{port}',
+             '--workers', str(args.workers), *flags],
+            cwd=backend_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_for_server(url)
+            print(f"\n{name}, {args.workers} workers")
+            run_load(url, endpoints, args.clients, args.seconds, args.slow_clients)
+        finally:
+            process.terminate()
+            process.wait()
+
+def bench_push(args):
+    """Measure live stream fan-out cost and ingest-to-subscriber delivery latency."""
+    use_scratch_database()
+    from broadcast import BroadcastHub, render_message
+    from check_duplicates import insert_events_bulk
+    from database import Session, read_data_version
+    import requests
+
+    # Fan-out cost inside the hub, without any network
+    hub = BroadcastHub(client_buffer=args.batches + 1)
+    hub.start(0)
+    for _ in range(args.subscribers):
+        hub.subscribe(0)
+    events = [dict(event, datetime=event['datetime'].isoformat()) for event in synthetic_events(20, seed=1)]
+    message = render_message('events', 1, {'events': events})
+    _, durations = time_call(lambda: hub.publish(hub.last_version + 1, message), args.batches)
+    report(f'publish to {args.subscribers} subscribers', durations)
+
+    # End to end: ingest in this process, subscribers on a separate API server
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, STREAM_POLL_INTERVAL=str(args.poll_interval))
+    server_flags = [] if args.flask else ['--async']
+    process = subprocess.Popen(
+        [sys.executable, 'serve.py', '--no-scraper', '--bind', f'127.0.0.1:{port}', '--workers', '1',
+         '--threads', str(args.subscribers + 4), *server_flags],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    published = {}
+    received = []
+    connected = threading.Semaphore(0)
+
+    def subscriber():
+        with requests.get(url + '/api/events/stream', stream=True, timeout=60) as response:
+            buffer = ''
+            event_type = event_id = None
+            messages = 0
+            for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+                arrived = time.time()
+                buffer += chunk
+                *lines, buffer = buffer.split('\n')
+                for line in lines:
+                    if line.startswith('id: '):
+                        event_id = int(line[4:])
+                    elif line.startswith('event: '):
+                        event_type = line[7:]
+                    elif line == '' and event_type:
+                        if event_type == 'ready':
+                            connected.release()
+                        elif event_type == 'events':
+                            received.append((event_id, arrived))
+                            messages += 1
+                            if messages == args.batches:
+                                return
+                        event_type = None
+
+    try:
+        wait_for_server(url)
+        threads = [threading.Thread(target=subscriber, daemon=True) for _ in range(args.subscribers)]
+        for thread in threads:
+            thread.start()
+        for _ in threads:
+            connected.acquire(timeout=60)
+
+        with redirect_stdout(io.StringIO()):
+            for batch_number in range(args.batches):
+                insert_events_bulk(synthetic_events(20, start=datetime.now() + timedelta(days=batch_number),
+                                                    seed=500000 + batch_number))
+                committed = time.time()
+                session = Session()
+                try:
+                    version = read_data_version(session)
+                finally:
+                    session.close()
+                published[version] = committed
+                time.sleep(args.interval)
+        for thread in threads:
+            thread.join(timeout=10 + args.poll_interval)
+    finally:
+        process.terminate()
+        process.wait()
+
+    latencies = [arrived - published[version] for version, arrived in received if version in published]
+    expected = args.subscribers * args.batches
+    print(f"{'flask' if args.flask else 'async'} server, {args.subscribers} subscribers, "
+          f"{args.batches} batches, poll interval {args.poll_interval}s: "
+          f"{len(latencies)}/{expected} messages delivered")
+    report_latencies('delivery latency', latencies)
+
+def bench_serialize(args):
+    """Compare event serialization throughput in rows per second."""
+    from collections import namedtuple
+    import compression
+    import json
+    import serialization
+    from queries import EVENT_FIELDS
+
+    Row = namedtuple('Row', EVENT_FIELDS + ('data_version',))
+    rows = [Row(id=index + 1, data_version=1, source='default', **event)
+            for index, event in enumerate(synthetic_events(args.rows))]
+    params = {'fields': EVENT_FIELDS, 'limit': None}
+
+    def strftime_dicts():
+        # The original per-request path: a dict per row with two strftime calls
+        events = [{
+            'id': row.id, 'title': row.title, 'location': row.location,
+            'datetime': row.datetime.strftime('%Y-%m-%d %H:%M:%S'),
+            'datetime_readable': row.datetime.strftime('%B %d, %Y at %I:%M %p'),
+            'channel': row.channel, 'status': row.status
+        } for row in rows]
+        return json.dumps({'success': True, 'count': len(events), 'events': events}).encode('utf-8')
+
+    def cold_cache():
+        serialization.fragment_cache = serialization.FragmentCache(args.rows)
+        return serialization.render_page(rows, params)
+
+    def warm_cache():
+        return serialization.render_page(rows, params)
+
+    print(f"Rows: {args.rows}, JSON encoder: {'orjson' if serialization.orjson else 'json'}")
+    _, durations = time_call(strftime_dicts, args.repeat)
+    report('json + strftime', durations, args.rows)
+    _, durations = time_call(cold_cache, args.repeat)
+    report('fragments, cold cache', durations, args.rows)
+    body, durations = time_call(warm_cache, args.repeat)
+    report('fragments, warm cache', durations, args.rows)
+
+    for encoding in compression.available_encodings() or ['gzip']:
+        compressed, durations = time_call(lambda: compression.compress(body, encoding), args.repeat)
+        report(f'{encoding} ({len(compressed) * 100 // len(body)}% of {len(body) // 1024} KiB)',
+               durations, args.rows)
+
+def synthetic_city(path, streets=400, blocks=50, seed=0):
+    """
+    Write a gazetteer CSV for a synthetic city: a grid of streets, one entry
+    per block address plus one per street for addresses between blocks.
+
+    Returns:
+        tuple: (list of gazetteer addresses, (latitude, longitude) of the city centre)
+    """
+    rng = random.Random(seed)
+    centre = (33.45, -112.07)
+    names = ['BASELINE', 'CACTUS', 'THOMAS', 'MILL', 'INDIAN SCHOOL', 'CAMELBACK', 'MCDOWELL',
+             'VAN BUREN', 'BROADWAY', 'SOUTHERN', 'GUADALUPE', 'ELLIOT', 'WARNER', 'RAY', 'CHANDLER']
+    suffixes = ['RD', 'ST', 'AVE', 'DR', 'BLVD', 'LN']
+    cities = ['PHX', 'TMP', 'MES', 'SCT', 'GLN']
+    addresses = []
+    with open(path, 'w', newline='', encoding='utf-8') as gazetteer:
+        writer = csv.writer(gazetteer)
+        writer.writerow(['address', 'latitude', 'longitude'])
+        for index in range(streets):
+            # Alternate east-west and north-south streets, about 0.8 km apart
+            east_west = index % 2 == 0
+            offset = (index // 2 - streets // 4) * 0.008
+            street = (f"{'EW'[index % 4 // 2] if east_west else 'NS'[index % 4 // 2]} "
+                      f"{names[index % len(names)]} {index // len(names) + 1} {rng.choice(suffixes)}, "
+                      f"{cities[index % len(cities)]}")
+            writer.writerow([street, centre[0] + offset, centre[1]])
+            for block in range(blocks):
+                along = (block - blocks // 2) * 0.002
+                latitude, longitude = ((centre[0] + offset, centre[1] + along) if east_west
+                                       else (centre[0] + along, centre[1] + offset))
+                address = f"{(block + 1) * 100} {street}"
+                writer.writerow([address, latitude, longitude])
+                addresses.append(address)
+    return addresses, centre
+
+def bench_search(args):
+    """Time full-text and spatial search against a generated city-sized dataset."""
+    use_scratch_database()
+    import config
+    from backfill import bulk_load_events
+    from database import DERIVED_COLUMNS, Event, Session, engine
+    from geocoder import backfill_event_points
+    from queries import build_events_query
+    from search import build_search_query, text_search_backend
+    from sqlalchemy import desc, select
+
+    config.GAZETTEER_PATH = os.path.join(tempfile.mkdtemp(prefix='fires-gazetteer-'), 'gazetteer.csv')
+    addresses, centre = synthetic_city(config.GAZETTEER_PATH)
+    rng = random.Random(1)
+    types = ['MEDICAL', 'BRUSH FIRE', 'NATURAL GAS LEAK', 'VEHICLE ACCIDENT', 'STRUCTURE FIRE',
+             'ODOR INVESTIGATION', 'HAZMAT SPILL', 'WIRES DOWN', 'ELEVATOR RESCUE', 'SMOKE CHECK']
+    start = datetime(2020, 1, 1)
+
+    start_time = time.perf_counter()
+    for batch_start in range(0, args.rows, 10000):
+        batch = []
+        for index in range(batch_start, min(batch_start + 10000, args.rows)):
+            address = rng.choice(addresses)
+            if rng.random() < 0.1:
+                # A house number between blocks, geocoded to its street
+                number, _, street = address.partition(' ')
+                address = f"{int(number) + rng.randint(1, 99)} {street}"
+            event = {
+                "title": types[min(int(rng.expovariate(0.6)), len(types) - 1)],
+                "location": address.replace(', ', ' ,'),
+                "datetime": start + timedelta(seconds=97 * index),
+                "channel": f"Channel A{rng.randint(1, 9)}",
+                "status": f"E{rng.randint(1, 300)}: Dispatched"
+            }
+            event.update({column: derive(event) for column, derive in DERIVED_COLUMNS.items()})
+            batch.append(event)
+        with engine.begin() as connection:
+            bulk_load_events(connection, batch)
+    print(f"Loaded {args.rows} events with the full-text index in {time.perf_counter() - start_time:.1f}s")
+    start_time = time.perf_counter()
+    geocoded = backfill_event_points()
+    print(f"Geocoded {geocoded} events in {time.perf_counter() - start_time:.1f}s "
+          f"({len(addresses)} gazetteer addresses), full-text backend: {text_search_backend()}")
+
+    street = addresses[len(addresses) // 3].split(' ', 1)[1].split(',')[0]
+    number = addresses[len(addresses) // 3].split(' ')[0]
+    queries = [
+        ('common word', build_search_query(words=['medical'])),
+        ('rare word', build_search_query(words=['elevator'])),
+        ('address', build_search_query(words=[number] + street.lower().split())),
+        ('word, page 20', build_search_query(words=['fire'], before=args.rows // 2)),
+        ('bbox 1 km', build_search_query(bbox=(centre[1] - 0.005, centre[0] - 0.0045,
+                                               centre[1] + 0.005, centre[0] + 0.0045))),
+        ('radius 500 m', build_search_query(near=centre, radius=0.5)),
+        ('word + radius 2 km', build_search_query(words=['brush'], near=centre, radius=2)),
+    ]
+    scans = [
+        ('scan: title ILIKE', build_events_query(title='elevator', limit=50)),
+        ('scan: address ILIKE', select(Event.id).where(Event.location.icontains(f"{number} {street}"))
+         .order_by(desc(Event.id)).limit(50)),
+    ]
+    session = Session()
+    try:
+        for name, stmt in queries + scans:
+            rows, durations = time_call(lambda: session.execute(stmt).all(), args.repeat)
+            report(f"{name} ({len(rows)})", durations)
+    finally:
+        session.close()
+
+def bench_datetimes(args):
+    """Compare the strptime format loop with the learning, caching datetime parser."""
+    from datetime_parser import DATETIME_FORMATS, DatetimeParser
+    import logging
+
+    def strptime_loop(value):
+        # The original scraper path: every format in turn until one parses
+        for fmt in DATETIME_FORMATS:
+            try:
+                return datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+        return None
+
+    # Successive scrapes of a dashboard listing `args.rows` recent incidents,
+    # a new incident arriving every few minutes, plus a feed in ISO format
+    rng = random.Random(0)
+    start = datetime(2024, 8, 22)
+    dashboard = []
+    for index in range(args.strings):
+        when = start + timedelta(minutes=7 * (index // args.rows + rng.randrange(args.rows)))
+        dashboard.append(f"{when.month:02d}/{when.day:02d}/{when.year}, {when.strftime('%I:%M %p').lstrip('0')}")
+    iso = [(start + timedelta(minutes=rng.randrange(100000))).strftime('%Y-%m-%d %H:%M') for _ in range(args.strings)]
+    print(f"{args.strings} strings per corpus, {len(set(dashboard))} distinct dashboard timestamps")
+
+    # Keep expected failures in the mixed corpus from flooding the output
+    logging.getLogger('datetime_parser').setLevel(logging.ERROR)
+    for name, corpus in (('dashboard', dashboard), ('iso feed', iso)):
+        expected = [strptime_loop(value) for value in corpus]
+        _, durations = time_call(lambda: [strptime_loop(value) for value in corpus], args.repeat)
+        report(f"{name}: strptime loop", durations, len(corpus))
+
+        def uncached():
+            parser = DatetimeParser(name, cache_size=0)
+            return [parser.parse(value) for value in corpus]
+
+        def cached():
+            return [parser.parse(value) for value in corpus]
+
+        result, durations = time_call(uncached, args.repeat)
+        report(f"{name}: no cache", durations, len(corpus))
+        parser = DatetimeParser(name)
+        result, durations = time_call(cached, args.repeat)
+        report(f"{name}: cached", durations, len(corpus))
+        if result != expected:
+            print(f"{name}: parser output differs from strptime")
+
+def bench_sources(args):
+    """Scrape several local dashboards, one of them stalled, one after another and with the scraper manager."""
+    use_scratch_database()
+    from fixture_server import FixtureRequestHandler
+    from functools import partial
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from scraper import OptimizedFireScraper
+    from scraper_manager import ScraperManager
+    from sources import Source
+    import logging
+
+    logging.getLogger().setLevel(logging.CRITICAL)
+    directory = tempfile.mkdtemp(prefix='fires-dashboards-')
+
+    def write_pages(seed):
+        # New incidents on every page, so each pass parses and ingests everything
+        for index in range(args.sources):
+            with open(os.path.join(directory, f'dashboard{index}.html'), 'w', encoding='utf-8') as page:
+                page.write(synthetic_dashboard(args.rows, seed=seed * 1000 + index))
+
+    class StalledHandler(BaseHTTPRequestHandler):
+        # A dashboard that stops answering
+        def do_GET(self):
+            time.sleep(args.stall)
+            try:
+                self.send_error(503)
+            except OSError:
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    # Bind now, serve once the parse processes have been forked
+    fixtures = ThreadingHTTPServer(('127.0.0.1', 0), partial(FixtureRequestHandler, directory=directory))
+    stalled = ThreadingHTTPServer(('127.0.0.1', 0), StalledHandler)
+    sources = [Source('stalled', 'html', url=f"http://127.0.0.1:{stalled.server_address[1]}/",
+                      timeout=args.timeout)]
+    sources += [Source(f'dashboard{index}', 'html', timeout=args.timeout,
+                       url=f"http://127.0.0.1:{fixtures.server_address[1]}/dashboard{index}.html")
+                for index in range(args.sources)]
+    sequential = [OptimizedFireScraper(source=source) for source in sources]
+    managers = [(processes, ScraperManager(sources, workers=len(sources), parse_processes=processes))
+                for processes in args.processes]
+    for server in (fixtures, stalled):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    rows = args.sources * args.rows
+    print(f"{args.sources} dashboards of {args.rows} rows plus one stalled for {args.stall}s "
+          f"(request timeout {args.timeout}s), {os.cpu_count()} CPU cores")
+    seed = 0
+    for name, run in [('sequential', None)] + [(f'manager, {processes} proc', manager)
+                                               for processes, manager in managers]:
+        healthy, totals = [], []
+        for _ in range(args.repeat):
+            seed += 1
+            write_pages(seed)
+            start_time = time.perf_counter()
+            finished = {}
+            with redirect_stdout(io.StringIO()):
+                if run is None:
+                    for scraper in sequential:
+                        scraper.scrape_website()
+                        finished[scraper.source.tag] = time.perf_counter() - start_time
+                else:
+                    run.scrape_all()
+                    finished = {tag: elapsed for tag, (_, elapsed) in run.results.items()}
+            totals.append(time.perf_counter() - start_time)
+            healthy.append(max(elapsed for tag, elapsed in finished.items() if tag != 'stalled'))
+        report(f"{name}: healthy", healthy, rows)
+        report(f"{name}: pass", totals)
+
+    for scraper in sequential:
+        scraper.cleanup()
+    for _, manager in managers:
+        manager.cleanup()
+
+def bench_schedule(args):
+    """Simulate fixed and adaptive scrape schedules against a day/night incident pattern."""
+    import math
+    from scheduler import AdaptiveSchedule
+
+    # Row changes arrive as a Poisson process whose hourly rate swings
+    # between `quiet` overnight and `busy` in the late afternoon
+    rng = random.Random(0)
+    duration = args.days * 86400
+    changes = []
+    now = 0.0
+    while now < duration:
+        hour = now / 3600 % 24
+        rate = args.quiet + (args.busy - args.quiet) * (1 - math.cos((hour - 5) / 24 * 2 * math.pi)) / 2
+        now += rng.expovariate(rate / 3600)
+        changes.append(now)
+    busy_hours = [change for change in changes if 12 <= change / 3600 % 24 < 20]
+    print(f"{args.days} days, {len(changes)} row changes ({args.quiet:g}-{args.busy:g} per hour), "
+          f"{args.failure_rate:.0%} of scrapes fail")
+
+    def simulate(schedule):
+        # Detection latency of each change: time until the first successful scrape after it
+        latencies = {}
+        scrapes = 0
+        pending = 0
+        now = 0.0
+        while now < duration:
+            scrapes += 1
+            success = rng.random() >= args.failure_rate
+            found = 0
+            if success:
+                while pending < len(changes) and changes[pending] <= now:
+                    latencies[changes[pending]] = now - changes[pending]
+                    pending += 1
+                    found += 1
+            now += schedule(success, found, now)
+        return scrapes, latencies
+
+    fixed = lambda success, found, now: args.interval
+    adaptive_schedule = AdaptiveSchedule('simulated', args.interval, rng=random.Random(1))
+    adaptive = lambda success, found, now: adaptive_schedule.record(success, found, started=now)
+
+    for name, schedule in (('fixed', fixed), ('adaptive', adaptive)):
+        scrapes, latencies = simulate(schedule)
+        busy = [latencies[change] for change in busy_hours if change in latencies]
+        print(f"{name:<10} {scrapes:6} scrapes ({scrapes / args.days:5.0f}/day)   "
+              f"mean latency {statistics.mean(latencies.values()) / 60:5.1f} min   "
+              f"busy hours mean {statistics.mean(busy) / 60:5.1f} min   "
+              f"p95 {percentile(busy, 0.95) / 60:5.1f} min")
+
+def bench_retention(args):
+    """Compare /api/events queries on a multi-year events table with the same queries after archiving."""
+    use_scratch_database()
+    import config
+    from archive import archive_boundary, archive_events, needs_archives, read_archived_events, read_archives, reclaim_space
+    from backfill import bulk_load_events
+    from database import DERIVED_COLUMNS, Session, backfill_event_units, engine
+    from queries import build_events_query, parse_event_params
+
+    rng = random.Random(2)
+    types = ['MEDICAL', 'BRUSH FIRE', 'NATURAL GAS LEAK', 'VEHICLE ACCIDENT', 'STRUCTURE FIRE',
+             'ODOR INVESTIGATION', 'HAZMAT SPILL', 'WIRES DOWN', 'ELEVATOR RESCUE', 'SMOKE CHECK']
+    streets = ['E BASELINE RD ,TMP', 'N 7TH ST ,PHX', 'E CACTUS RD ,PHX', 'W THOMAS RD ,PHX', 'S MILL AVE ,TMP']
+    now = datetime.now().replace(microsecond=0)
+    total = int(args.years * 365 * args.per_day)
+    spacing = 86400 / args.per_day
+    start_time = time.perf_counter()
+    for batch_start in range(0, total, 10000):
+        batch = []
+        for index in range(batch_start, min(batch_start + 10000, total)):
+            event = {
+                "title": types[min(int(rng.expovariate(0.6)), len(types) - 1)],
+                "location": f"{rng.randint(100, 9999)} {rng.choice(streets)}",
+                "datetime": now - timedelta(seconds=spacing * (total - index)),
+                "channel": f"Channel A{rng.randint(1, 9)}",
+                "status": f"E{rng.randint(1, 300)}: Dispatched"
+            }
+            event.update({column: derive(event) for column, derive in DERIVED_COLUMNS.items()})
+            batch.append(event)
+        with engine.begin() as connection:
+            bulk_load_events(connection, batch)
+    backfill_event_units(engine)
+    print(f"Loaded {total} events over {args.years:g} years in {time.perf_counter() - start_time:.1f}s")
+
+    def query(session, **options):
+        # What query_events in app.py does
+        params = dict(parse_event_params({}), **options)
+        archives = read_archives(session)
+        rows = session.execute(build_events_query(**params, after=archive_boundary(archives))).all()
+        if needs_archives(params, archives, len(rows)):
+            limit = None if params['limit'] is None else params['limit'] - len(rows)
+            rows += read_archived_events(params, archives, limit)
+        return rows
+
+    year_ago = now - timedelta(days=365)
+    queries = [
+        ('latest 50', dict(limit=50)),
+        ('last day', dict(since=now - timedelta(days=1))),
+        ('rare title, 50', dict(title='elevator', limit=50)),
+        ('unit, last week', dict(unit='E17', since=now - timedelta(days=7))),
+        ('page a year back', dict(before=(year_ago, 0), limit=50)),
+    ]
+
+    def run(label):
+        session = Session()
+        try:
+            for name, options in queries:
+                rows, durations = time_call(lambda: query(session, **options), args.repeat)
+                report(f"{label}: {name} ({len(rows)})", durations)
+        finally:
+            session.close()
+
+    def database_size():
+        if engine.dialect.name != 'sqlite':
+            return ''
+        return f", database {os.path.getsize(engine.url.database) / 2 ** 20:.0f} MiB"
+
+    run('all years')
+    start_time = time.perf_counter()
+    moved, _ = archive_events(args.days)
+    released = reclaim_space()
+    print(f"Archived {moved} events in {time.perf_counter() - start_time:.1f}s, "
+          f"released {released} pages{database_size()}")
+    run(f'{args.days} days')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parse_parser = subparsers.add_parser('parse', help=bench_parse.__doc__)
+    parse_parser.add_argument('--snapshot', help="Saved dashboard HTML; a synthetic page is used if omitted")
+    parse_parser.add_argument('--rows', type=int, default=300)
+    parse_parser.add_argument('--repeat', type=int, default=10)
+    parse_parser.set_defaults(func=bench_parse)
+
+    concurrency_parser = subparsers.add_parser('concurrency', help=bench_concurrency.__doc__)
+    concurrency_parser.add_argument('--seconds', type=float, default=5)
+    concurrency_parser.add_argument('--readers', type=int, default=4)
+    concurrency_parser.add_argument('--batch-size', type=int, default=200)
+    concurrency_parser.add_argument('--seed-rows', type=int, default=20000)
+    concurrency_parser.set_defaults(func=bench_concurrency)
+
+    load_parser = subparsers.add_parser('load', help=bench_load.__doc__)
+    load_parser.add_argument('--url', default='http://127.0.0.1:5000')
+    load_parser.add_argument('--clients', type=int, default=16)
+    load_parser.add_argument('--seconds', type=float, default=10)
+    load_parser.add_argument('--slow-clients', type=int, default=0,
+                             help="Clients slowly downloading the NDJSON export during the test")
+    load_parser.add_argument('--endpoint', action='append', help="Path to request; may be repeated")
+    load_parser.set_defaults(func=bench_load)
+
+    compare_parser = subparsers.add_parser('compare', help=bench_compare.__doc__)
+    compare_parser.add_argument('--workers', type=int, default=2)
+    compare_parser.add_argument('--clients', type=int, default=16)
+    compare_parser.add_argument('--slow-clients', type=int, default=0,
+                                help="Clients slowly downloading the NDJSON export during the test")
+    compare_parser.add_argument('--seconds', type=float, default=10)
+    compare_parser.add_argument('--seed-rows', type=int, default=20000)
+    compare_parser.add_argument('--cache', action='store_true', help="Leave the response cache enabled")
+    compare_parser.add_argument('--endpoint', action='append', help="Path to request; may be repeated")
+    compare_parser.set_defaults(func=bench_compare)
+
+    push_parser = subparsers.add_parser('push', help=bench_push.__doc__)
+    push_parser.add_argument('--subscribers', type=int, default=200)
+    push_parser.add_argument('--batches', type=int, default=20)
+    push_parser.add_argument('--interval', type=float, default=0.5, help="Seconds between ingest batches")
+    push_parser.add_argument('--poll-interval', type=float, default=0.1,
+                             help="STREAM_POLL_INTERVAL for the server under test")
+    push_parser.add_argument('--flask', action='store_true', help="Test the Flask server instead of the async one")
+    push_parser.set_defaults(func=bench_push)
+
+    serialize_parser = subparsers.add_parser('serialize', help=bench_serialize.__doc__)
+    serialize_parser.add_argument('--rows', type=int, default=10000)
+    serialize_parser.add_argument('--repeat', type=int, default=10)
+    serialize_parser.set_defaults(func=bench_serialize)
+
+    search_parser = subparsers.add_parser('search', help=bench_search.__doc__)
+    search_parser.add_argument('--rows', type=int, default=1000000)
+    search_parser.add_argument('--repeat', type=int, default=20)
+    search_parser.set_defaults(func=bench_search)
+
+    datetimes_parser = subparsers.add_parser('datetimes', help=bench_datetimes.__doc__)
+    datetimes_parser.add_argument('--strings', type=int, default=500000)
+    datetimes_parser.add_argument('--rows', type=int, default=300, help="Incidents listed per dashboard scrape")
+    datetimes_parser.add_argument('--repeat', type=int, default=5)
+    datetimes_parser.set_defaults(func=bench_datetimes)
+
+    sources_parser = subparsers.add_parser('sources', help=bench_sources.__doc__)
+    sources_parser.add_argument('--sources', type=int, default=8, help="Healthy dashboards to serve")
+    sources_parser.add_argument('--rows', type=int, default=300, help="Incidents per dashboard")
+    sources_parser.add_argument('--stall', type=float, default=10, help="Seconds the stalled dashboard hangs")
+    sources_parser.add_argument('--timeout', type=float, default=2, help="Request timeout of every source")
+    sources_parser.add_argument('--processes', type=int, nargs='+', default=[1, 4],
+                                help="Parse pool sizes to compare")
+    sources_parser.add_argument('--repeat', type=int, default=3)
+    sources_parser.set_defaults(func=bench_sources)
+
+    schedule_parser = subparsers.add_parser('schedule', help=bench_schedule.__doc__)
+    schedule_parser.add_argument('--days', type=int, default=14)
+    schedule_parser.add_argument('--quiet', type=float, default=1, help="Row changes per hour overnight")
+    schedule_parser.add_argument('--busy', type=float, default=30, help="Row changes per hour at the peak")
+    schedule_parser.add_argument('--interval', type=float, default=600, help="The fixed interval to compare with")
+    schedule_parser.add_argument('--failure-rate', type=float, default=0.05)
+    schedule_parser.set_defaults(func=bench_schedule)
+
+    retention_parser = subparsers.add_parser('retention', help=bench_retention.__doc__)
+    retention_parser.add_argument('--years', type=float, default=3, help="Years of history to generate")
+    retention_parser.add_argument('--per-day', type=int, default=500, help="Events per day")
+    retention_parser.add_argument('--days', type=int, default=30, help="Days kept in the events table")
+    retention_parser.add_argument('--repeat', type=int, default=20)
+    retention_parser.set_defaults(func=bench_retention)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
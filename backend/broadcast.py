@@ -0,0 +1,279 @@
+"""
+In-process fan-out of newly ingested events to live stream subscribers.
+
+Every change is published once per process as a pre-rendered Server-Sent
+Events message tagged with its data version; subscribers only receive
+references to that message, so the database is read once per ingest, not
+once per client. Changes made by other processes (the scraper under
+serve.py) are picked up by a tailer thread polling the data version.
+"""
+from sqlalchemy import select
+from collections import deque
+from itertools import groupby
+import asyncio
+import json
+import logging
+import threading
+import time
+import config
+from database import Event, Session, read_data_version
+from queries import EVENT_FIELDS
+from serialization import serialize_event
+
+logger = logging.getLogger(__name__)
+
+def render_message(event_type, version, payload):
+    """Render one Server-Sent Events message."""
+    return f"id: {version}\nevent: {event_type}\ndata: {json.dumps(payload)}\n\n"
+
+# Sent on an idle stream so proxies keep it open and dead clients are noticed
+HEARTBEAT = ": keep-alive\n\n"
+
+# Tells EventSource clients how long to wait before reconnecting, in milliseconds
+RETRY_PREAMBLE = "retry: 3000\n\n"
+
+def parse_last_event_id(value):
+    """Parse a Last-Event-ID header or query parameter, ignoring malformed values."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+class Subscription:
+    """
+    One client's bounded queue of rendered messages, consumed from a thread.
+
+    When the client falls more than `max_pending` messages behind, further
+    messages are dropped and `overflowed` is set; the stream then ends and the
+    client reconnects with Last-Event-ID to replay what it missed.
+    """
+
+    def __init__(self, hub, max_pending):
+        self.hub = hub
+        self.max_pending = max_pending
+        self.overflowed = False
+        self._pending = deque()
+        self._ready = threading.Event()
+
+    def offer(self, message):
+        """Queue a message; called by the hub with its lock held."""
+        if len(self._pending) >= self.max_pending:
+            self.overflowed = True
+        else:
+            self._pending.append(message)
+        self._wake()
+
+    def _wake(self):
+        self._ready.set()
+
+    def _drain(self):
+        with self.hub.lock:
+            messages = list(self._pending)
+            self._pending.clear()
+            self._clear()
+        return messages
+
+    def _clear(self):
+        self._ready.clear()
+
+    def get(self, timeout):
+        """
+        Wait up to `timeout` seconds for messages.
+
+        Returns:
+            list: Rendered messages in publish order, empty on timeout
+        """
+        messages = self._drain()
+        if messages or self.overflowed:
+            return messages
+        self._ready.wait(timeout)
+        return self._drain()
+
+class AsyncSubscription(Subscription):
+    """Subscription consumed from an asyncio event loop."""
+
+    def __init__(self, hub, max_pending):
+        super().__init__(hub, max_pending)
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+
+    def _wake(self):
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # The loop has shut down; the stream is already gone
+            pass
+
+    async def get(self, timeout):
+        """Async counterpart of Subscription.get."""
+        messages = self._drain()
+        if messages or self.overflowed:
+            return messages
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._drain()
+
+class BroadcastHub:
+    """
+    Publishes versioned messages to every subscriber in this process and
+    keeps a bounded history for clients resuming after a disconnect.
+    """
+
+    def __init__(self, history_size=1000, client_buffer=64):
+        self.client_buffer = client_buffer
+        self.lock = threading.Lock()
+        self.active = False
+        self.last_version = None
+        self._history = deque(maxlen=history_size)
+        # Messages after this version are all still in the history
+        self._complete_after = None
+        self._subscribers = set()
+
+    def start(self, version):
+        """Begin publishing from `version`, the data version at start-up."""
+        with self.lock:
+            self.last_version = self._complete_after = version
+            self.active = True
+
+    def publish(self, version, message):
+        """
+        Deliver a rendered message to every subscriber.
+
+        Versions already published are ignored, so the ingest path and the
+        tailer may both report the same change.
+
+        Returns:
+            bool: Whether the message was new
+        """
+        with self.lock:
+            if self.last_version is not None and version <= self.last_version:
+                return False
+            if len(self._history) == self._history.maxlen:
+                self._complete_after = self._history[0][0]
+            self._history.append((version, message))
+            self.last_version = version
+            for subscription in self._subscribers:
+                subscription.offer(message)
+            return True
+
+    def advance(self, version):
+        """
+        Move past a data version that changed no rows, such as an archive
+        batch, so that the tailer stops looking for its changes.
+        """
+        with self.lock:
+            if self.last_version is None or version > self.last_version:
+                self.last_version = version
+
+    def subscribe(self, last_event_id=None, subscription_class=Subscription):
+        """
+        Register a subscriber.
+
+        A client resuming with `last_event_id` first gets every message it
+        missed, or a `reset` message telling it to reload when those are no
+        longer in the history. A new client gets a `ready` message carrying
+        the current version, so that its reconnects resume from there.
+        """
+        subscription = subscription_class(self, self.client_buffer)
+        with self.lock:
+            if last_event_id is None:
+                subscription._pending.append(
+                    render_message('ready', self.last_version, {'version': self.last_version})
+                )
+            elif last_event_id < self._complete_after:
+                subscription._pending.append(
+                    render_message('reset', self.last_version, {'version': self.last_version})
+                )
+            else:
+                subscription._pending.extend(
+                    message for version, message in self._history if version > last_event_id
+                )
+            subscription._wake()
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a subscriber registered with subscribe."""
+        with self.lock:
+            self._subscribers.discard(subscription)
+
+    def stats(self):
+        """Return subscriber and history counts."""
+        with self.lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'history': len(self._history),
+                'last_version': self.last_version
+            }
+
+hub = BroadcastHub(config.STREAM_HISTORY, config.STREAM_CLIENT_BUFFER)
+
+_catch_up_lock = threading.Lock()
+_start_lock = threading.Lock()
+
+def catch_up():
+    """
+    Publish every change made since the hub's last version, one message per
+    data version, with a single query for all subscribers.
+    """
+    if not hub.active:
+        return
+    with _catch_up_lock:
+        session = Session()
+        try:
+            # Read first: every row stamped up to this version is committed by now
+            current = read_data_version(session)
+            rows = session.execute(
+                select(*(getattr(Event, field) for field in EVENT_FIELDS), Event.data_version)
+                .where(Event.data_version > hub.last_version)
+                .order_by(Event.data_version, Event.id)
+                .limit(config.STREAM_CATCH_UP_LIMIT)
+            ).all()
+            if len(rows) == config.STREAM_CATCH_UP_LIMIT:
+                # Too much changed at once (e.g. a backfill): clients should reload
+                version = read_data_version(session)
+                hub.publish(version, render_message('reset', version, {'version': version}))
+                return
+        finally:
+            session.close()
+
+        for version, group in groupby(rows, key=lambda row: row.data_version):
+            events = [serialize_event(row) for row in group]
+            hub.publish(version, render_message('events', version, {'version': version, 'events': events}))
+        hub.advance(current)
+
+def _tail(interval):
+    """Poll the data version and catch up when another process has written."""
+    while True:
+        try:
+            session = Session()
+            try:
+                version = read_data_version(session)
+            finally:
+                session.close()
+            if version > hub.last_version:
+                catch_up()
+        except Exception as e:
+            logger.warning(f"Event stream tailer failed: {e}")
+        time.sleep(interval)
+
+def activate():
+    """
+    Start publishing in this process, if it has not started yet.
+
+    Called when the first client subscribes, so processes without stream
+    clients, such as the scraper, never query for changes to publish.
+    """
+    if hub.active:
+        return
+    with _start_lock:
+        if hub.active:
+            return
+        session = Session()
+        try:
+            hub.start(read_data_version(session))
+        finally:
+            session.close()
+        threading.Thread(target=_tail, args=(config.STREAM_POLL_INTERVAL,), daemon=True).start()
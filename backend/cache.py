@@ -0,0 +1,152 @@
+from flask import Response, request
+from collections import OrderedDict
+from compression import choose_encoding, compress_stream, encoded_body, representation_etag
+from functools import wraps
+import hashlib
+import threading
+import time
+
+class ResponseCache:
+    """
+    Bounded LRU cache of rendered API responses.
+
+    Entries are tagged with the data version they were rendered at and are
+    treated as misses once the version moves on, so ingest invalidates the
+    whole cache by bumping a single counter.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, version):
+        """Return the cached entry for `key` if it is still current, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['version'] == version and \
+                    (entry['expires'] is None or entry['expires'] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, version, body, mimetype, ttl=None):
+        """Store a rendered response body and return the new entry."""
+        entry = {
+            'version': version,
+            'body': body,
+            'mimetype': mimetype,
+            'etag': hashlib.sha1(body).hexdigest(),
+            'expires': time.monotonic() + ttl if ttl is not None else None
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        """Drop every cached entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+def cache_key(path, query_items):
+    """Key a response on its path and sorted query parameters."""
+    return (path, tuple(sorted(query_items)))
+
+def stream_etag(key, version):
+    """ETag for a streamed response, derived from its cache key and data version."""
+    return hashlib.sha1(repr((key, version)).encode('utf-8')).hexdigest()
+
+def _etag_matches(etag):
+    """Check the request's If-None-Match header against a strong ETag."""
+    return request.if_none_match.contains(etag) or request.if_none_match.star_tag
+
+def _entry_response(entry):
+    """
+    Build a response for a cache entry, compressed if the client accepts it,
+    honouring If-None-Match.
+    """
+    body, encoding = encoded_body(entry, choose_encoding(request.headers.get('Accept-Encoding')))
+    etag = representation_etag(entry['etag'], encoding)
+    if _etag_matches(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=entry['mimetype'])
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    return response
+
+def cached_response(cache, get_version, ttl=None):
+    """
+    Decorator that serves a view from `cache` while the data version is unchanged.
+
+    The cache key is the request path plus its sorted query parameters.
+    Only successful, non-streamed responses are stored. Streamed responses are
+    not buffered, but still get an ETag derived from the key and data version
+    so that unchanged polls can be answered with 304 before any row is read.
+    Both are gzip or brotli compressed when the client accepts it.
+
+    Args:
+        cache (ResponseCache): Cache to store rendered responses in
+        get_version (callable): Returns the current data version
+        ttl (float): Optional lifetime in seconds for views whose output also
+            depends on the clock
+
+    Returns:
+        callable: The decorator
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = cache_key(request.path, request.args.items(multi=True))
+            version = get_version()
+
+            entry = cache.get(key, version)
+            if entry is not None:
+                return _entry_response(entry)
+
+            response = view(*args, **kwargs)
+            if not isinstance(response, Response) or response.status_code != 200:
+                return response
+
+            if response.is_streamed:
+                encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+                etag = representation_etag(stream_etag(key, version), encoding)
+                if _etag_matches(etag):
+                    response.close()
+                    response = Response(status=304)
+                elif encoding is not None:
+                    response.response = compress_stream(response.response, encoding)
+                    response.headers['Content-Encoding'] = encoding
+                response.set_etag(etag)
+                response.vary.add('Accept-Encoding')
+                return response
+
+            entry = cache.put(key, version, response.get_data(), response.mimetype, ttl)
+            return _entry_response(entry)
+        return wrapper
+    return decorator
@@ -0,0 +1,84 @@
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+def row_fingerprint(row):
+    """Hash the stripped cell values of a scraped table row."""
+    payload = "\x1f".join("" if cell is None else str(cell).strip() for cell in row)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+class ChangeTracker:
+    """
+    Remembers recently scraped rows so unchanged data never reaches the database.
+
+    Keeps a hash of the last whole table plus a bounded, least-recently-seen
+    set of row fingerprints, optionally persisted to a JSON file so the state
+    survives restarts.
+    """
+
+    def __init__(self, max_rows=5000, path=None):
+        self.max_rows = max_rows
+        self.path = path
+        self.table_hash = None
+        self._seen = OrderedDict()
+        if path:
+            self._load()
+
+    def changed_rows(self, rows):
+        """
+        Filter a scrape down to the rows that have not been seen recently.
+
+        Returns:
+            list: New or changed rows, or None if the whole table is identical
+            to the last one recorded with mark_seen
+        """
+        if self._table_hash(rows) == self.table_hash:
+            return None
+        return [row for row in rows if row_fingerprint(row) not in self._seen]
+
+    def mark_seen(self, rows):
+        """Record a successfully ingested scrape."""
+        for row in rows:
+            fingerprint = row_fingerprint(row)
+            self._seen[fingerprint] = None
+            self._seen.move_to_end(fingerprint)
+        while len(self._seen) > self.max_rows:
+            self._seen.popitem(last=False)
+        self.table_hash = self._table_hash(rows)
+        if self.path:
+            self._save()
+
+    def _table_hash(self, rows):
+        """Hash a whole table, independent of how its cells are padded."""
+        digest = hashlib.sha1()
+        for row in rows:
+            digest.update(row_fingerprint(row).encode("ascii"))
+        return digest.hexdigest()
+
+    def _load(self):
+        """Restore state saved by _save, ignoring a missing or corrupt file."""
+        try:
+            with open(self.path, encoding="utf-8") as state_file:
+                state = json.load(state_file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable change tracker state {self.path}: {e}")
+            return
+
+        self.table_hash = state.get("table_hash")
+        self._seen = OrderedDict((fingerprint, None) for fingerprint in state.get("rows", [])[-self.max_rows:])
+
+    def _save(self):
+        """Write the current state atomically."""
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as state_file:
+                json.dump({"table_hash": self.table_hash, "rows": list(self._seen)}, state_file)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save change tracker state to {self.path}: {e}")
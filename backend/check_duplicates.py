@@ -1,12 +1,16 @@
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
-from database import Event
+from sqlalchemy import bindparam, func, update
+from database import (
+    DEFAULT_SOURCE, Event, ScopedSession, apply_counter_deltas, bump_data_version, counter_deltas,
+    event_fingerprint, event_incident_key, insert, status_states, write_event_units
+)
+from collections import Counter
 from colorama import Fore, Style
+from geocoder import write_event_points
+import broadcast
+import time
 
-DATABASE_URL = "sqlite:///data.db"
-engine = create_engine(DATABASE_URL)
-Session = sessionmaker(bind=engine)
-session = Session()
+# Each thread gets its own session; it is released after every ingest call
+session = ScopedSession
 
 def is_duplicate_event(event_data):
     """
@@ -18,12 +22,8 @@ def is_duplicate_event(event_data):
     Returns:
     - True if a duplicate is found, False otherwise.
     """
-    duplicate_event = session.query(Event).filter_by(
-        title=event_data["title"],
-        location=event_data["location"],
-        datetime=event_data["datetime"],
-        channel=event_data["channel"],
-        status=event_data["status"]
+    duplicate_event = session.query(Event.id).filter_by(
+        fingerprint=event_fingerprint(event_data)
     ).first()
     
     if duplicate_event:
@@ -43,26 +43,207 @@ def insert_event_if_not_duplicate(event_data):
     Parameters:
     - event_data: dict containing the event details (title, location, datetime, channel, status)
     """
-    if not is_duplicate_event(event_data):
-        new_event = Event(
-            title=event_data["title"],
-            location=event_data["location"],
-            datetime=event_data["datetime"],
-            channel=event_data["channel"],
-            status=event_data["status"]
+    try:
+        if not is_duplicate_event(event_data):
+            version = bump_data_version(session)
+            new_event = Event(
+                title=event_data["title"],
+                location=event_data["location"],
+                datetime=event_data["datetime"],
+                channel=event_data["channel"],
+                status=event_data["status"],
+                source=event_data.get("source") or DEFAULT_SOURCE,
+                fingerprint=event_fingerprint(event_data),
+                incident_key=event_incident_key(event_data),
+                data_version=version
+            )
+            session.add(new_event)
+            session.flush()
+            write_event_units(session, [(new_event.id, new_event.datetime, new_event.status)])
+            write_event_points(session, [(new_event.id, new_event.location)])
+            apply_counter_deltas(session, counter_deltas([event_data]))
+            session.commit()
+            broadcast.catch_up()
+            print(f"{Fore.GREEN}[Inserted Event]{Style.RESET_ALL}")
+            print(f"  Title   : {event_data['title']}")
+            print(f"  Location: {event_data['location']}")
+            print(f"  Date/Time: {event_data['datetime']}")
+            print(f"  Channel : {event_data['channel']}")
+            print(f"  Status  : {event_data['status']}\n")
+        else:
+            print(f"{Fore.CYAN}[Skipped Duplicate]{Style.RESET_ALL}")
+            print(f"  Title   : {event_data['title']}")
+            print(f"  Location: {event_data['location']}\n")
+    finally:
+        session.remove()
+
+# Keep IN (...) lists well below SQLite's bound-parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+def _find_existing_fingerprints(fingerprints):
+    """
+    Resolves which of the given fingerprints are already stored in the database.
+    
+    Each chunk is a single lookup against the unique fingerprint index instead
+    of one five-column lookup per event.
+    
+    Parameters:
+    - fingerprints: collection of event fingerprints as returned by event_fingerprint
+    
+    Returns:
+    - The subset of fingerprints already present in the events table.
+    """
+    fingerprints = list(fingerprints)
+    existing = set()
+    for start in range(0, len(fingerprints), LOOKUP_CHUNK_SIZE):
+        chunk = fingerprints[start:start + LOOKUP_CHUNK_SIZE]
+        rows = session.query(Event.fingerprint).filter(Event.fingerprint.in_(chunk))
+        existing.update(row[0] for row in rows)
+    return existing
+
+def _find_tracked_incidents(incident_keys):
+    """
+    Finds the most recent stored row for each of the given incident keys.
+    
+    Parameters:
+    - incident_keys: collection of keys as returned by event_incident_key
+    
+    Returns:
+    - dict mapping incident key to (id, status) of its latest row.
+    """
+    incident_keys = list(incident_keys)
+    tracked = {}
+    for start in range(0, len(incident_keys), LOOKUP_CHUNK_SIZE):
+        chunk = incident_keys[start:start + LOOKUP_CHUNK_SIZE]
+        latest_ids = session.query(func.max(Event.id)).filter(
+            Event.incident_key.in_(chunk)
+        ).group_by(Event.incident_key)
+        rows = session.query(Event.incident_key, Event.id, Event.status).filter(
+            Event.id.in_(latest_ids.scalar_subquery())
         )
-        session.add(new_event)
+        tracked.update((row.incident_key, (row.id, row.status)) for row in rows)
+    return tracked
+
+def insert_events_bulk(events_data):
+    """
+    Inserts a whole batch of events, skipping any that are duplicates either
+    within the batch or of rows already in the database.
+    
+    A row for an incident that is already stored with a different status (for
+    example units moving from "Dispatched" to "On Scene") updates that
+    incident's latest row instead of inserting a new one.
+    
+    All changes are written in a single transaction, new rows with an
+    INSERT ... ON CONFLICT DO NOTHING statement, together with the matching
+    updates to the running event counters, the parsed unit states in
+    event_units and the coordinates of newly seen incidents in event_points. The data version is only bumped
+    when at least one event is inserted or updated; changed rows are stamped
+    with it and pushed to live stream subscribers.
+    
+    Parameters:
+    - events_data: iterable of dicts containing the event details (title, location, datetime, channel, status)
+      and optionally the tag of the source they were scraped from
+    
+    Returns:
+    - dict with the number of events inserted, updated and skipped, the elapsed time in seconds and
+      how much of it went to finding duplicates (dedup_elapsed) and to the transaction (insert_elapsed).
+    """
+    start_time = time.perf_counter()
+    
+    # Collapse the batch to one row per incident, keeping the latest status seen
+    batch = {}
+    received = 0
+    for event_data in events_data:
+        received += 1
+        batch[event_incident_key(event_data)] = event_data
+    
+    fingerprints = {key: event_fingerprint(event_data) for key, event_data in batch.items()}
+    new_events = []
+    status_updates = []
+    deltas = Counter()
+    if batch:
+        existing = _find_existing_fingerprints(fingerprints.values())
+        changed = {key: event_data for key, event_data in batch.items()
+                   if fingerprints[key] not in existing}
+        tracked = _find_tracked_incidents(changed)
+        
+        for key, event_data in changed.items():
+            if key in tracked:
+                row_id, old_status = tracked[key]
+                status_updates.append({
+                    "row_id": row_id,
+                    "datetime": event_data["datetime"],
+                    "status": event_data["status"],
+                    "fingerprint": fingerprints[key]
+                })
+                for state in status_states(old_status):
+                    deltas[('status', state)] -= 1
+                for state in status_states(event_data["status"]):
+                    deltas[('status', state)] += 1
+            else:
+                new_events.append({
+                    "title": event_data["title"],
+                    "location": event_data["location"],
+                    "datetime": event_data["datetime"],
+                    "channel": event_data["channel"],
+                    "status": event_data["status"],
+                    "source": event_data.get("source") or DEFAULT_SOURCE,
+                    "fingerprint": fingerprints[key],
+                    "incident_key": key
+                })
+    dedup_time = time.perf_counter()
+    
+    inserted = []
+    try:
+        if new_events or status_updates:
+            version = bump_data_version(session)
+            for row in new_events + status_updates:
+                row["data_version"] = version
+            if new_events:
+                inserted = session.execute(
+                    insert(Event).on_conflict_do_nothing(index_elements=['fingerprint'])
+                    .returning(Event.id, Event.datetime, Event.status, Event.location, Event.title, Event.channel),
+                    new_events
+                ).all()
+                # Only the rows actually written: another thread or process may have stored some first
+                deltas.update(counter_deltas(row._mapping for row in inserted))
+                write_event_units(session, [(row.id, row.datetime, row.status) for row in inserted])
+                write_event_points(session, [(row.id, row.location) for row in inserted])
+            if status_updates:
+                session.execute(
+                    update(Event.__table__).where(Event.__table__.c.id == bindparam('row_id'))
+                    .values(status=bindparam('status'), fingerprint=bindparam('fingerprint'),
+                            data_version=bindparam('data_version')),
+                    status_updates
+                )
+                write_event_units(session, [
+                    (row["row_id"], row["datetime"], row["status"]) for row in status_updates
+                ], replace=True)
+            apply_counter_deltas(session, deltas)
         session.commit()
-        print(f"{Fore.GREEN}[Inserted Event]{Style.RESET_ALL}")
-        print(f"  Title   : {event_data['title']}")
-        print(f"  Location: {event_data['location']}")
-        print(f"  Date/Time: {event_data['datetime']}")
-        print(f"  Channel : {event_data['channel']}")
-        print(f"  Status  : {event_data['status']}\n")
-    else:
-        print(f"{Fore.CYAN}[Skipped Duplicate]{Style.RESET_ALL}")
-        print(f"  Title   : {event_data['title']}")
-        print(f"  Location: {event_data['location']}\n")
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.remove()
+    insert_time = time.perf_counter()
+    
+    # Push the new rows to live stream subscribers in this process
+    if new_events or status_updates:
+        broadcast.catch_up()
+    
+    summary = {
+        "inserted": len(inserted),
+        "updated": len(status_updates),
+        "skipped": received - len(inserted) - len(status_updates),
+        "elapsed": time.perf_counter() - start_time,
+        "dedup_elapsed": dedup_time - start_time,
+        "insert_elapsed": insert_time - dedup_time
+    }
+    print(f"{Fore.GREEN}[Batch Ingested]{Style.RESET_ALL} "
+          f"inserted={summary['inserted']} updated={summary['updated']} "
+          f"skipped={summary['skipped']} elapsed={summary['elapsed']:.3f}s")
+    return summary
 
 if __name__ == "__main__":
     # Example event data to check and insert if not a duplicate
@@ -76,5 +257,3 @@ if __name__ == "__main__":
 
     insert_event_if_not_duplicate(example_event_data)
 
-    session.close()
-
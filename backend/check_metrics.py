@@ -0,0 +1,82 @@
+"""
+Checks that metrics are counted, added up across processes and exported in
+the Prometheus text format.
+
+    python check_metrics.py
+"""
+from colorama import Fore, Style
+import sys
+import tempfile
+
+def run_checks():
+    """
+    Run every check.
+
+    Returns:
+        list: (description, passed) tuples
+    """
+    import config
+    from metrics import Counter, Histogram, Registry, merge, render
+
+    results = []
+
+    def check(description, passed):
+        results.append((description, bool(passed)))
+
+    histogram = Histogram('stage_seconds', "Stage time", ('stage',), buckets=(0.01, 0.1, 1))
+    for seconds in (0.005, 0.01, 0.05, 5):
+        histogram.observe(seconds, stage='parse')
+    exposition = render(merge([{'stage_seconds': histogram.snapshot()}]))
+    check("histogram buckets are cumulative and include their upper bound",
+          'stage_seconds_bucket{stage="parse",le="0.01"} 2' in exposition
+          and 'stage_seconds_bucket{stage="parse",le="0.1"} 3' in exposition
+          and 'stage_seconds_bucket{stage="parse",le="1.0"} 3' in exposition
+          and 'stage_seconds_bucket{stage="parse",le="+Inf"} 4' in exposition
+          and 'stage_seconds_count{stage="parse"} 4' in exposition
+          and 'stage_seconds_sum{stage="parse"} 5.065' in exposition)
+
+    counter = Counter('rows_total', "Rows", ('source',))
+    counter.inc(source='a "quoted"\\name')
+    check("label values are escaped",
+          'rows_total{source="a \\"quoted\\"\\\\name"} 1' in render(merge([{'rows_total': counter.snapshot()}])))
+
+    # Two processes writing snapshots to the same METRICS_DIR
+    previous_dir = config.METRICS_DIR
+    config.METRICS_DIR = tempfile.mkdtemp(prefix='fires-metrics-')
+    try:
+        processes = []
+        for rows, seconds in ((2, 0.02), (3, 0.5)):
+            registry = Registry()
+            registry.snapshot_name = f"metrics-{len(processes)}.json"
+            registry.register(Counter('rows_total', "Rows", ('source',))).inc(rows, source='tempe')
+            registry.register(Histogram('stage_seconds', "Stage time", ('stage',))).observe(seconds, stage='insert')
+            registry.flush()
+            processes.append(registry)
+        collected = processes[0].collect()
+        exposition = render(merge(collected))
+    finally:
+        config.METRICS_DIR = previous_dir
+    check("/metrics adds up the snapshots of every process, its own counted once",
+          len(collected) == 2
+          and 'rows_total{source="tempe"} 5' in exposition
+          and 'stage_seconds_count{stage="insert"} 2' in exposition
+          and 'stage_seconds_bucket{stage="insert",le="0.025"} 1' in exposition)
+
+    mismatched = Histogram('stage_seconds', "Stage time", ('stage',), buckets=(1, 2))
+    mismatched.observe(1.5, stage='insert')
+    merged = merge([{'stage_seconds': histogram.snapshot()}, {'stage_seconds': mismatched.snapshot()}])
+    check("snapshots with other bucket bounds are left out of the sum",
+          ('insert',) not in merged['stage_seconds']['series']
+          and merged['stage_seconds']['series'][('parse',)][0] == [2, 1, 0, 1])
+
+    return results
+
+def main():
+    results = run_checks()
+    for description, passed in results:
+        label = f"{Fore.GREEN}[PASS]" if passed else f"{Fore.RED}[FAIL]"
+        print(f"{label}{Style.RESET_ALL} {description}")
+    return 0 if all(passed for _, passed in results) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Checks that the adaptive scrape schedule reacts to change rates and failures.
+
+    python check_scheduler.py
+
+The schedules are driven with simulated cycle times, so the checks run in
+well under a second and need no dashboard.
+"""
+from colorama import Fore, Style
+import os
+import random
+import sys
+import tempfile
+
+def run_checks():
+    """
+    Run every check.
+
+    Returns:
+        list: (description, passed) tuples
+    """
+    from scheduler import AdaptiveSchedule
+
+    results = []
+
+    def check(description, passed):
+        results.append((description, bool(passed)))
+
+    def schedule():
+        return AdaptiveSchedule('tempe', interval=600, min_interval=60, max_interval=1800,
+                                backoff_base=30, rng=random.Random(0))
+
+    quiet = schedule()
+    quiet.record(True, 5, started=0)
+    quiet.record(True, 0, started=600)
+    check("a source that stopped changing is scraped at the longest interval", quiet.interval == 1800)
+
+    # A day at one change every ten minutes, then a burst of twenty per cycle
+    busy = schedule()
+    started = 0
+    for _ in range(144):
+        started += busy.record(True, 1, started=started)
+    typical_interval = busy.interval
+    for _ in range(6):
+        started += busy.record(True, 20, started=started)
+    check("a steady source keeps about the base interval and a busy one is scraped sooner",
+          500 <= typical_interval <= 700 and busy.interval < typical_interval / 2)
+
+    failing = schedule()
+    backoffs = [failing.record(False, started=0) for _ in range(8)]
+    bounds = [min(1800, 30 * 2 ** failures) for failures in range(8)]
+    check("failures back off exponentially with jitter, up to the longest interval",
+          all(bound / 2 <= backoff <= bound for backoff, bound in zip(backoffs, bounds))
+          and failing.consecutive_failures == 8)
+
+    failing.record(True, 0, started=0)
+    check("a successful cycle ends the failure streak",
+          failing.consecutive_failures == 0 and failing.next_due == failing.interval)
+
+    return results
+
+def main():
+    # scheduler imports database, which creates its tables on import
+    os.environ.setdefault('DATABASE_URL',
+                          f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='fires-scheduler-'), 'check.db')}")
+    results = run_checks()
+    for description, passed in results:
+        label = f"{Fore.GREEN}[PASS]" if passed else f"{Fore.RED}[FAIL]"
+        print(f"{label}{Style.RESET_ALL} {description}")
+    return 0 if all(passed for _, passed in results) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""
+Checks that ingest and query semantics hold on a storage backend.
+
+    python check_storage.py               # throwaway SQLite file
+    python check_storage.py --postgres    # throwaway PostgreSQL (needs testing.postgresql and initdb)
+    python check_storage.py --url URL     # an existing, empty database
+
+Run it once per backend; every check must pass identically on each.
+"""
+from colorama import Fore, Style
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+import argparse
+import io
+import os
+import sys
+import tempfile
+
+def _event(title, minutes, status, channel='Channel A1'):
+    """Build an event dict at a fixed offset from a reference time."""
+    return {
+        "title": title,
+        "location": "200 E BASELINE RD ,TMP",
+        "datetime": datetime(2024, 8, 22, 1, 0) + timedelta(minutes=minutes),
+        "channel": channel,
+        "status": status
+    }
+
+def run_checks():
+    """
+    Run every check against the configured DATABASE_URL.
+
+    Returns:
+        list: (description, passed) tuples
+    """
+    from archive import archive_events, read_archives
+    from check_duplicates import insert_events_bulk, is_duplicate_event
+    from backfill import bulk_load_events
+    from database import DEFAULT_SOURCE, DERIVED_COLUMNS, Event, Session, engine
+    from queries import build_events_query, parse_event_params
+    from scheduler import AdaptiveSchedule, read_schedules, save_schedules
+    from search import build_search_query
+    from sqlalchemy import func, select
+    from stats import compute_stats, window_breakdowns
+    import app
+    import config
+
+    results = []
+
+    def check(description, passed):
+        results.append((description, bool(passed)))
+
+    gas_leak = _event("NATURAL GAS LEAK", 0, "E272: Dispatched")
+    brush_fire = _event("BRUSH FIRE", 10, "E24: Dispatched", channel="Channel A3")
+    medical = _event("MEDICAL", 20, "R4: On Scene")
+
+    with redirect_stdout(io.StringIO()):
+        first = insert_events_bulk([gas_leak, brush_fire, gas_leak])
+        repeat = insert_events_bulk([gas_leak, brush_fire])
+        transition = insert_events_bulk([dict(gas_leak, status="E272: On Scene"), medical])
+        duplicate_found = is_duplicate_event(medical)
+
+    check("duplicates inside a batch are skipped", first['inserted'] == 2 and first['skipped'] == 1)
+    check("rows already stored are skipped", repeat['inserted'] == 0 and repeat['skipped'] == 2)
+    check("a status change updates the tracked incident",
+          transition['updated'] == 1 and transition['inserted'] == 1)
+    check("single-event duplicate probe finds stored rows", duplicate_found)
+
+    session = Session()
+    try:
+        rows = session.execute(build_events_query(**parse_event_params({}))).all()
+        check("one row per incident is stored", len(rows) == 3)
+        check("events are ordered newest first", [row.title for row in rows] == ["MEDICAL", "BRUSH FIRE", "NATURAL GAS LEAK"])
+        check("the incident carries its latest status",
+              next(row.status for row in rows if row.title == "NATURAL GAS LEAK") == "E272: On Scene")
+
+        page = session.execute(build_events_query(**parse_event_params({'limit': '2'}))).all()
+        last = page[-1]
+        rest = session.execute(build_events_query(**parse_event_params(
+            {'limit': '2', 'before': f"{last.datetime.isoformat()},{last.id}"}
+        ))).all()
+        check("keyset pagination visits every row once",
+              [row.id for row in page + rest] == [row.id for row in rows])
+
+        check("channel filter",
+              [row.title for row in session.execute(build_events_query(channel="Channel A3"))] == ["BRUSH FIRE"])
+        check("case-insensitive title search",
+              [row.title for row in session.execute(build_events_query(title="gas"))] == ["NATURAL GAS LEAK"])
+
+        check("unit filter",
+              [row.title for row in session.execute(build_events_query(**parse_event_params({'unit': 'e272'})))]
+              == ["NATURAL GAS LEAK"])
+        check("unit state filter follows status changes",
+              [row.title for row in session.execute(build_events_query(**parse_event_params(
+                  {'unit': 'E272', 'state': 'On Scene'}
+              )))] == ["NATURAL GAS LEAK"]
+              and not session.execute(build_events_query(unit='E272', state='Dispatched')).all())
+        check("state filter with a time window",
+              [row.title for row in session.execute(build_events_query(
+                  state='Dispatched', since=datetime(2024, 8, 22, 1, 5)
+              ))] == ["BRUSH FIRE"])
+
+        check("full-text search over title and location",
+              [row.title for row in session.execute(build_search_query(words=['gas', 'baseline']))]
+              == ["NATURAL GAS LEAK"]
+              and len(session.execute(build_search_query(words=['baseline'])).all()) == 3)
+
+        stats = compute_stats(session, now=datetime(2024, 8, 22, 12, 0))
+        window = window_breakdowns(session)
+        check("running counters match a full recount",
+              stats['status_breakdown'] == window['status'] and stats['type_breakdown'] == window['type']
+              and stats['channel_breakdown'] == window['channel'] and stats['total_events'] == 3)
+        check("24 hour count", stats['recent_24h'] == 3)
+
+        hourly = compute_stats(session, since=datetime(2024, 8, 22), bucket='hour')
+        check("hourly timeline buckets",
+              hourly['timeline'] == [{'bucket': '2024-08-22 01:00:00', 'count': 3}])
+    finally:
+        session.close()
+
+    reload = [dict(event, source=DEFAULT_SOURCE, **{column: derive(event) for column, derive in DERIVED_COLUMNS.items()})
+              for event in (medical, _event("STRUCTURE FIRE", 30, "E1: Command"))]
+    with engine.begin() as connection:
+        loaded = bulk_load_events(connection, reload)
+    check("bulk load skips stored rows and inserts new ones", loaded == 1)
+
+    with redirect_stdout(io.StringIO()):
+        other_source = insert_events_bulk([dict(gas_leak, source='tempe')])
+    session = Session()
+    try:
+        tagged = session.execute(build_events_query(**parse_event_params({'source': 'tempe'}))).all()
+        untagged = session.execute(build_events_query(source=DEFAULT_SOURCE)).all()
+    finally:
+        session.close()
+    check("the same incident from another source is stored separately and tagged",
+          other_source['inserted'] == 1 and [(row.title, row.source) for row in tagged] == [("NATURAL GAS LEAK", "tempe")]
+          and len(untagged) == 4)
+
+    schedule = AdaptiveSchedule('tempe', interval=600, min_interval=60, max_interval=1800, backoff_base=30)
+    schedule.record(True, 5, started=0)
+    save_schedules([schedule])
+    schedule.record(False, started=600)
+    save_schedules([schedule])
+    session = Session()
+    try:
+        stored = read_schedules(session)
+    finally:
+        session.close()
+    check("a saved scrape schedule is updated in place",
+          [(row['source'], row['last_changes'], row['consecutive_failures']) for row in stored] == [('tempe', 5, 1)])
+
+    client = app.app.test_client()
+
+    def api_pages(query):
+        # Every page of /api/events, one event per page, following the cursors
+        pages, cursor = [], ''
+        while cursor is not None:
+            body = client.get(f"/api/events?limit=1{query}&before={cursor}").get_json()
+            pages.extend(event['id'] for event in body['events'])
+            cursor = body['next_cursor']
+        return pages
+
+    queries = ['', '&unit=E272', '&since=2024-08-22T01:05:00', '&channel=Channel%20A3']
+    before = [(client.get(f"/api/events?{query}").get_json()['events'], api_pages(query)) for query in queries]
+    config.ARCHIVE_DIR = tempfile.mkdtemp(prefix='fires-archive-')
+    moved, unfinished = archive_events(retention_days=1, batch_size=1, now=datetime(2024, 8, 23, 1, 15))
+    after = [(client.get(f"/api/events?{query}").get_json()['events'], api_pages(query)) for query in queries]
+    session = Session()
+    try:
+        hot = session.execute(select(func.count()).select_from(Event)).scalar_one()
+        archives = read_archives(session)
+    finally:
+        session.close()
+    check("archived events stay reachable through /api/events, filters and cursors included",
+          moved == 3 and not unfinished and hot == 2 and [row['month'] for row in archives] == ['2024-08']
+          and after == before)
+
+    # Archiving empties the events table, after which new events must not reuse archived ids
+    archive_events(retention_days=1, now=datetime(2024, 8, 23, 2, 0))
+    archived_ids = {event['id'] for event in client.get("/api/events").get_json()['events']}
+    with redirect_stdout(io.StringIO()):
+        insert_events_bulk([_event("SMOKE CHECK", 40, "E9: Dispatched")])
+    archive_events(retention_days=1, now=datetime(2024, 8, 23, 2, 0))
+    events = client.get("/api/events").get_json()['events']
+    check("ids of archived events are not reused, and later events archive alongside them",
+          len(archived_ids) == 5 and len(events) == 6 and events[0]['title'] == "SMOKE CHECK"
+          and events[0]['id'] > max(archived_ids))
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help="SQLAlchemy URL of an empty database to check")
+    parser.add_argument('--postgres', action='store_true', help="Start a throwaway PostgreSQL server")
+    args = parser.parse_args()
+
+    postgres = None
+    if args.postgres:
+        import testing.postgresql
+        postgres = testing.postgresql.Postgresql()
+        os.environ['DATABASE_URL'] = postgres.url().replace('postgresql://', 'postgresql+psycopg2://', 1)
+    elif args.url:
+        os.environ['DATABASE_URL'] = args.url
+    else:
+        path = os.path.join(tempfile.mkdtemp(prefix='fires-storage-'), 'check.db')
+        os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+
+    try:
+        print(f"Checking {os.environ['DATABASE_URL']}")
+        results = run_checks()
+    finally:
+        if postgres is not None:
+            postgres.stop()
+
+    for description, passed in results:
+        label = f"{Fore.GREEN}[PASS]" if passed else f"{Fore.RED}[FAIL]"
+        print(f"{label}{Style.RESET_ALL} {description}")
+    return 0 if all(passed for _, passed in results) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
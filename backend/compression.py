@@ -0,0 +1,115 @@
+"""
+gzip and brotli compression of API responses.
+
+Cached responses are compressed once per encoding and kept alongside the
+plain body; streamed responses are compressed chunk by chunk.
+"""
+import zlib
+import config
+
+# Optional brotli support; only gzip is offered when it is missing
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# zlib level and brotli quality; dynamic responses favour speed over ratio
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+def available_encodings():
+    """Configured encodings this process can produce, in order of preference."""
+    return [encoding for encoding in config.API_COMPRESSION
+            if encoding == 'gzip' or (encoding == 'br' and brotli is not None)]
+
+def choose_encoding(accept_encoding):
+    """
+    Pick the preferred configured encoding the client accepts.
+
+    Args:
+        accept_encoding (str): The request's Accept-Encoding header
+
+    Returns:
+        str: 'br', 'gzip' or None for an uncompressed response
+    """
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    for encoding in available_encodings():
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return None
+
+def compress(body, encoding):
+    """Compress a complete response body."""
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+class StreamCompressor:
+    """Compresses a response chunk by chunk, flushing after each chunk."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data):
+        """Compress one chunk so the client can decode it right away."""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if self.encoding == 'br':
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        """Return the end of the compressed stream."""
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of response chunks."""
+    compressor = StreamCompressor(encoding)
+    for data in chunks:
+        yield compressor.chunk(data)
+    yield compressor.finish()
+
+async def compress_stream_async(chunks, encoding):
+    """Compress an async iterable of response chunks."""
+    compressor = StreamCompressor(encoding)
+    async for data in chunks:
+        yield compressor.chunk(data)
+    yield compressor.finish()
+
+def encoded_body(entry, encoding):
+    """
+    Return a cache entry's body in the given encoding, compressing it on
+    first use and keeping the result in the entry.
+
+    Returns:
+        tuple: (body, encoding actually used); small bodies stay uncompressed
+    """
+    if encoding is None or len(entry['body']) < config.API_COMPRESSION_MIN_BYTES:
+        return entry['body'], None
+    encodings = entry.setdefault('encodings', {})
+    if encoding not in encodings:
+        encodings[encoding] = compress(entry['body'], encoding)
+    return encodings[encoding], encoding
+
+def representation_etag(etag, encoding):
+    """ETag of one encoding of a response, distinct from the plain body's."""
+    return etag if encoding is None else f"{etag}-{encoding}"
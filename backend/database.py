@@ -1,10 +1,37 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import (
+    create_engine, event, Column, Integer, String, DateTime, Float, Index, MetaData, Table,
+    bindparam, delete, func, inspect, or_, select, text, update
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import declarative_base, scoped_session, sessionmaker
+from sqlalchemy.schema import CreateTable
+from collections import Counter
+from datetime import datetime
+import hashlib
+import re
+import config
 
 # Database setup
-DATABASE_URL = "sqlite:///data.db"
+DATABASE_URL = config.DATABASE_URL
 Base = declarative_base()
 
+# Rows are read and rewritten in batches of this size during migrations
+MIGRATION_BATCH_SIZE = 1000
+
+def insert(model):
+    """
+    Build an INSERT for the configured database that supports the
+    on_conflict_do_nothing/on_conflict_do_update upsert clauses.
+    """
+    if engine.dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+# Source tag of events from the single dashboard configured through DASHBOARD_URL
+DEFAULT_SOURCE = 'default'
+
 class Event(Base):
     __tablename__ = 'events'
     id = Column(Integer, primary_key=True)
@@ -13,7 +40,637 @@ class Event(Base):
     datetime = Column(DateTime)
     channel = Column(String)
     status = Column(String)
+    fingerprint = Column(String(64))
+    incident_key = Column(String(64))
+    # Data version at which the row was last inserted or changed
+    data_version = Column(Integer)
+    # Tag of the dashboard the event was scraped from
+    source = Column(String, nullable=False, default=DEFAULT_SOURCE, server_default=DEFAULT_SOURCE)
+
+    __table_args__ = (
+        Index('ix_events_fingerprint', 'fingerprint', unique=True),
+        Index('ix_events_incident_key', 'incident_key'),
+        Index('ix_events_datetime', 'datetime'),
+        Index('ix_events_status_datetime', 'status', 'datetime'),
+        Index('ix_events_data_version', 'data_version'),
+        Index('ix_events_source_datetime', 'source', 'datetime'),
+        # Ids of archived events are never handed out again, so id watermarks
+        # (rollups) and the archives (archive.py) never see an id twice
+        {'sqlite_autoincrement': True},
+    )
+
+class EventCounter(Base):
+    """Running event totals per dimension, maintained at ingest time."""
+    __tablename__ = 'event_counters'
+    dimension = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class DataVersion(Base):
+    """Single-row counter bumped whenever ingest changes the events table."""
+    __tablename__ = 'data_version'
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class Unit(Base):
+    """Interned unit names, such as E272, referenced by event_units."""
+    __tablename__ = 'units'
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+
+class UnitState(Base):
+    """Interned unit states, such as On Scene, referenced by event_units."""
+    __tablename__ = 'unit_states'
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+
+class EventUnit(Base):
+    """A unit assigned to an event and its current state, parsed from Event.status."""
+    __tablename__ = 'event_units'
+    event_id = Column(Integer, primary_key=True)
+    unit_id = Column(Integer, primary_key=True)
+    state_id = Column(Integer, nullable=False)
+    # Copy of the event's datetime, so unit and state queries can filter by time in the index
+    datetime = Column(DateTime)
+
+    __table_args__ = (
+        Index('ix_event_units_unit_state_datetime', 'unit_id', 'state_id', 'datetime'),
+        Index('ix_event_units_state_datetime', 'state_id', 'datetime'),
+    )
+
+class Geocode(Base):
+    """Cached gazetteer lookup of a normalized address; no coordinates if it was not found."""
+    __tablename__ = 'geocodes'
+    address = Column(String, primary_key=True)
+    latitude = Column(Float)
+    longitude = Column(Float)
+
+# Coordinates of geocoded events as zero-size boxes keyed by event id. On SQLite
+# this is an R*Tree virtual table, so it lives outside Base and is created by
+# create_search_tables instead of create_all.
+event_points = Table(
+    'event_points', MetaData(),
+    Column('id', Integer, primary_key=True),
+    Column('min_lat', Float), Column('max_lat', Float),
+    Column('min_lon', Float), Column('max_lon', Float),
+    Index('ix_event_points_lat_lon', 'min_lat', 'min_lon')
+)
+
+class EventRollup(Base):
+    """Event counts per time bucket, incident type and channel, maintained by rollups.py."""
+    __tablename__ = 'event_rollups'
+    bucket = Column(String, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    incident_type = Column(String, primary_key=True)
+    channel = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class ScrapeSchedule(Base):
+    """Current scrape schedule of each source, written by the scraper after every cycle."""
+    __tablename__ = 'scrape_schedules'
+    source = Column(String, primary_key=True)
+    # Seconds between successful scrapes, adapted to the source's change rate
+    interval = Column(Float, nullable=False)
+    # New or changed rows per hour, averaged over recent cycles
+    change_rate = Column(Float)
+    last_changes = Column(Integer)
+    consecutive_failures = Column(Integer, nullable=False, default=0)
+    last_run = Column(DateTime)
+    next_run = Column(DateTime)
+
+class EventArchive(Base):
+    """A month of events moved out of the events table by archive.py."""
+    __tablename__ = 'event_archives'
+    month = Column(String, primary_key=True)
+    first_datetime = Column(DateTime, nullable=False)
+    # Events up to the newest one archived are read from the archives, later ones from events
+    last_datetime = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime)
+
+class JobState(Base):
+    """Progress markers of background jobs, such as the last event id rolled up."""
+    __tablename__ = 'job_state'
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+def read_job_state(connection, name, for_update=False):
+    """
+    Returns a job's progress marker, or 0 if it has never run.
+
+    With `for_update`, the row is locked until the transaction ends on
+    databases that support it, so concurrent runs of a job do not overlap.
+    """
+    stmt = select(JobState.value).where(JobState.name == name)
+    if for_update:
+        # Make sure there is a row to lock on the job's first run
+        connection.execute(insert(JobState).values(name=name, value=0).on_conflict_do_nothing())
+        stmt = stmt.with_for_update()
+    return connection.execute(stmt).scalar() or 0
+
+def write_job_state(connection, name, value):
+    """Stores a job's progress marker in the current transaction."""
+    stmt = insert(JobState).values(name=name, value=value)
+    connection.execute(stmt.on_conflict_do_update(index_elements=['name'], set_={'value': value}))
+
+def bump_data_version(connection):
+    """Increments the data version in the current transaction and returns the new version."""
+    connection.execute(
+        update(DataVersion).where(DataVersion.id == 1).values(version=DataVersion.version + 1)
+    )
+    return read_data_version(connection)
+
+def read_data_version(connection):
+    """Returns the current data version."""
+    return connection.execute(
+        select(DataVersion.version).where(DataVersion.id == 1)
+    ).scalar_one()
+
+def lock_data_version(connection):
+    """
+    Locks the data version row until the current transaction ends.
+
+    Every transaction that inserts events must hold this lock (bump_data_version
+    takes it too) before its rows are given ids, so that on PostgreSQL, where
+    sequence ids are handed out before commit, ids become visible in order.
+    """
+    connection.execute(select(DataVersion.version).where(DataVersion.id == 1).with_for_update())
+
+def committed_event_id(connection):
+    """
+    Returns the highest event id below which no insert is still in flight.
+
+    Waits for the writers holding the data version lock to commit, so id
+    watermarks (rollups, exports) read up to this id never skip a row that
+    commits later with a lower id. Run it in a transaction of its own: ingest
+    is blocked until that transaction ends.
+    """
+    connection.execute(select(DataVersion.version).where(DataVersion.id == 1).with_for_update(read=True))
+    return connection.execute(select(func.max(Event.id))).scalar() or 0
+
+# Dimensions tracked in event_counters
+COUNTER_DIMENSIONS = ('status', 'type', 'channel')
+
+# Revision of the event_counters keys; counters are rebuilt when it changes
+COUNTER_FORMAT = 2
+
+def normalize_incident_type(title):
+    """Normalize an event title into an incident type (upper case, single spaces)."""
+    return " ".join((title or "").split()).upper()
+
+# A unit code and its colon, then the state up to the next unit code
+STATUS_PATTERN = re.compile(r'(\S+):\s*(.*?)(?=\s+\S+:|\s*$)')
+
+def parse_status(status):
+    """
+    Splits a dashboard status such as "E272: On Scene E273: Command" into
+    units and their states, with whitespace (including non-breaking spaces)
+    normalized.
+
+    Returns:
+    - dict mapping unit (upper case) to state, in the order listed.
+    """
+    text = " ".join((status or "").split())
+    return {unit.upper(): state for unit, state in STATUS_PATTERN.findall(text)}
+
+def status_states(status):
+    """
+    Returns the distinct unit states in a status, which is how the status
+    counters break events down. A status without any units counts as itself.
+    """
+    states = list(dict.fromkeys(parse_status(status).values()))
+    return states or [" ".join((status or "").split())]
+
+def counter_deltas(events_data):
+    """
+    Tallies how a batch of events changes the running counters.
+
+    Parameters:
+    - events_data: iterable of dicts containing the event details
+
+    Returns:
+    - Counter keyed by (dimension, key) tuples.
+    """
+    deltas = Counter()
+    for event_data in events_data:
+        for state in status_states(event_data["status"]):
+            deltas[('status', state)] += 1
+        deltas[('type', normalize_incident_type(event_data["title"]))] += 1
+        deltas[('channel', event_data["channel"] or "")] += 1
+    return deltas
+
+def apply_counter_deltas(connection, deltas):
+    """
+    Adds the given deltas to the event_counters table in the current transaction.
+
+    Parameters:
+    - connection: Connection or Session to execute on
+    - deltas: Counter keyed by (dimension, key) as returned by counter_deltas
+    """
+    if not deltas:
+        return
+    stmt = insert(EventCounter)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['dimension', 'key'],
+        set_={'count': EventCounter.count + stmt.excluded.count}
+    )
+    connection.execute(stmt, [
+        {"dimension": dimension, "key": key, "count": count}
+        for (dimension, key), count in deltas.items()
+    ])
+
+def rebuild_counters(connection):
+    """Recomputes event_counters from the events table."""
+    events = Event.__table__
+    deltas = Counter()
+    rows = connection.execute(
+        select(events.c.title, events.c.channel, events.c.status, func.count())
+        .group_by(events.c.title, events.c.channel, events.c.status)
+    )
+    for title, channel, status, count in rows:
+        for state in status_states(status):
+            deltas[('status', state)] += count
+        deltas[('type', normalize_incident_type(title))] += count
+        deltas[('channel', channel or "")] += count
+
+    connection.execute(EventCounter.__table__.delete())
+    apply_counter_deltas(connection, deltas)
+
+# Keep IN (...) lists well below SQLite's bound-parameter limit
+NAME_LOOKUP_CHUNK_SIZE = 500
+
+def intern_names(connection, model, names):
+    """
+    Looks up the ids of unit or state names, inserting the ones not seen before.
 
-engine = create_engine(DATABASE_URL)
+    Parameters:
+    - connection: Connection or Session to execute on
+    - model: Unit or UnitState
+    - names: collection of names
+
+    Returns:
+    - dict mapping each name to its id.
+    """
+    names = list(names)
+    ids = {}
+
+    def lookup(batch):
+        for start in range(0, len(batch), NAME_LOOKUP_CHUNK_SIZE):
+            chunk = batch[start:start + NAME_LOOKUP_CHUNK_SIZE]
+            ids.update(connection.execute(select(model.name, model.id).where(model.name.in_(chunk))).all())
+
+    lookup(names)
+    missing = [name for name in names if name not in ids]
+    if missing:
+        connection.execute(
+            insert(model).on_conflict_do_nothing(index_elements=['name']),
+            [{"name": name} for name in missing]
+        )
+        lookup(missing)
+    return ids
+
+def write_event_units(connection, events, replace=False):
+    """
+    Stores the parsed units and states of the given events in event_units.
+
+    Parameters:
+    - connection: Connection or Session to execute on
+    - events: iterable of (event_id, datetime, status) tuples
+    - replace: delete the events' existing unit rows first, for status changes
+    """
+    parsed = [(event_id, event_datetime, parse_status(status)) for event_id, event_datetime, status in events]
+    if not parsed:
+        return
+    unit_ids = intern_names(connection, Unit, {unit for _, _, units in parsed for unit in units})
+    state_ids = intern_names(connection, UnitState, {state for _, _, units in parsed for state in units.values()})
+
+    if replace:
+        event_ids = [event_id for event_id, _, _ in parsed]
+        for start in range(0, len(event_ids), NAME_LOOKUP_CHUNK_SIZE):
+            connection.execute(delete(EventUnit).where(
+                EventUnit.event_id.in_(event_ids[start:start + NAME_LOOKUP_CHUNK_SIZE])
+            ))
+
+    rows = [
+        {"event_id": event_id, "unit_id": unit_ids[unit], "state_id": state_ids[state], "datetime": event_datetime}
+        for event_id, event_datetime, units in parsed
+        for unit, state in units.items()
+    ]
+    if rows:
+        connection.execute(insert(EventUnit), rows)
+
+def backfill_event_units(engine, batch_size=MIGRATION_BATCH_SIZE):
+    """
+    Parses the status of every stored event into event_units.
+
+    Events are read in id order, one batch per transaction, so memory use
+    does not grow with the table. Safe to run repeatedly.
+
+    Returns:
+    - Number of events processed.
+    """
+    events = Event.__table__
+    processed = 0
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                select(events.c.id, events.c.datetime, events.c.status)
+                .where(events.c.id > last_id)
+                .order_by(events.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            write_event_units(connection, rows, replace=True)
+        processed += len(rows)
+        last_id = rows[-1].id
+
+    with engine.begin() as connection:
+        write_job_state(connection, 'event_units', 1)
+    return processed
+
+def _hash_event_fields(event_data, fields):
+    """
+    Hex-encoded SHA-256 over the given event fields, with datetimes normalized.
+
+    Events from a source other than the default one also hash their source tag,
+    so dashboards never deduplicate or update each other's incidents, while
+    the hashes of default-source rows stored before sources existed stay valid.
+    """
+    parts = []
+    for field in fields:
+        value = event_data[field]
+        if isinstance(value, datetime):
+            value = value.strftime('%Y-%m-%d %H:%M:%S')
+        parts.append("" if value is None else str(value))
+    source = event_data.get("source")
+    if source and source != DEFAULT_SOURCE:
+        parts.append(source)
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+def event_fingerprint(event_data):
+    """
+    Computes the deterministic content hash that identifies an event.
+
+    Parameters:
+    - event_data: dict containing the event details (title, location, datetime, channel, status)
+
+    Returns:
+    - Hex-encoded SHA-256 of the event's title, location, datetime, channel and status.
+    """
+    return _hash_event_fields(event_data, ("title", "location", "datetime", "channel", "status"))
+
+def event_incident_key(event_data):
+    """
+    Computes the hash that identifies the incident an event row describes.
+
+    Unlike the fingerprint it leaves out the status, so successive unit status
+    updates for the same call share one incident key.
+    """
+    return _hash_event_fields(event_data, ("title", "location", "datetime", "channel"))
+
+# Columns derived from the event fields, backfilled by migrate_schema
+DERIVED_COLUMNS = {
+    'fingerprint': event_fingerprint,
+    'incident_key': event_incident_key
+}
+
+def migrate_schema(engine):
+    """
+    Brings an existing events table up to the current schema.
+
+    Adds the fingerprint, incident key, data version and source columns if
+    they are missing, backfills the first two for existing rows in batches,
+    removes historical duplicates (keeping the oldest row), seeds the event
+    counters and data version, parses existing statuses into event_units
+    once, and creates any missing indexes, including the search indexes. Safe
+    to run repeatedly.
+    """
+    events = Event.__table__
+    columns = {column['name'] for column in inspect(engine).get_columns(events.name)}
+
+    with engine.begin() as connection:
+        for column in DERIVED_COLUMNS:
+            if column not in columns:
+                connection.execute(text(f"ALTER TABLE events ADD COLUMN {column} VARCHAR(64)"))
+        if 'data_version' not in columns:
+            connection.execute(text("ALTER TABLE events ADD COLUMN data_version INTEGER"))
+        if 'source' not in columns:
+            connection.execute(text(
+                f"ALTER TABLE events ADD COLUMN source VARCHAR NOT NULL DEFAULT '{DEFAULT_SOURCE}'"
+            ))
+
+        # Backfill missing derived columns in batches
+        backfilled = 0
+        last_id = 0
+        while True:
+            rows = connection.execute(
+                select(
+                    events.c.id, events.c.title, events.c.location,
+                    events.c.datetime, events.c.channel, events.c.status
+                )
+                .where(
+                    or_(*(events.c[column].is_(None) for column in DERIVED_COLUMNS)),
+                    events.c.id > last_id
+                )
+                .order_by(events.c.id)
+                .limit(MIGRATION_BATCH_SIZE)
+            ).mappings().all()
+            if not rows:
+                break
+
+            connection.execute(
+                update(events).where(events.c.id == bindparam('row_id')),
+                [
+                    {"row_id": row["id"], **{column: derive(row) for column, derive in DERIVED_COLUMNS.items()}}
+                    for row in rows
+                ]
+            )
+            backfilled += len(rows)
+            last_id = rows[-1]["id"]
+
+        # Remove historical duplicates before the unique index is created
+        if backfilled:
+            connection.execute(text(
+                "DELETE FROM events WHERE id NOT IN "
+                "(SELECT MIN(id) FROM events GROUP BY fingerprint)"
+            ))
+
+        # Seed the running counters for databases created before they existed,
+        # and rebuild them when their keys change
+        counters_empty = connection.execute(select(EventCounter.key).limit(1)).first() is None
+        events_present = connection.execute(select(events.c.id).limit(1)).first() is not None
+        counters_outdated = read_job_state(connection, 'counter_format') != COUNTER_FORMAT
+        if backfilled or (counters_empty and events_present) or counters_outdated:
+            rebuild_counters(connection)
+            write_job_state(connection, 'counter_format', COUNTER_FORMAT)
+        units_missing = events_present and not read_job_state(connection, 'event_units')
+
+        connection.execute(insert(DataVersion).values(id=1, version=0).on_conflict_do_nothing())
+
+    # Parse the statuses of events stored before event_units existed
+    if units_missing:
+        backfill_event_units(engine)
+
+    if engine.dialect.name == 'sqlite':
+        rebuild_events_autoincrement(engine)
+
+    for index in Event.__table__.indexes:
+        index.create(engine, checkfirst=True)
+    create_search_tables(engine)
+
+def rebuild_events_autoincrement(engine):
+    """
+    Recreates an SQLite events table created without AUTOINCREMENT, which
+    reuses the ids of deleted rows once the newest ones are gone. Its indexes
+    and full-text index are dropped with it, and recreated by migrate_schema.
+    Runs once.
+    """
+    with engine.begin() as connection:
+        ddl = connection.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'events'")).scalar()
+        if ddl is None or 'AUTOINCREMENT' in ddl.upper():
+            return
+        rebuilt = Event.__table__.to_metadata(MetaData(), name='events_rebuilt')
+        columns = ', '.join(column.name for column in Event.__table__.columns)
+        # Left over by an interrupted rebuild
+        connection.execute(text("DROP TABLE IF EXISTS events_rebuilt"))
+        connection.execute(CreateTable(rebuilt))
+        connection.execute(text(f"INSERT INTO events_rebuilt ({columns}) SELECT {columns} FROM events ORDER BY id"))
+        connection.execute(text("DROP TABLE events"))
+        connection.execute(text("DROP TABLE IF EXISTS events_fts"))
+        connection.execute(text("ALTER TABLE events_rebuilt RENAME TO events"))
+
+# SQLite full-text index over event titles and locations, kept in sync by triggers
+SQLITE_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE events_fts USING fts5("
+    "title, location, content='events', content_rowid='id')",
+    "CREATE TRIGGER events_fts_insert AFTER INSERT ON events BEGIN "
+    "INSERT INTO events_fts (rowid, title, location) VALUES (new.id, new.title, new.location); END",
+    "CREATE TRIGGER events_fts_delete AFTER DELETE ON events BEGIN "
+    "INSERT INTO events_fts (events_fts, rowid, title, location) "
+    "VALUES ('delete', old.id, old.title, old.location); END",
+    "CREATE TRIGGER events_fts_update AFTER UPDATE OF title, location ON events BEGIN "
+    "INSERT INTO events_fts (events_fts, rowid, title, location) "
+    "VALUES ('delete', old.id, old.title, old.location); "
+    "INSERT INTO events_fts (rowid, title, location) VALUES (new.id, new.title, new.location); END",
+    "INSERT INTO events_fts (events_fts) VALUES ('rebuild')"
+)
+
+# Text the PostgreSQL full-text index is built over; search queries must repeat it exactly
+POSTGRESQL_SEARCH_DOCUMENT = "to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(location, ''))"
+
+def create_search_tables(engine):
+    """
+    Creates the full-text and spatial indexes used by search.py if missing.
+
+    On SQLite that is an FTS5 table mirroring events through triggers, so
+    every insert, update and delete keeps it in sync, and an R*Tree for
+    event_points. On PostgreSQL it is a GIN index over the title and location
+    text and a plain event_points table. SQLite builds without FTS5 are left
+    without a full-text index, and search.py scans instead; without R*Tree,
+    event_points is a plain table with a latitude/longitude index.
+    """
+    if engine.dialect.name == 'postgresql':
+        with engine.begin() as connection:
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_events_search ON events USING GIN ({POSTGRESQL_SEARCH_DOCUMENT})"
+            ))
+        event_points.create(engine, checkfirst=True)
+        return
+
+    tables = set(inspect(engine).get_table_names())
+    for name, statements in (
+        ('events_fts', SQLITE_SEARCH_DDL),
+        ('event_points', ("CREATE VIRTUAL TABLE event_points USING rtree(id, min_lat, max_lat, min_lon, max_lon)",))
+    ):
+        if name in tables:
+            continue
+        try:
+            with engine.begin() as connection:
+                for statement in statements:
+                    connection.execute(text(statement))
+        except OperationalError:
+            # This SQLite build lacks the extension, or another process just created the table
+            if name == 'event_points':
+                event_points.create(engine, checkfirst=True)
+
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    """Apply the configured PRAGMAs to every new SQLite connection."""
+    cursor = dbapi_connection.cursor()
+    # Takes effect in new databases only, letting archive.py return freed pages without a full VACUUM
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute(f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={int(config.SQLITE_BUSY_TIMEOUT * 1000)}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+def create_database_engine(url=DATABASE_URL):
+    """
+    Create the engine shared by the scraper and the API.
+
+    SQLite connections are tuned for one writer with concurrent readers: WAL
+    journaling, relaxed fsyncs, a larger page cache, memory-mapped reads and a
+    busy timeout instead of immediate "database is locked" errors. Connections
+    may be used from any thread, since sessions are scoped per thread. Other
+    databases, such as PostgreSQL, get a sized, pre-pinged connection pool.
+    """
+    if url.startswith('sqlite'):
+        engine = create_engine(url, connect_args={
+            'timeout': config.SQLITE_BUSY_TIMEOUT,
+            'check_same_thread': False
+        })
+        event.listen(engine, 'connect', _configure_sqlite_connection)
+        return engine
+    return create_engine(
+        url,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=True
+    )
+
+# asyncio drivers used in place of each backend's default driver by the async API
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg'
+}
+
+def create_async_database_engine(url=DATABASE_URL):
+    """
+    Create an asyncio engine for the same database, for the async API.
+
+    The URL's driver is swapped for the backend's asyncio driver (aiosqlite or
+    asyncpg) and connections get the same tuning as create_database_engine.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    url = make_url(url)
+    url = url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+    if url.get_backend_name() == 'sqlite':
+        # Pool connections so the PRAGMAs and page cache survive between requests
+        async_engine = create_async_engine(
+            url, poolclass=AsyncAdaptedQueuePool,
+            pool_size=config.DB_POOL_SIZE, max_overflow=config.DB_MAX_OVERFLOW,
+            connect_args={'timeout': config.SQLITE_BUSY_TIMEOUT}
+        )
+        event.listen(async_engine.sync_engine, 'connect', _configure_sqlite_connection)
+        return async_engine
+    return create_async_engine(
+        url,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=True
+    )
+
+engine = create_database_engine()
 Base.metadata.create_all(engine)
+migrate_schema(engine)
 Session = sessionmaker(bind=engine)
+
+# Thread-local sessions for long-running workers such as the scraper thread
+ScopedSession = scoped_session(Session)
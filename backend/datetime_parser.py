@@ -0,0 +1,123 @@
+"""
+Parsing of the timestamps found in dashboard and feed rows.
+
+Each source emits one format consistently, so DatetimeParser answers the
+dashboard's usual "08/22/2024, 1:05 AM" shape with a precompiled regex,
+otherwise tries the format that last succeeded first, and remembers the
+strings it has already parsed, since every scrape sees mostly the same rows
+again. Unparseable strings are logged at most once a minute per source.
+"""
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+import logging
+import re
+import time
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Formats understood, tried in this order until one of them has succeeded
+DATETIME_FORMATS = (
+    '%m/%d/%Y, %I:%M %p',
+    '%m/%d/%Y %I:%M %p',
+    '%m-%d-%Y, %I:%M %p',
+    '%m-%d-%Y %I:%M %p',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M'
+)
+
+# '%m/%d/%Y, %I:%M %p' without strptime; anything else falls through to strptime
+DASHBOARD_PATTERN = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4}),\s+(\d{1,2}):(\d{2})\s+([AaPp])[Mm]')
+
+# Parsed strings remembered per source (0 disables); the cache is emptied when it fills up
+DATETIME_CACHE_SIZE = 10000
+
+# Seconds between warnings about strings that could not be parsed
+FAILURE_LOG_INTERVAL = 60
+
+# Timezone epoch timestamps from feeds are converted to
+DASHBOARD_ZONE = ZoneInfo(config.DASHBOARD_TIMEZONE)
+
+def parse_dashboard_datetime(value):
+    """
+    Fast path for '%m/%d/%Y, %I:%M %p'.
+
+    Returns:
+    - The same datetime as strptime, or None if the string has another shape.
+    """
+    match = DASHBOARD_PATTERN.fullmatch(value)
+    if match is None:
+        return None
+    month, day, year, hour, minute, meridiem = match.groups()
+    hour = int(hour)
+    if not 1 <= hour <= 12:
+        return None
+    hour %= 12
+    if meridiem in 'Pp':
+        hour += 12
+    try:
+        return datetime(int(year), int(month), int(day), hour, int(minute))
+    except ValueError:
+        return None
+
+class DatetimeParser:
+    """
+    Parses one source's timestamps, learning which format it uses.
+
+    Epoch milliseconds, as feature services report them, are converted
+    directly. Failures return None.
+    """
+
+    def __init__(self, source, cache_size=DATETIME_CACHE_SIZE, log_interval=FAILURE_LOG_INTERVAL):
+        self.source = source
+        self.cache_size = cache_size
+        self.log_interval = log_interval
+        self.formats = list(DATETIME_FORMATS)
+        self.failures = 0
+        self._cache = {}
+        self._suppressed = 0
+        self._last_logged = None
+
+    def parse(self, value):
+        """Parse a timestamp string or epoch milliseconds into a datetime."""
+        if isinstance(value, (int, float)):
+            # Naive dashboard-local time, as the Selenium backend reads it off the page
+            utc = datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+            return utc.astimezone(DASHBOARD_ZONE).replace(tzinfo=None)
+
+        parsed = self._cache.get(value)
+        if parsed is None:
+            parsed = parse_dashboard_datetime(value) or self._parse_formats(value) or False
+            if self.cache_size:
+                if len(self._cache) >= self.cache_size:
+                    self._cache.clear()
+                self._cache[value] = parsed
+        if parsed is False:
+            self._log_failure(value)
+            return None
+        return parsed
+
+    def _parse_formats(self, value):
+        """Try each format, the last successful one first."""
+        for index, fmt in enumerate(self.formats):
+            try:
+                parsed = datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+            if index:
+                self.formats.insert(0, self.formats.pop(index))
+            return parsed
+        return None
+
+    def _log_failure(self, value):
+        """Warn about an unparseable string, folding repeats within log_interval into one line."""
+        self.failures += 1
+        now = time.monotonic()
+        if self._last_logged is not None and now - self._last_logged < self.log_interval:
+            self._suppressed += 1
+            return
+        suppressed = f" ({self._suppressed} more since the last warning)" if self._suppressed else ""
+        logger.warning(f"Date parsing failed for {self.source} string: {value!r}{suppressed}")
+        self._last_logged = now
+        self._suppressed = 0
@@ -0,0 +1,191 @@
+"""
+Export the events table to columnar files partitioned by month.
+
+    python export.py exports/events                     # Arrow IPC, rows added since the last run
+    python export.py exports/events --format parquet    # compressed Parquet instead
+    python export.py exports/events --full              # discard earlier files and start over
+
+Files are laid out as month=YYYY-MM/part-<first id>.<ext>, so any Arrow or
+Parquet reader that understands hive partitioning can prune by month. Arrow IPC
+files are written uncompressed and read_export memory-maps them, so loading
+an export does not copy or decode the column data:
+
+    from export import read_export
+    table = read_export('exports/events', columns=['datetime', 'incident_type'])
+
+Exports are incremental by event id: each run appends the rows inserted since
+the previous one, up to the last insert committed when it started. Status changes to rows that were already exported are only
+picked up by a --full export.
+"""
+from sqlalchemy import select
+from colorama import Fore, Style
+from collections import defaultdict
+import argparse
+import json
+import os
+import shutil
+import time
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs
+import pyarrow.parquet as pq
+
+from database import Event, committed_event_id, engine, normalize_incident_type
+
+# Rows read from the database and written per batch
+EXPORT_BATCH_SIZE = 50000
+
+# File extension and pyarrow.dataset format name of each export format
+EXPORT_FORMATS = {
+    'arrow': ('arrow', 'ipc'),
+    'parquet': ('parquet', 'parquet')
+}
+
+# Export progress, kept next to the files; pyarrow.dataset skips names starting with '_'
+STATE_FILE = '_export_state.json'
+
+EXPORT_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('datetime', pa.timestamp('us')),
+    ('title', pa.string()),
+    ('incident_type', pa.string()),
+    ('location', pa.string()),
+    ('channel', pa.string()),
+    ('status', pa.string())
+])
+
+def load_export_state(directory):
+    """Return the saved export state, or a fresh one if there is none."""
+    try:
+        with open(os.path.join(directory, STATE_FILE), encoding='utf-8') as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        return {'last_id': 0, 'format': None}
+
+def save_export_state(directory, state):
+    """Write the export state atomically."""
+    path = os.path.join(directory, STATE_FILE)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as state_file:
+        json.dump(state, state_file)
+    os.replace(f"{path}.tmp", path)
+
+def events_to_table(rows):
+    """Build an Arrow table from event rows, normalizing the incident type once."""
+    return pa.table({
+        'id': [row.id for row in rows],
+        'datetime': [row.datetime for row in rows],
+        'title': [row.title for row in rows],
+        'incident_type': [normalize_incident_type(row.title) for row in rows],
+        'location': [row.location for row in rows],
+        'channel': [row.channel for row in rows],
+        'status': [row.status for row in rows]
+    }, schema=EXPORT_SCHEMA)
+
+def write_partition(directory, month, rows, file_format):
+    """
+    Write one batch of a month's rows to its partition directory.
+
+    The file is named after the batch's first event id, so re-running an
+    interrupted export overwrites the same file instead of duplicating rows.
+
+    Returns:
+        str: Path of the written file
+    """
+    extension, _ = EXPORT_FORMATS[file_format]
+    partition = os.path.join(directory, f"month={month}")
+    os.makedirs(partition, exist_ok=True)
+    path = os.path.join(partition, f"part-{rows[0].id:012d}.{extension}")
+
+    table = events_to_table(rows)
+    if file_format == 'parquet':
+        pq.write_table(table, path, compression='zstd')
+    else:
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return path
+
+def export_events(directory, file_format='arrow', full=False, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Export events added since the last run to `directory`.
+
+    Returns:
+        dict: Rows exported, files written and elapsed seconds
+    """
+    start_time = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    state = load_export_state(directory)
+
+    if full:
+        for name in os.listdir(directory):
+            if name.startswith('month='):
+                shutil.rmtree(os.path.join(directory, name))
+        state = {'last_id': 0, 'format': None}
+    elif state['format'] not in (None, file_format):
+        raise ValueError(f"{directory} holds an export in {state['format']} format; use --full to switch formats")
+    state['format'] = file_format
+
+    events = Event.__table__
+    with engine.begin() as connection:
+        ceiling = committed_event_id(connection)
+    exported = 0
+    files = 0
+    while True:
+        with engine.connect() as connection:
+            rows = connection.execute(
+                select(events.c.id, events.c.datetime, events.c.title, events.c.location,
+                       events.c.channel, events.c.status)
+                .where(events.c.id > state['last_id'], events.c.id <= ceiling)
+                .order_by(events.c.id)
+                .limit(batch_size)
+            ).all()
+        if not rows:
+            break
+
+        months = defaultdict(list)
+        for row in rows:
+            months[row.datetime.strftime('%Y-%m') if row.datetime else 'unknown'].append(row)
+        for month, month_rows in months.items():
+            write_partition(directory, month, month_rows, file_format)
+            files += 1
+
+        state['last_id'] = rows[-1].id
+        save_export_state(directory, state)
+        exported += len(rows)
+
+    return {'exported': exported, 'files': files, 'elapsed': time.perf_counter() - start_time}
+
+def read_export(directory, columns=None, filter=None):
+    """
+    Load an export as one Arrow table, with the partition's `month` column.
+
+    Arrow IPC exports are memory-mapped rather than read into memory.
+
+    Args:
+        directory (str): Directory written by export_events
+        columns (list): Optional subset of columns to load
+        filter: Optional pyarrow.dataset expression, e.g. ds.field('month') == '2024-08'
+
+    Returns:
+        pyarrow.Table: The exported events
+    """
+    state = load_export_state(directory)
+    _, dataset_format = EXPORT_FORMATS[state['format'] or 'arrow']
+    dataset = ds.dataset(
+        directory, format=dataset_format, partitioning='hive',
+        filesystem=pyarrow.fs.LocalFileSystem(use_mmap=True)
+    )
+    return dataset.to_table(columns=columns, filter=filter)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export events to columnar files partitioned by month")
+    parser.add_argument('directory', help="Export directory")
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='arrow',
+                        help="arrow: uncompressed, memory-mappable IPC files; parquet: zstd-compressed Parquet")
+    parser.add_argument('--full', action='store_true', help="Discard earlier files and export every row")
+    parser.add_argument('--batch-size', type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    summary = export_events(args.directory, args.format, args.full, args.batch_size)
+    print(f"{Fore.GREEN}[Export Complete]{Style.RESET_ALL} "
+          f"exported={summary['exported']} files={summary['files']} elapsed={summary['elapsed']:.2f}s")
@@ -0,0 +1,192 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Order of the cells in every row returned by a fetcher
+ROW_FIELDS = ('title', 'location', 'datetime', 'channel', 'status')
+
+# Query parameters for an ArcGIS feature service `query` endpoint
+FEED_QUERY_PARAMS = {
+    'where': '1=1',
+    'outFields': '*',
+    'returnGeometry': 'false',
+    'f': 'json'
+}
+
+# Pages of maxRecordCount features read per fetch before the feed is treated as broken
+FEED_MAX_PAGES = 50
+
+class FeedError(Exception):
+    """Raised when the data feed cannot be fetched or understood."""
+
+def pooled_session(pool_size=4):
+    """A requests session with a connection pool, retries and gzip enabled."""
+    session = requests.Session()
+    session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+
+    retries = Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+class FeedFetcher:
+    """
+    Fetches dashboard rows straight from the feature service the dashboard
+    consumes, instead of rendering the page in a browser.
+
+    A pooled HTTP session is reused across cycles, responses are requested
+    gzip-compressed, and the previous ETag/Last-Modified are sent back so an
+    unchanged feed costs a single 304. The validators of a response are only
+    sent back once the caller has ingested its rows and called commit(), so a
+    failed ingest is retried on the next fetch. Feeds larger than the
+    service's maxRecordCount are read page by page.
+    """
+
+    def __init__(self, url, field_map, timeout=15, pool_size=4):
+        self.url = url
+        self.field_map = field_map
+        self.timeout = timeout
+        self.session = pooled_session(pool_size)
+
+        self._etag = None
+        self._last_modified = None
+        self._pending = None
+        self._rows = []
+
+    def fetch_rows(self):
+        """
+        Fetch the current feed contents.
+
+        Returns:
+            tuple: (rows, changed) where rows is a list of cell tuples ordered as
+            ROW_FIELDS and changed is False when the server answered 304
+        """
+        headers = {}
+        if self._etag:
+            headers['If-None-Match'] = self._etag
+        if self._last_modified:
+            headers['If-Modified-Since'] = self._last_modified
+
+        response = self._get(FEED_QUERY_PARAMS, headers)
+        if response.status_code == 304:
+            logger.info("Feed not modified since last fetch")
+            return self._rows, False
+        validators = (response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+        features = []
+        for page in range(FEED_MAX_PAGES):
+            if page:
+                response = self._get(dict(FEED_QUERY_PARAMS, resultOffset=len(features)), {})
+            payload = self._payload(response)
+            features.extend(payload['features'])
+            # The service stops at its maxRecordCount and flags the rest
+            if not payload.get('exceededTransferLimit'):
+                break
+            if not payload['features']:
+                raise FeedError("Feed exceeded its transfer limit but returned no features to page through")
+        else:
+            raise FeedError(f"Feed still exceeded its transfer limit after {FEED_MAX_PAGES} pages")
+
+        try:
+            self._rows = [self._feature_to_row(feature) for feature in features]
+        except (AttributeError, KeyError, TypeError) as e:
+            raise FeedError(f"Feed features could not be mapped to rows: {e!r}")
+        self._pending = validators
+        return self._rows, True
+
+    def commit(self):
+        """Revalidate against the last fetched response from now on; call once its rows are ingested."""
+        if self._pending is not None:
+            self._etag, self._last_modified = self._pending
+            self._pending = None
+
+    def _get(self, params, headers):
+        try:
+            response = self.session.get(self.url, params=params, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise FeedError(f"Feed request failed: {e}")
+        if response.status_code not in (200, 304):
+            raise FeedError(f"Feed returned HTTP {response.status_code}")
+        return response
+
+    def _payload(self, response):
+        try:
+            payload = response.json()
+        except ValueError as e:
+            raise FeedError(f"Feed returned invalid JSON: {e}")
+        if not isinstance(payload, dict):
+            raise FeedError("Feed response is not a JSON object")
+        if 'error' in payload:
+            raise FeedError(f"Feed returned an error: {payload['error']}")
+        if not isinstance(payload.get('features'), list):
+            raise FeedError("Feed response has no features")
+        return payload
+
+    def _feature_to_row(self, feature):
+        """Map a feature's attributes onto a row of cells."""
+        attributes = feature.get('attributes', {})
+        return tuple(attributes.get(self.field_map[field]) for field in ROW_FIELDS)
+
+    def close(self):
+        """Release pooled connections."""
+        self.session.close()
+
+class PageFetcher:
+    """
+    Fetches a dashboard page whose tables are rendered by the server, so it
+    can be parsed without a browser.
+
+    Like FeedFetcher it keeps a pooled session and revalidates with the
+    previous ETag/Last-Modified, so an unchanged page costs a single 304;
+    those of a new page are used once the caller calls commit().
+    """
+
+    def __init__(self, url, timeout=15, pool_size=4):
+        self.url = url
+        self.timeout = timeout
+        self.session = pooled_session(pool_size)
+        self._etag = None
+        self._last_modified = None
+        self._pending = None
+        self._html = None
+
+    def fetch_page(self):
+        """
+        Fetch the current page.
+
+        Returns:
+            tuple: (html, changed) where changed is False when the server answered 304
+        """
+        headers = {}
+        if self._etag:
+            headers['If-None-Match'] = self._etag
+        if self._last_modified:
+            headers['If-Modified-Since'] = self._last_modified
+
+        try:
+            response = self.session.get(self.url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise FeedError(f"Page request failed: {e}")
+
+        if response.status_code == 304:
+            return self._html, False
+        if response.status_code != 200:
+            raise FeedError(f"Page returned HTTP {response.status_code}")
+
+        self._html = response.text
+        self._pending = (response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return self._html, True
+
+    def commit(self):
+        """Revalidate against the last fetched page from now on; call once its rows are ingested."""
+        if self._pending is not None:
+            self._etag, self._last_modified = self._pending
+            self._pending = None
+
+    def close(self):
+        """Release pooled connections."""
+        self.session.close()
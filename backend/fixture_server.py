@@ -0,0 +1,83 @@
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from functools import partial
+import argparse
+import gzip
+import hashlib
+import os
+import threading
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+class FixtureRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Serves recorded responses from the fixtures directory.
+
+    Query strings are ignored and `/feed/query` resolves to `feed/query.json`
+    when no file of that exact name exists. Responses carry an ETag, honour
+    If-None-Match and are gzip-encoded when the client accepts it, mirroring
+    what the live feature service does.
+    """
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path) and os.path.isfile(path + '.json'):
+            path += '.json'
+        if not os.path.isfile(path):
+            self.send_error(404, "Fixture not found")
+            return
+
+        with open(path, 'rb') as fixture:
+            body = fixture.read()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('ETag', etag)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_fixtures(directory=FIXTURES_DIR, host='127.0.0.1', port=0):
+    """
+    Start a fixture server on a background thread.
+
+    Args:
+        directory (str): Directory holding the recorded responses
+        host (str): Interface to bind
+        port (int): Port to bind; 0 picks a free one
+
+    Returns:
+        ThreadingHTTPServer: The running server; its base URL is
+        f"http://{host}:{server.server_address[1]}"
+    """
+    handler = partial(FixtureRequestHandler, directory=directory)
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve recorded dashboard responses for offline scraping")
+    parser.add_argument('--directory', default=FIXTURES_DIR)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    server = serve_fixtures(args.directory, port=args.port)
+    print(f"Serving {args.directory} at http://127.0.0.1:{args.port}")
+    print(f"Run the scraper with SCRAPER_BACKEND=feed FEED_URL=http://127.0.0.1:{args.port}/feed/query")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,205 @@
+"""
+Offline geocoding of event locations against a local gazetteer file.
+
+The gazetteer (GAZETTEER_PATH) is a CSV file with address, latitude and
+longitude columns. Entries may be full addresses ("200 E BASELINE RD, TMP")
+or whole streets ("E BASELINE RD, TMP"); a location without an entry of its
+own falls back to its street. Both sides are normalized the same way, so
+"200 East Baseline Road ,TMP" matches "200 E BASELINE RD, TMP".
+
+Every lookup is cached in the geocodes table, misses included, so the
+gazetteer is only loaded when an address shows up for the first time. New
+events are geocoded at ingest; existing ones with:
+
+    python geocoder.py             # geocode events that have no coordinates yet
+    python geocoder.py --rebuild   # forget cached lookups, e.g. after a gazetteer update
+"""
+from sqlalchemy import select, delete
+from colorama import Fore, Style
+from functools import lru_cache
+import argparse
+import csv
+import logging
+import re
+import time
+
+from database import Geocode, Event, engine, event_points, insert
+import config
+
+logger = logging.getLogger(__name__)
+
+# Gazetteer paths whose load failure has been logged, so ingest logs it once
+_gazetteer_warnings = set()
+
+# Events geocoded per transaction by the backfill
+GEOCODE_BATCH_SIZE = 5000
+
+# Keep IN (...) lists well below SQLite's bound-parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+# Spelled-out street words and their standard abbreviations
+ADDRESS_ABBREVIATIONS = {
+    'NORTH': 'N', 'SOUTH': 'S', 'EAST': 'E', 'WEST': 'W',
+    'STREET': 'ST', 'ROAD': 'RD', 'AVENUE': 'AVE', 'BOULEVARD': 'BLVD',
+    'DRIVE': 'DR', 'LANE': 'LN', 'PARKWAY': 'PKWY', 'HIGHWAY': 'HWY',
+    'PLACE': 'PL', 'COURT': 'CT', 'CIRCLE': 'CIR', 'TRAIL': 'TRL'
+}
+
+def normalize_address(location):
+    """
+    Normalizes a location for gazetteer lookups: upper case, single spaces,
+    standard abbreviations and a single ", " before the city code.
+
+    Returns:
+    - The normalized address, e.g. "200 E BASELINE RD, TMP", or '' if empty.
+    """
+    street, _, city = (location or "").upper().partition(',')
+    words = [ADDRESS_ABBREVIATIONS.get(word, word) for word in street.replace('.', ' ').split()]
+    street = " ".join(words)
+    city = " ".join(city.split())
+    return f"{street}, {city}" if city else street
+
+def street_address(address):
+    """Drops the house number from a normalized address, leaving the street."""
+    return re.sub(r'^\d+\w*\s+', '', address)
+
+@lru_cache(maxsize=1)
+def load_gazetteer(path):
+    """
+    Reads a gazetteer CSV file into memory.
+
+    Returns:
+    - dict mapping normalized address to (latitude, longitude).
+    """
+    gazetteer = {}
+    with open(path, newline='', encoding='utf-8') as gazetteer_file:
+        for row in csv.DictReader(gazetteer_file):
+            gazetteer[normalize_address(row['address'])] = (float(row['latitude']), float(row['longitude']))
+    return gazetteer
+
+def lookup_address(gazetteer, address):
+    """Coordinates of an address, or of its street, or None."""
+    return gazetteer.get(address) or gazetteer.get(street_address(address))
+
+def geocode_locations(connection, locations):
+    """
+    Resolves locations to coordinates through the geocodes cache, looking up
+    addresses not seen before in the gazetteer and caching the results.
+
+    Parameters:
+    - connection: Connection or Session to execute on
+    - locations: iterable of raw event locations
+
+    Returns:
+    - dict mapping each location that could be geocoded to (latitude, longitude).
+    """
+    addresses = {location: normalize_address(location) for location in set(locations) if location}
+    wanted = list(set(addresses.values()) - {''})
+
+    known = {}
+    for start in range(0, len(wanted), LOOKUP_CHUNK_SIZE):
+        rows = connection.execute(
+            select(Geocode.address, Geocode.latitude, Geocode.longitude)
+            .where(Geocode.address.in_(wanted[start:start + LOOKUP_CHUNK_SIZE]))
+        )
+        known.update((address, None if latitude is None else (latitude, longitude))
+                     for address, latitude, longitude in rows)
+
+    missing = [address for address in wanted if address not in known]
+    # Without a gazetteer nothing is cached, so misses are retried once one is available
+    gazetteer = None
+    if missing and config.GAZETTEER_PATH:
+        try:
+            gazetteer = load_gazetteer(config.GAZETTEER_PATH)
+            _gazetteer_warnings.discard(config.GAZETTEER_PATH)
+        except (OSError, KeyError, ValueError) as e:
+            # A missing or malformed gazetteer must not stop ingest
+            if config.GAZETTEER_PATH not in _gazetteer_warnings:
+                _gazetteer_warnings.add(config.GAZETTEER_PATH)
+                logger.warning(f"Gazetteer {config.GAZETTEER_PATH} unavailable, locations are not geocoded: {e!r}")
+    if gazetteer is not None:
+        found = {address: lookup_address(gazetteer, address) for address in missing}
+        connection.execute(
+            insert(Geocode).on_conflict_do_nothing(index_elements=['address']),
+            [
+                {"address": address, "latitude": point[0] if point else None,
+                 "longitude": point[1] if point else None}
+                for address, point in found.items()
+            ]
+        )
+        known.update(found)
+
+    return {location: known[address] for location, address in addresses.items() if known.get(address)}
+
+def write_event_points(connection, events):
+    """
+    Adds the coordinates of newly inserted events to the spatial index.
+
+    Parameters:
+    - connection: Connection or Session to execute on
+    - events: iterable of (event_id, location) tuples
+
+    Returns:
+    - Number of events geocoded.
+    """
+    events = list(events)
+    points = geocode_locations(connection, (location for _, location in events))
+    rows = [
+        {"id": event_id, "min_lat": points[location][0], "max_lat": points[location][0],
+         "min_lon": points[location][1], "max_lon": points[location][1]}
+        for event_id, location in events if location in points
+    ]
+    if rows:
+        connection.execute(event_points.insert(), rows)
+    return len(rows)
+
+def backfill_event_points(rebuild=False, batch_size=GEOCODE_BATCH_SIZE):
+    """
+    Geocodes stored events that are not in the spatial index yet, reading
+    them in id-ordered batches. Addresses cached as not found are not looked
+    up again; pass rebuild after updating the gazetteer.
+
+    Parameters:
+    - rebuild: clear the geocodes cache and the spatial index first
+
+    Returns:
+    - Number of events geocoded.
+    """
+    events = Event.__table__
+    if rebuild:
+        with engine.begin() as connection:
+            connection.execute(delete(Geocode))
+            connection.execute(delete(event_points))
+
+    geocoded = 0
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                select(events.c.id, events.c.location)
+                .where(events.c.id > last_id)
+                .order_by(events.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return geocoded
+            located = set()
+            for start in range(0, len(rows), LOOKUP_CHUNK_SIZE):
+                located.update(connection.execute(
+                    select(event_points.c.id)
+                    .where(event_points.c.id.in_([row.id for row in rows[start:start + LOOKUP_CHUNK_SIZE]]))
+                ).scalars())
+            geocoded += write_event_points(connection, [row for row in rows if row.id not in located])
+        last_id = rows[-1].id
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Geocode event locations from the gazetteer file")
+    parser.add_argument('--rebuild', action='store_true', help="Forget cached lookups and geocode every event again")
+    args = parser.parse_args()
+
+    if not config.GAZETTEER_PATH:
+        parser.error("set GAZETTEER_PATH to a CSV file with address, latitude and longitude columns")
+    start_time = time.perf_counter()
+    geocoded = backfill_event_points(rebuild=args.rebuild)
+    print(f"{Fore.GREEN}[Geocoding Complete]{Style.RESET_ALL} "
+          f"geocoded={geocoded} elapsed={time.perf_counter() - start_time:.2f}s")
@@ -0,0 +1,316 @@
+"""
+Counters and histograms of the scraper stages and API routes, exported at
+/metrics in the Prometheus text format.
+
+An observation is a dict update behind a lock, a few microseconds, so the
+metrics stay on in production. The API runs in several worker processes and
+the scraper in another, so when METRICS_DIR is set every process also writes
+a snapshot of its metrics there (at most every METRICS_FLUSH_INTERVAL
+seconds and on exit), and /metrics adds up the snapshots of all of them.
+serve.py points METRICS_DIR at a temporary directory when it is not set.
+
+Scraper stages, labelled with the source tag:
+
+    driver_init     starting or borrowing a browser
+    navigation      driver.get of the dashboard
+    readiness       waiting for the tables to fill and settle
+    extraction      reading the table cells out of the page
+    fetch           HTTP request of the feed and html backends
+    parse           parsing fetched HTML into rows
+    datetime_parse  parsing the timestamps of new or changed rows
+    dedup           looking up stored fingerprints and incidents
+    insert          the ingest transaction
+"""
+from bisect import bisect_left
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+import config
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds in seconds, from a cached query to a slow page load
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Upper bounds in bytes, from an error body to a full streamed export
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+class Counter:
+    """A monotonically increasing count per combination of label values."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.reset()
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            series = [[list(key), value] for key, value in self._series.items()]
+        return {'type': self.kind, 'help': self.documentation, 'labels': list(self.labelnames),
+                'series': series}
+
+class Histogram:
+    """Observations counted into fixed buckets, with their sum, per combination of label values."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=TIME_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(float(bound) for bound in buckets)
+        self.reset()
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts, the last one for values above every bound, then the sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, **labels):
+        """Context manager observing the seconds its block takes."""
+        return _Timer(self, labels)
+
+    def snapshot(self):
+        with self._lock:
+            series = [[list(key), list(counts), total] for key, (counts, total) in self._series.items()]
+        return {'type': self.kind, 'help': self.documentation, 'labels': list(self.labelnames),
+                'buckets': list(self.buckets), 'series': series}
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+class Registry:
+    """The metrics of one process, and its snapshot file in METRICS_DIR."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._started()
+
+    def _started(self):
+        # Named after the process and its start, so a reused pid never overwrites a dead process's counts
+        self.snapshot_name = f"metrics-{os.getpid()}-{time.time_ns()}.json"
+        self._last_flush = time.monotonic()
+
+    def register(self, metric):
+        """Add a metric, or return the one already registered under its name."""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def reset(self):
+        """Forget every observation, as in a freshly forked child process."""
+        for metric in self._metrics.values():
+            metric.reset()
+        self._lock = threading.Lock()
+        self._started()
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: Every metric, with its series, by name, in the form written to METRICS_DIR
+        """
+        return {name: metric.snapshot() for name, metric in list(self._metrics.items())}
+
+    def flush(self):
+        """Write this process's snapshot to METRICS_DIR, if it is set."""
+        if not config.METRICS_DIR:
+            return
+        self._last_flush = time.monotonic()
+        path = os.path.join(config.METRICS_DIR, self.snapshot_name)
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporary, 'w', encoding='utf-8') as snapshot_file:
+                json.dump(self.snapshot(), snapshot_file)
+            os.replace(temporary, path)
+        except OSError:
+            pass
+
+    def maybe_flush(self):
+        """Flush if METRICS_FLUSH_INTERVAL has passed since the last snapshot."""
+        if config.METRICS_DIR and time.monotonic() - self._last_flush >= config.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def collect(self):
+        """
+        Returns:
+            list: The snapshot of this process followed by those the others wrote to METRICS_DIR
+        """
+        snapshots = [self.snapshot()]
+        if config.METRICS_DIR:
+            for path in glob.glob(os.path.join(config.METRICS_DIR, 'metrics-*.json')):
+                if os.path.basename(path) == self.snapshot_name:
+                    continue
+                try:
+                    with open(path, encoding='utf-8') as snapshot_file:
+                        snapshots.append(json.load(snapshot_file))
+                except (OSError, ValueError):
+                    continue
+        return snapshots
+
+REGISTRY = Registry()
+
+# Children start counting from zero; their parent reports what it had counted
+os.register_at_fork(after_in_child=REGISTRY.reset)
+atexit.register(REGISTRY.flush)
+
+def counter(name, documentation, labelnames=()):
+    """Register a Counter in the process registry."""
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+def histogram(name, documentation, labelnames=(), buckets=TIME_BUCKETS):
+    """Register a Histogram in the process registry."""
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+# Scraper
+SCRAPER_STAGE_SECONDS = histogram('scraper_stage_seconds', "Seconds spent in each stage of a scrape cycle",
+                                  ('source', 'stage'))
+SCRAPER_CYCLE_SECONDS = histogram('scraper_cycle_seconds', "Seconds per scrape cycle", ('source', 'result'))
+SCRAPER_ROWS = counter('scraper_rows_total', "Rows handed to ingest, by what became of them",
+                       ('source', 'outcome'))
+
+# API, shared by app.py and async_app.py
+API_REQUEST_SECONDS = histogram('api_request_seconds', "Seconds per request, until the last byte for streams",
+                                ('route', 'status'))
+API_RESPONSE_BYTES = histogram('api_response_bytes', "Response body bytes as sent, after compression",
+                               ('route',), SIZE_BUCKETS)
+API_QUERY_SECONDS = histogram('api_query_seconds', "Seconds spent querying the database per request",
+                              ('route',))
+API_SERIALIZATION_SECONDS = histogram('api_serialization_seconds', "Seconds spent encoding results per request",
+                                      ('route',))
+
+def observe_request(route, status, seconds, size):
+    """
+    Record a finished API request.
+
+    Args:
+        route (str): Route pattern, such as /api/events/latest/<int:limit>, so
+            that paths do not each get their own series
+        status (int): HTTP status code
+        seconds (float): Time from receiving the request to sending its last byte
+        size (int): Body bytes sent, or None if unknown
+    """
+    API_REQUEST_SECONDS.observe(seconds, route=route, status=status)
+    if size is not None:
+        API_RESPONSE_BYTES.observe(size, route=route)
+    REGISTRY.maybe_flush()
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def _format_value(value):
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+def merge(snapshots):
+    """
+    Add up the snapshots of several processes.
+
+    Returns:
+        dict: Metrics by name in the snapshot form, with series keyed by their label values
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for name, family in snapshot.items():
+            target = merged.setdefault(name, dict(family, series={}))
+            if target['type'] != family['type'] or target.get('buckets') != family.get('buckets'):
+                # Written by a process running a different version of the code
+                continue
+            for labels, *values in family['series']:
+                key = tuple(labels)
+                if family['type'] == 'counter':
+                    target['series'][key] = target['series'].get(key, 0) + values[0]
+                else:
+                    counts, total = values
+                    previous = target['series'].get(key)
+                    if previous is not None:
+                        counts = [a + b for a, b in zip(previous[0], counts)]
+                        total += previous[1]
+                    target['series'][key] = (counts, total)
+    return merged
+
+def render(families):
+    """
+    Format merged metrics in the Prometheus text exposition format.
+
+    Args:
+        families (dict): As returned by merge()
+
+    Returns:
+        str: The exposition
+    """
+    lines = []
+    for name in sorted(families):
+        family = families[name]
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for key in sorted(family['series']):
+            value = family['series'][key]
+            if family['type'] == 'counter':
+                lines.append(f"{name}{_format_labels(family['labels'], key)} {_format_value(value)}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(family['buckets'] + ['+Inf'], counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else _format_value(bound)
+                lines.append(f"{name}_bucket{_format_labels(family['labels'], key, ('le', le))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(family['labels'], key)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(family['labels'], key)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+def render_metrics():
+    """The metrics of every process, in the Prometheus text format, for /metrics."""
+    return render(merge(REGISTRY.collect()))
+
+def clear_snapshots():
+    """Remove the snapshots left in METRICS_DIR by a previous run."""
+    if not config.METRICS_DIR:
+        return
+    for path in glob.glob(os.path.join(config.METRICS_DIR, 'metrics-*.json*')):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,114 @@
+"""
+Sampling profiler for finding hot paths in a running process.
+
+A background thread records the stack of every other thread at a fixed
+interval. Nothing is instrumented and nothing runs between samples, so it
+can be pointed at a production worker for a few seconds:
+
+    curl 'localhost:5000/debug/profile?seconds=10' > api.folded      # PROFILER_ENABLED=1
+    python scraper_manager.py --once --profile scraper.folded
+
+The output is in the folded format, one `thread;frame;frame count` line per
+distinct stack, read by flamegraph.pl and speedscope.
+"""
+from collections import Counter
+import os
+import sys
+import threading
+import time
+
+import config
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all threads until stopped.
+
+    Args:
+        interval (float): Seconds between samples; defaults to PROFILER_INTERVAL
+    """
+
+    def __init__(self, interval=None):
+        self.interval = interval or config.PROFILER_INTERVAL
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self):
+        """
+        Returns:
+            str: One `thread;outermost frame;...;innermost frame count` line per stack, most sampled first
+        """
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def write(self, path):
+        """Write the folded stacks to a file."""
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write(self.folded())
+
+# Seconds /debug/profile samples for when none are given
+DEFAULT_DURATION = 10
+
+def parse_duration(value):
+    """
+    Validate the `seconds` parameter of /debug/profile.
+
+    Returns:
+        float: DEFAULT_DURATION when value is None
+
+    Raises:
+        ValueError: If it is not a number of seconds up to PROFILER_MAX_SECONDS
+    """
+    if value is None:
+        return DEFAULT_DURATION
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = None
+    if seconds is None or not 0 < seconds <= config.PROFILER_MAX_SECONDS:
+        raise ValueError(f"seconds must be a number between 0 and {config.PROFILER_MAX_SECONDS}")
+    return seconds
+
+def profile(seconds, interval=None):
+    """
+    Sample this process for `seconds`, blocking the calling thread.
+
+    Returns:
+        SamplingProfiler: The stopped profiler with its samples
+    """
+    with SamplingProfiler(interval) as profiler:
+        time.sleep(seconds)
+    return profiler
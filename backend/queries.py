@@ -0,0 +1,161 @@
+from sqlalchemy import select, desc, and_, or_
+from datetime import datetime
+from database import Event, EventUnit, Unit, UnitState
+
+# Columns that may be requested through the `fields` parameter
+EVENT_FIELDS = ('id', 'title', 'location', 'datetime', 'channel', 'status', 'source')
+
+# Upper bound for a single page of results
+MAX_PAGE_SIZE = 1000
+
+class QueryError(ValueError):
+    """Raised when request parameters cannot be turned into a query."""
+
+def parse_datetime_param(name, value):
+    """Parse an ISO 8601 datetime query parameter."""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise QueryError(f"Invalid datetime for '{name}': {value}")
+
+def encode_cursor(event_datetime, event_id):
+    """
+    Builds the keyset cursor that points just past the given row.
+
+    Args:
+        event_datetime (datetime): Datetime of the last row on a page
+        event_id (int): Id of the last row on a page
+
+    Returns:
+        str: Cursor in the form `<iso datetime>,<id>`
+    """
+    return f"{event_datetime.isoformat()},{event_id}"
+
+def decode_cursor(value):
+    """
+    Parses a cursor produced by encode_cursor.
+
+    Returns:
+        tuple: (datetime, id) of the last row already seen
+    """
+    datetime_part, _, id_part = value.rpartition(',')
+    if not datetime_part:
+        raise QueryError(f"Invalid cursor: {value}")
+    try:
+        event_id = int(id_part)
+    except ValueError:
+        raise QueryError(f"Invalid cursor: {value}")
+    return parse_datetime_param('before', datetime_part), event_id
+
+def parse_event_params(args, limit=None):
+    """
+    Converts request query parameters into event query options.
+
+    Supported parameters: `before` (cursor), `limit`, `since`, `until`,
+    `status`, `channel`, `source`, `q` (title substring), `unit` and `state` (events
+    listing a unit, a unit state, or a unit in a given state) and `fields`
+    (comma separated column names).
+
+    Args:
+        args (Mapping): Request query parameters
+        limit (int): Page size to use when the request does not specify one
+
+    Returns:
+        dict: Options accepted by build_events_query
+    """
+    params = {
+        'before': None,
+        'limit': limit,
+        'since': None,
+        'until': None,
+        'status': args.get('status') or None,
+        'channel': args.get('channel') or None,
+        'source': args.get('source') or None,
+        'title': args.get('q') or None,
+        'unit': " ".join(args.get('unit', '').split()).upper() or None,
+        'state': " ".join(args.get('state', '').split()) or None,
+        'fields': EVENT_FIELDS
+    }
+
+    if args.get('before'):
+        params['before'] = decode_cursor(args['before'])
+
+    if args.get('limit'):
+        try:
+            params['limit'] = int(args['limit'])
+        except ValueError:
+            raise QueryError(f"Invalid limit: {args['limit']}")
+        if not 0 < params['limit'] <= MAX_PAGE_SIZE:
+            raise QueryError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    for name in ('since', 'until'):
+        if args.get(name):
+            params[name] = parse_datetime_param(name, args[name])
+
+    if args.get('fields'):
+        requested = [field.strip() for field in args['fields'].split(',') if field.strip()]
+        unknown = [field for field in requested if field not in EVENT_FIELDS]
+        if unknown:
+            raise QueryError(f"Unknown fields: {', '.join(unknown)}")
+        params['fields'] = tuple(field for field in EVENT_FIELDS if field in requested)
+
+    return params
+
+def build_events_query(before=None, limit=None, since=None, until=None,
+                       status=None, channel=None, source=None, title=None, unit=None, state=None,
+                       fields=EVENT_FIELDS, after=None, through=None):
+    """
+    Builds a keyset-paginated SELECT over events, most recent first.
+
+    Only the requested columns are loaded; `id` and `datetime` are always
+    included because they make up the pagination key, and `data_version`
+    because it keys the serialization cache. `unit` and `state` filters are
+    resolved against the event_units index, time window included. `after`
+    (exclusive) and `through` (inclusive) bound the datetime on either side
+    of the newest archived event (see archive.py).
+
+    Returns:
+        Select: Statement yielding rows with the selected columns
+    """
+    loaded = [field for field in EVENT_FIELDS
+              if field in fields or field in ('id', 'datetime')]
+    stmt = select(*(getattr(Event, field) for field in loaded), Event.data_version)
+
+    if before is not None:
+        before_datetime, before_id = before
+        stmt = stmt.where(or_(
+            Event.datetime < before_datetime,
+            and_(Event.datetime == before_datetime, Event.id < before_id)
+        ))
+    if since is not None:
+        stmt = stmt.where(Event.datetime >= since)
+    if until is not None:
+        stmt = stmt.where(Event.datetime < until)
+    if after is not None:
+        stmt = stmt.where(Event.datetime > after)
+    if through is not None:
+        stmt = stmt.where(Event.datetime <= through)
+    if status is not None:
+        stmt = stmt.where(Event.status == status)
+    if channel is not None:
+        stmt = stmt.where(Event.channel == channel)
+    if source is not None:
+        stmt = stmt.where(Event.source == source)
+    if title is not None:
+        stmt = stmt.where(Event.title.icontains(title, autoescape=True))
+    if unit is not None or state is not None:
+        matching = select(EventUnit.event_id)
+        if unit is not None:
+            matching = matching.join(Unit, Unit.id == EventUnit.unit_id).where(Unit.name == unit)
+        if state is not None:
+            matching = matching.join(UnitState, UnitState.id == EventUnit.state_id).where(UnitState.name == state)
+        if since is not None:
+            matching = matching.where(EventUnit.datetime >= since)
+        if until is not None:
+            matching = matching.where(EventUnit.datetime < until)
+        stmt = stmt.where(Event.id.in_(matching))
+
+    stmt = stmt.order_by(desc(Event.datetime), desc(Event.id))
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
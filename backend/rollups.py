@@ -0,0 +1,201 @@
+"""
+Hourly and daily event counts per incident type and channel.
+
+Compaction folds events into the event_rollups table incrementally, picking
+up from the last event id it processed, so historical queries read a few
+summary rows instead of scanning and re-normalizing every event:
+
+    python rollups.py                  # roll up events added since the last run
+    python rollups.py --rebuild        # recompute every rollup from scratch
+    python rollups.py --interval 300   # keep rolling up every 5 minutes
+
+The scraper also runs a compaction after every successful cycle.
+"""
+from sqlalchemy import select, func, delete
+from collections import Counter
+from datetime import datetime
+import argparse
+import logging
+import time
+
+from database import (
+    Event, EventRollup, engine, insert, normalize_incident_type,
+    committed_event_id, read_job_state, write_job_state
+)
+from queries import QueryError, parse_datetime_param
+from serialization import format_datetime
+from stats import DEFAULT_BUCKET_WINDOW
+
+logger = logging.getLogger(__name__)
+
+# Bucket sizes maintained in event_rollups
+ROLLUP_BUCKETS = ('hour', 'day')
+
+# Dimensions rollups can be grouped by in queries
+ROLLUP_DIMENSIONS = {
+    'type': EventRollup.incident_type,
+    'channel': EventRollup.channel
+}
+
+# Events folded in per transaction
+COMPACTION_BATCH_SIZE = 5000
+
+# job_state entry holding the id of the last event rolled up
+COMPACTION_JOB = 'rollups'
+
+def truncate_datetime(value, bucket):
+    """Return the start of the hour or day `value` falls in."""
+    if bucket == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def rollup_deltas(rows):
+    """
+    Tallies how a batch of events changes the rollups.
+
+    Parameters:
+    - rows: iterable of rows with datetime, title and channel
+
+    Returns:
+    - Counter keyed by (bucket, bucket_start, incident_type, channel) tuples.
+    """
+    deltas = Counter()
+    for row in rows:
+        incident_type = normalize_incident_type(row.title)
+        channel = row.channel or ""
+        for bucket in ROLLUP_BUCKETS:
+            deltas[(bucket, truncate_datetime(row.datetime, bucket), incident_type, channel)] += 1
+    return deltas
+
+def apply_rollup_deltas(connection, deltas):
+    """Adds the given deltas to event_rollups in the current transaction."""
+    if not deltas:
+        return
+    stmt = insert(EventRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['bucket', 'bucket_start', 'incident_type', 'channel'],
+        set_={'count': EventRollup.count + stmt.excluded.count}
+    )
+    connection.execute(stmt, [
+        {"bucket": bucket, "bucket_start": start, "incident_type": incident_type,
+         "channel": channel, "count": count}
+        for (bucket, start, incident_type, channel), count in deltas.items()
+    ])
+
+def compact_rollups(batch_size=COMPACTION_BATCH_SIZE):
+    """
+    Fold events added since the last compaction into event_rollups.
+
+    Each batch and its progress marker are committed together, so an
+    interrupted run resumes where it stopped without counting events twice.
+    Events still being inserted when the run starts are left for the next one.
+
+    Returns:
+        int: Number of events rolled up
+    """
+    events = Event.__table__
+    with engine.begin() as connection:
+        ceiling = committed_event_id(connection)
+    compacted = 0
+    while True:
+        with engine.begin() as connection:
+            last_id = read_job_state(connection, COMPACTION_JOB, for_update=True)
+            rows = connection.execute(
+                select(events.c.id, events.c.datetime, events.c.title, events.c.channel)
+                .where(events.c.id > last_id, events.c.id <= ceiling)
+                .order_by(events.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return compacted
+            apply_rollup_deltas(connection, rollup_deltas(row for row in rows if row.datetime is not None))
+            write_job_state(connection, COMPACTION_JOB, rows[-1].id)
+        compacted += len(rows)
+
+def rebuild_rollups():
+    """Recompute every rollup from the events table."""
+    with engine.begin() as connection:
+        read_job_state(connection, COMPACTION_JOB, for_update=True)
+        connection.execute(delete(EventRollup))
+        write_job_state(connection, COMPACTION_JOB, 0)
+    return compact_rollups()
+
+def parse_rollup_params(args, now=None):
+    """
+    Converts request query parameters into query_rollups options.
+
+    Supported parameters: `bucket` ('hour' or 'day', default 'day'), `since`
+    and `until` (ISO 8601; `since` defaults to the same window as the stats
+    timeline), `type` and `channel` filters, and `by`, a comma separated list
+    of dimensions (type, channel) to break each bucket down by.
+    """
+    bucket = args.get('bucket') or 'day'
+    if bucket not in ROLLUP_BUCKETS:
+        raise QueryError(f"bucket must be one of: {', '.join(ROLLUP_BUCKETS)}")
+
+    group_by = tuple(name.strip() for name in (args.get('by') or '').split(',') if name.strip())
+    unknown = [name for name in group_by if name not in ROLLUP_DIMENSIONS]
+    if unknown:
+        raise QueryError(f"Unknown rollup dimensions: {', '.join(unknown)}")
+
+    params = {
+        'bucket': bucket,
+        'since': None,
+        'until': None,
+        'incident_type': normalize_incident_type(args['type']) if args.get('type') else None,
+        'channel': args.get('channel') or None,
+        'group_by': group_by
+    }
+    for name in ('since', 'until'):
+        if args.get(name):
+            params[name] = parse_datetime_param(name, args[name])
+    if params['since'] is None:
+        params['since'] = truncate_datetime((now or datetime.now()) - DEFAULT_BUCKET_WINDOW[bucket], bucket)
+    return params
+
+def query_rollups(session, bucket='day', since=None, until=None, incident_type=None,
+                  channel=None, group_by=()):
+    """
+    Reads event counts per bucket from the summary table.
+
+    Returns:
+        list: [{'bucket': 'YYYY-MM-DD HH:MM:SS', <dimension>: ..., 'count': n}, ...]
+        in ascending bucket order
+    """
+    dimensions = [ROLLUP_DIMENSIONS[name] for name in group_by]
+    stmt = select(EventRollup.bucket_start, *dimensions, func.sum(EventRollup.count)) \
+        .where(EventRollup.bucket == bucket)
+    if since is not None:
+        stmt = stmt.where(EventRollup.bucket_start >= since)
+    if until is not None:
+        stmt = stmt.where(EventRollup.bucket_start < until)
+    if incident_type is not None:
+        stmt = stmt.where(EventRollup.incident_type == incident_type)
+    if channel is not None:
+        stmt = stmt.where(EventRollup.channel == channel)
+    stmt = stmt.group_by(EventRollup.bucket_start, *dimensions) \
+        .order_by(EventRollup.bucket_start, *dimensions)
+
+    rollups = []
+    for row in session.execute(stmt):
+        rollup = {'bucket': format_datetime(row[0])}
+        rollup.update(zip(group_by, row[1:-1]))
+        rollup['count'] = int(row[-1])
+        rollups.append(rollup)
+    return rollups
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Roll events up into hourly and daily counts")
+    parser.add_argument('--rebuild', action='store_true', help="Recompute every rollup from scratch")
+    parser.add_argument('--interval', type=float, help="Keep compacting every INTERVAL seconds")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    compacted = rebuild_rollups() if args.rebuild else compact_rollups()
+    logger.info(f"Rolled up {compacted} events in {time.perf_counter() - start_time:.2f}s")
+    while args.interval:
+        time.sleep(args.interval)
+        compacted = compact_rollups()
+        if compacted:
+            logger.info(f"Rolled up {compacted} events")
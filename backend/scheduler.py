@@ -0,0 +1,159 @@
+"""
+Adaptive scrape scheduling.
+
+Each source is scraped more often while its dashboard is busy and less often
+while it is quiet. The interval is SCRAPE_INTERVAL scaled by the square root
+of the ratio between the source's typical rate of new or changed rows (about
+the last day) and its recent one (about the last half hour), kept between
+SCRAPE_MIN_INTERVAL and SCRAPE_MAX_INTERVAL. For a given number of scrapes
+the square root rule minimizes the average delay before a change is picked
+up, and over a day it scrapes no more often than a fixed SCRAPE_INTERVAL.
+
+Failed cycles are retried after an exponential, jittered backoff. The
+schedule of every source is written to the scrape_schedules table after each
+cycle and served at /api/scraper.
+"""
+from sqlalchemy import select
+from datetime import datetime, timedelta
+import logging
+import math
+import random
+import time
+
+from database import ScrapeSchedule, engine, insert
+import config
+
+logger = logging.getLogger(__name__)
+
+# Seconds over which the recent change rate is averaged
+RECENT_RATE_WINDOW = 1800
+
+# Seconds over which the typical change rate is averaged
+TYPICAL_RATE_WINDOW = 86400
+
+def _average(previous, value, elapsed, window):
+    """Exponentially weighted average of a rate observed over `elapsed` seconds."""
+    if previous is None:
+        return value
+    weight = 1 - math.exp(-elapsed / window)
+    return previous + weight * (value - previous)
+
+class AdaptiveSchedule:
+    """
+    Picks the delay before each scrape of one source.
+
+    Args:
+        source (str): Tag of the source, as stored in scrape_schedules
+        interval (float): Seconds between scrapes at the typical change rate
+        min_interval, max_interval (float): Bounds of the interval
+        backoff_base (float): Delay after the first failure of a streak
+    """
+
+    def __init__(self, source, interval=None, min_interval=None, max_interval=None,
+                 backoff_base=None, rng=None):
+        self.source = source
+        self.min_interval = min_interval or config.SCRAPE_MIN_INTERVAL
+        self.max_interval = max(max_interval or config.SCRAPE_MAX_INTERVAL, self.min_interval)
+        self.base_interval = interval or config.SCRAPE_INTERVAL
+        self.backoff_base = backoff_base or config.SCRAPE_BACKOFF_BASE
+        self.rng = rng or random.Random()
+
+        self.interval = self._clamp(self.base_interval)
+        # Recent and typical new or changed rows per second, None until two cycles have succeeded
+        self.change_rate = None
+        self.typical_rate = None
+        self.last_changes = None
+        self.consecutive_failures = 0
+        self.last_run = None
+        self.next_due = time.monotonic()
+        self._last_success = None
+
+    def _clamp(self, interval):
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def record(self, success, changes=0, started=None):
+        """
+        Account for a finished cycle and schedule the next one.
+
+        Args:
+            success (bool): Whether the cycle succeeded
+            changes (int): Rows it inserted or updated
+            started (float): time.monotonic() when the cycle started; now if omitted
+
+        Returns:
+            float: Seconds from the start of the cycle to the next one
+        """
+        started = time.monotonic() if started is None else started
+        self.last_run = datetime.now()
+        if success:
+            self.consecutive_failures = 0
+            self.last_changes = changes
+            if self._last_success is not None:
+                # Changes since the previous successful cycle, failed ones in between included
+                elapsed = max(started - self._last_success, 1.0)
+                rate = changes / elapsed
+                self.change_rate = _average(self.change_rate, rate, elapsed, RECENT_RATE_WINDOW)
+                self.typical_rate = _average(self.typical_rate, rate, elapsed, TYPICAL_RATE_WINDOW)
+                if self.change_rate > 0:
+                    self.interval = self._clamp(self.base_interval * math.sqrt(self.typical_rate / self.change_rate))
+                else:
+                    self.interval = self.max_interval
+            self._last_success = started
+            delay = self.interval
+        else:
+            self.consecutive_failures += 1
+            # Equal jitter: half the backoff is fixed, so sources failing together spread out
+            backoff = min(self.max_interval, self.backoff_base * 2 ** (self.consecutive_failures - 1))
+            delay = backoff / 2 + self.rng.uniform(0, backoff / 2)
+        self.next_due = started + delay
+        return delay
+
+    def state(self):
+        """
+        Returns:
+            dict: The schedule as stored in scrape_schedules
+        """
+        return {
+            'source': self.source,
+            'interval': round(self.interval, 1),
+            'change_rate': None if self.change_rate is None else round(self.change_rate * 3600, 2),
+            'last_changes': self.last_changes,
+            'consecutive_failures': self.consecutive_failures,
+            'last_run': self.last_run,
+            'next_run': datetime.now() + timedelta(seconds=max(0.0, self.next_due - time.monotonic()))
+        }
+
+def save_schedules(schedules):
+    """
+    Store the state of each schedule, logging rather than raising on failure
+    so that a busy database never stops scraping.
+    """
+    rows = [schedule.state() for schedule in schedules]
+    stmt = insert(ScrapeSchedule)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['source'],
+        set_={column: stmt.excluded[column] for column in rows[0] if column != 'source'}
+    )
+    try:
+        with engine.begin() as connection:
+            connection.execute(stmt, rows)
+    except Exception as e:
+        logger.warning(f"Could not save the scrape schedule: {e}")
+
+def read_schedules(session):
+    """
+    Returns:
+        list: The stored schedule of every source, as JSON-serializable dicts
+    """
+    schedules = []
+    for row in session.execute(select(ScrapeSchedule).order_by(ScrapeSchedule.source)).scalars():
+        schedules.append({
+            'source': row.source,
+            'interval': row.interval,
+            'changes_per_hour': row.change_rate,
+            'last_changes': row.last_changes,
+            'consecutive_failures': row.consecutive_failures,
+            'last_run': row.last_run.isoformat(timespec='seconds') if row.last_run else None,
+            'next_run': row.next_run.isoformat(timespec='seconds') if row.next_run else None
+        })
+    return schedules
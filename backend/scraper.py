@@ -1,104 +1,231 @@
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
-from bs4 import BeautifulSoup
-from datetime import datetime
+from collections import deque
+import os
+import threading
 import time
 import logging
 
-# Import the insert function from check_duplicates.py
-from check_duplicates import insert_event_if_not_duplicate
+# Import the bulk insert function from check_duplicates.py
+from archive import RetentionJob
+from check_duplicates import insert_events_bulk
+from change_tracker import ChangeTracker
+from database import DEFAULT_SOURCE
+from datetime_parser import DatetimeParser
+from fetcher import FeedFetcher, FeedError, PageFetcher
+from metrics import REGISTRY, SCRAPER_CYCLE_SECONDS, SCRAPER_ROWS, SCRAPER_STAGE_SECONDS
+from rollups import compact_rollups
+from scheduler import AdaptiveSchedule, save_schedules
+from sources import default_source
+from table_parser import TABLE_EXTRACT_SCRIPT, parse_table_rows
+import config
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-class OptimizedFireScraper:
-    def __init__(self):
-        self.driver = None
-        self.wait = None
-        self.url = 'https://mapportal.phoenix.gov/pfd/apps/dashboards/60bc91a9f225469fb0194b9e9ff623e2'
-        self.max_retries = 3
-        
-    def _get_chrome_options(self):
-        """Configure Chrome options for maximum performance"""
-        options = Options()
-        
-        # Enable headless mode for faster execution
-        options.add_argument('--headless=new')
+# Installs a MutationObserver (once per page) that records when the dashboard
+# tables last changed, and reports the current table row count and how long
+# the tables have been quiet, in milliseconds.
+TABLE_READINESS_SCRIPT = """
+if (!window.__fireReadiness) {
+    window.__fireReadiness = {lastMutation: performance.now()};
+    new MutationObserver(function () {
+        window.__fireReadiness.lastMutation = performance.now();
+    }).observe(document.body, {childList: true, subtree: true, characterData: true});
+}
+var rows = document.querySelectorAll('.external-html table tr').length;
+return [rows, performance.now() - window.__fireReadiness.lastMutation];
+"""
+
+class TablesReady:
+    """
+    WebDriverWait condition that holds once the dashboard tables have rows
+    and neither the DOM nor the row count has changed for `quiet_period` seconds.
+    """
+    
+    def __init__(self, quiet_period):
+        self.quiet_period = quiet_period
+        self.last_rows = None
+        self.stable_since = None
+    
+    def __call__(self, driver):
+        rows, quiet_ms = driver.execute_script(TABLE_READINESS_SCRIPT)
+        now = time.monotonic()
         
-        # Performance optimizations
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument('--disable-gpu')
-        options.add_argument('--disable-features=VizDisplayCompositor')
+        if rows != self.last_rows:
+            self.last_rows = rows
+            self.stable_since = now
+            return False
         
-        # Disable unnecessary features
-        options.add_argument('--disable-extensions')
-        options.add_argument('--disable-plugins')
-        options.add_argument('--disable-images')
-        options.add_argument('--disable-javascript-harmony-shipping')
-        options.add_argument('--disable-background-networking')
-        options.add_argument('--disable-background-timer-throttling')
-        options.add_argument('--disable-renderer-backgrounding')
-        options.add_argument('--disable-backgrounding-occluded-windows')
-        options.add_argument('--disable-client-side-phishing-detection')
-        options.add_argument('--disable-sync')
-        options.add_argument('--disable-translate')
-        options.add_argument('--hide-scrollbars')
-        options.add_argument('--mute-audio')
+        return rows > 0 and now - self.stable_since >= self.quiet_period \
+            and quiet_ms >= self.quiet_period * 1000
+
+def get_chrome_options(profile_slot=0):
+    """
+    Configure Chrome options for maximum performance.
+
+    Browsers running side by side cannot share a profile, so each slot of the
+    browser pool gets its own directory next to BROWSER_PROFILE_DIR.
+    """
+    options = Options()
+
+    # Enable headless mode for faster execution
+    options.add_argument('--headless=new')
+
+    # Performance optimizations
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--disable-features=VizDisplayCompositor')
+
+    # Disable unnecessary features
+    options.add_argument('--disable-extensions')
+    options.add_argument('--disable-plugins')
+    options.add_argument('--disable-images')
+    options.add_argument('--disable-javascript-harmony-shipping')
+    options.add_argument('--disable-background-networking')
+    options.add_argument('--disable-background-timer-throttling')
+    options.add_argument('--disable-renderer-backgrounding')
+    options.add_argument('--disable-backgrounding-occluded-windows')
+    options.add_argument('--disable-client-side-phishing-detection')
+    options.add_argument('--disable-sync')
+    options.add_argument('--disable-translate')
+    options.add_argument('--hide-scrollbars')
+    options.add_argument('--mute-audio')
+
+    # Memory and CPU optimizations
+    options.add_argument('--memory-pressure-off')
+    options.add_argument('--max_old_space_size=4096')
+    options.add_argument('--aggressive-cache-discard')
+
+    # Network optimizations
+    options.add_argument('--aggressive')
+    options.add_argument('--disable-background-networking')
+
+    # Set user agent to avoid detection
+    options.add_argument('--user-agent=Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+
+    # Disable logging for cleaner output
+    options.add_argument('--log-level=3')
+    options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    options.add_experimental_option('useAutomationExtension', False)
+
+    # Prefs for additional performance
+    prefs = {
+        "profile.default_content_setting_values": {
+            "images": 2,  # Block images
+            "plugins": 2,  # Block plugins
+            "popups": 2,  # Block popups
+            "geolocation": 2,  # Block location sharing
+            "notifications": 2,  # Block notifications
+            "media_stream": 2,  # Block media stream
+        },
+        "profile.managed_default_content_settings": {
+            "images": 2
+        }
+    }
+    options.add_experimental_option("prefs", prefs)
+
+    # Reuse a persistent profile so dashboard assets come from the disk cache
+    if config.BROWSER_PROFILE_DIR:
+        profile_dir = os.path.abspath(os.path.expanduser(config.BROWSER_PROFILE_DIR))
+        if profile_slot:
+            profile_dir = f"{profile_dir}-{profile_slot}"
+        options.add_argument(f'--user-data-dir={profile_dir}')
+        options.add_argument(f'--disk-cache-dir={os.path.join(profile_dir, "cache")}')
+
+    return options
+
+def create_chrome_driver(profile_slot=0):
+    """Start a headless Chrome with get_chrome_options and the scraper's timeouts"""
+    driver = webdriver.Chrome(options=get_chrome_options(profile_slot))
+    
+    # Set timeouts; lookups are explicit waits, so no implicit wait
+    driver.implicitly_wait(0)
+    driver.set_page_load_timeout(30)
+    return driver
+
+class OptimizedFireScraper:
+    def __init__(self, backend=None, source=None, browser_pool=None, parse_pool=None):
+        """
+        Scraper for one dashboard.
         
-        # Memory and CPU optimizations
-        options.add_argument('--memory-pressure-off')
-        options.add_argument('--max_old_space_size=4096')
-        options.add_argument('--aggressive-cache-discard')
+        :param backend: Overrides the source's backend ('selenium', 'feed' or 'html').
+        :param source: Source to scrape; defaults to the one configured through DASHBOARD_URL.
+        :param browser_pool: BrowserPool to borrow Chrome from between cycles instead of owning one.
+        :param parse_pool: Executor that parses fetched page HTML off the calling thread.
+        """
+        self.source = source or default_source()
+        self.driver = None
+        self.wait = None
+        self.url = self.source.url
+        self.browser_pool = browser_pool
+        self.parse_pool = parse_pool
+        # Further retries wait for the scheduler's backoff
+        self.max_retries = max(1, config.SCRAPE_ATTEMPTS)
+        # Rows the last cycle inserted or updated, which drives the adaptive schedule
+        self.last_changes = 0
+        self.last_readiness_time = None
+        self.stop_event = threading.Event()
+        self.last_cycle_timings = {}
+        self.retention = RetentionJob()
         
-        # Network optimizations
-        options.add_argument('--aggressive')
-        options.add_argument('--disable-background-networking')
+        # Warm session state: whether the dashboard tab is loaded, the JS heap
+        # size measured right after it was, and the outcome of recent cycles
+        self.persistent = config.BROWSER_PERSISTENT
+        self.page_loaded = False
+        self.page_loaded_at = None
+        self.baseline_heap = None
+        self.recent_results = deque(maxlen=config.BROWSER_HEALTH_WINDOW)
         
-        # Set user agent to avoid detection
-        options.add_argument('--user-agent=Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+        # Rows seen in recent cycles; only new or changed rows reach the database
+        tracker_path = config.CHANGE_TRACKER_PATH or None
+        if tracker_path and self.source.tag != DEFAULT_SOURCE:
+            root, extension = os.path.splitext(tracker_path)
+            tracker_path = f"{root}-{self.source.tag}{extension}"
+        self.change_tracker = ChangeTracker(config.CHANGE_TRACKER_MAX_ROWS, tracker_path)
         
-        # Disable logging for cleaner output
-        options.add_argument('--log-level=3')
-        options.add_experimental_option('excludeSwitches', ['enable-logging'])
-        options.add_experimental_option('useAutomationExtension', False)
+        # One datetime parser per row format, each learning the format it uses
+        self.datetime_parsers = {}
+        self.backend = backend or self.source.backend
         
-        # Prefs for additional performance
-        prefs = {
-            "profile.default_content_setting_values": {
-                "images": 2,  # Block images
-                "plugins": 2,  # Block plugins
-                "popups": 2,  # Block popups
-                "geolocation": 2,  # Block location sharing
-                "notifications": 2,  # Block notifications
-                "media_stream": 2,  # Block media stream
-            },
-            "profile.managed_default_content_settings": {
-                "images": 2
-            }
-        }
-        options.add_experimental_option("prefs", prefs)
+        # The feed backend keeps Selenium as a fallback for failed cycles
+        self.fetcher = None
+        if self.backend == 'feed':
+            if self.source.feed_url:
+                self.fetcher = FeedFetcher(self.source.feed_url, self.source.fields, timeout=self.source.timeout)
+            else:
+                logger.warning("SCRAPER_BACKEND is 'feed' but FEED_URL is not set; using Selenium")
         
-        return options
+        # The html backend parses the page as served, without a browser
+        self.page_fetcher = None
+        if self.backend == 'html':
+            self.page_fetcher = PageFetcher(self.url, timeout=self.source.timeout)
         
     def _initialize_driver(self):
-        """Initialize the Chrome driver with optimized settings"""
+        """Initialize the Chrome driver with optimized settings, or borrow one from the browser pool"""
+        start_time = time.monotonic()
         try:
-            options = self._get_chrome_options()
-            self.driver = webdriver.Chrome(options=options)
-            
-            # Set timeouts
-            self.driver.implicitly_wait(10)
-            self.driver.set_page_load_timeout(30)
+            if self.browser_pool is not None:
+                # A browser that last served this source still shows its page
+                self.driver, warm = self.browser_pool.acquire(self.source.tag)
+                if self.driver is None:
+                    logger.error("Browser pool is closed")
+                    return False
+                if not warm:
+                    self.page_loaded = False
+                    self.baseline_heap = None
+            else:
+                self.driver = create_chrome_driver()
             
             # Initialize WebDriverWait
-            self.wait = WebDriverWait(self.driver, 15)
+            self.wait = WebDriverWait(self.driver, config.READINESS_TIMEOUT,
+                                      poll_frequency=config.READINESS_POLL_INTERVAL)
             
+            self._observe_stage('driver_init', time.monotonic() - start_time)
             logger.info("Chrome driver initialized successfully")
             return True
             
@@ -107,119 +234,207 @@ class OptimizedFireScraper:
             return False
     
     def _wait_for_content_load(self):
-        """Wait for the specific content to load instead of arbitrary sleep"""
+        """Wait until the dashboard tables are populated and have stopped changing"""
+        start_time = time.monotonic()
         try:
-            # Wait for external-html divs to be present
-            self.wait.until(
-                EC.presence_of_element_located((By.CLASS_NAME, "external-html"))
-            )
-            
-            # Additional wait for JavaScript to populate tables
-            time.sleep(2)  # Reduced from 9 seconds to 2 seconds
+            self.wait.until(TablesReady(config.READINESS_QUIET_PERIOD))
             
-            logger.info("Content loaded successfully")
+            self.last_readiness_time = time.monotonic() - start_time
+            self._observe_stage('readiness', self.last_readiness_time)
+            logger.info(f"Content loaded successfully in {self.last_readiness_time:.2f} seconds")
             return True
             
         except TimeoutException:
-            logger.warning("Timeout waiting for content to load")
+            self.last_readiness_time = time.monotonic() - start_time
+            self._observe_stage('readiness', self.last_readiness_time)
+            logger.warning(f"Timeout waiting for content to load after {self.last_readiness_time:.2f} seconds")
             return False
     
     def scrape_website(self):
         """Main scraping function with improved error handling and performance"""
-        if not self.driver:
-            if not self._initialize_driver():
-                logger.error("Failed to initialize driver")
+        start_time = time.monotonic()
+        success = False
+        try:
+            success = self._scrape_cycle()
+            return success
+        finally:
+            SCRAPER_CYCLE_SECONDS.observe(time.monotonic() - start_time, source=self.source.tag,
+                                          result='success' if success else 'failure')
+            REGISTRY.maybe_flush()
+    
+    def _scrape_cycle(self):
+        """Run one cycle with the backend of this source"""
+        self.last_changes = 0
+        if self.page_fetcher is not None:
+            return self._scrape_page()
+        
+        if self.fetcher is not None:
+            result = self._scrape_feed()
+            if result is not None:
+                return result
+            if not self.url:
+                return False
+            logger.warning("Falling back to Selenium for this cycle")
+        
+        return self._scrape_browser()
+    
+    def _scrape_feed(self):
+        """
+        Scrape through the data feed.
+        
+        Returns True/False like scrape_website, or None when the feed failed and
+        the caller should fall back to the browser.
+        """
+        start_time = time.monotonic()
+        try:
+            rows, changed = self.fetcher.fetch_rows()
+        except FeedError as e:
+            logger.error(f"Feed fetch failed: {e}")
+            return None
+        finally:
+            self._observe_stage('fetch', time.monotonic() - start_time)
+        
+        if not changed:
+            logger.info("Feed unchanged, skipping ingest")
+            return True
+        
+        try:
+            self._ingest_rows(rows, kind='feed')
+        except Exception as e:
+            # Not a feed problem, so no browser fallback; the feed is fetched in full again next cycle
+            logger.error(f"Feed ingest failed: {e}")
+            return False
+        self.fetcher.commit()
+        return True
+    
+    def _scrape_page(self):
+        """Scrape a server-rendered dashboard by fetching and parsing its HTML"""
+        start_time = time.monotonic()
+        try:
+            html, changed = self.page_fetcher.fetch_page()
+        except FeedError as e:
+            logger.error(f"Page fetch failed: {e}")
+            return False
+        finally:
+            self._observe_stage('fetch', time.monotonic() - start_time)
+        
+        if not changed:
+            logger.info("Page unchanged, skipping ingest")
+            return True
+        
+        try:
+            rows = self._parse_html(html)
+            if rows is None:
+                logger.warning("No external-html divs found")
                 return False
+            self._ingest_rows(rows)
+        except Exception as e:
+            logger.error(f"Page ingest failed: {e}")
+            return False
+        self.page_fetcher.commit()
+        return True
+    
+    def _parse_html(self, html):
+        """Parse table rows out of page HTML, in the parse pool when there is one"""
+        start_time = time.monotonic()
+        if self.parse_pool is not None:
+            rows = self.parse_pool.submit(parse_table_rows, html, self.source.cells).result()
+        else:
+            rows = parse_table_rows(html, self.source.cells)
+        self._observe_stage('parse', time.monotonic() - start_time)
+        return None if rows is None else self.source.to_rows(rows)
+    
+    def _scrape_browser(self):
+        """Scrape by rendering the dashboard in headless Chrome"""
+        if self.browser_pool is not None and not self.driver:
+            # Borrow the browser up front so its health is checked like an owned one
+            self._initialize_driver()
+        if self.driver and self.persistent:
+            self._check_browser_health()
         
+        try:
+            result = self._scrape_browser_attempts()
+        finally:
+            self._release_driver()
+        self.recent_results.append(result)
+        return result
+    
+    def _release_driver(self):
+        """Hand a borrowed browser back to the pool for other sources to use between cycles"""
+        if self.browser_pool is not None and self.driver is not None:
+            self.browser_pool.release(self.driver, self.source.tag if self.page_loaded else None)
+            self.driver = None
+            self.wait = None
+    
+    def _scrape_browser_attempts(self):
+        """Run up to max_retries browser scrape attempts"""
         for attempt in range(self.max_retries):
+            if not self.driver:
+                if not self._initialize_driver():
+                    logger.error("Failed to initialize driver")
+                    return False
+            
             try:
                 logger.info(f"Starting scrape attempt {attempt + 1}/{self.max_retries}")
+                timings = {'navigation': 0.0}
                 
-                # Navigate to the website
-                self.driver.get(self.url)
+                # Navigate to the website, unless the warm tab is already showing it;
+                # the dashboard keeps refreshing its own tables in place, but a stale
+                # tab would report an unchanged table forever, so it is reloaded now and then
+                if self.page_loaded and config.BROWSER_MAX_PAGE_AGE > 0 and \
+                        time.monotonic() - self.page_loaded_at >= config.BROWSER_MAX_PAGE_AGE:
+                    logger.info("Reloading the dashboard tab after BROWSER_MAX_PAGE_AGE")
+                    self.page_loaded = False
+                if not (self.persistent and self.page_loaded):
+                    start_time = time.monotonic()
+                    self.driver.get(self.url)
+                    self.page_loaded_at = time.monotonic()
+                    timings['navigation'] = time.monotonic() - start_time
+                    self._observe_stage('navigation', timings['navigation'])
                 
                 # Wait for content to load
                 if not self._wait_for_content_load():
+                    self.page_loaded = False
                     if attempt < self.max_retries - 1:
                         logger.warning(f"Content load failed, retrying... ({attempt + 1}/{self.max_retries})")
                         continue
                     else:
                         logger.error("Failed to load content after all retries")
                         return False
+                timings['readiness'] = self.last_readiness_time
                 
-                # Parse the page source with BeautifulSoup
-                soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-                external_html_divs = soup.find_all('div', class_='external-html')
-                
-                if not external_html_divs:
-                    logger.warning("No external-html divs found")
+                start_time = time.monotonic()
+                rows = self._extract_rows()
+                timings['extraction'] = time.monotonic() - start_time
+                self._observe_stage('extraction', timings['extraction'])
+                if rows is None:
+                    self.page_loaded = False
                     if attempt < self.max_retries - 1:
                         continue
                     return False
                 
-                logger.info(f"Found {len(external_html_divs)} 'external-html' divs")
+                if not self.page_loaded:
+                    self.page_loaded = True
+                    self.baseline_heap = self._js_heap_size()
                 
-                events_processed = 0
+                self.last_cycle_timings = timings
+                logger.info(f"Browser timings: navigation={timings['navigation']:.2f}s "
+                            f"readiness={timings['readiness']:.2f}s extraction={timings['extraction']:.2f}s")
                 
-                for div_index, div in enumerate(external_html_divs):
-                    table = div.find('table')
-                    if table is None:
-                        logger.warning(f"No table found in 'external-html' div {div_index + 1}")
-                        continue
-                    
-                    rows = table.find_all('tr')
-                    
-                    for row_index, row in enumerate(rows):
-                        cols = row.find_all('td')
-                        if len(cols) < 5:
-                            continue  # Skip header rows or incomplete rows
-                        
-                        try:
-                            title = cols[0].text.strip()
-                            location = cols[1].text.strip()
-                            datetime_str = cols[2].text.strip()
-                            channel = cols[3].text.strip()
-                            status = cols[4].text.strip()
-                            
-                            # Skip empty rows
-                            if not title or not datetime_str:
-                                continue
-                            
-                            # Parse datetime with better error handling
-                            event_datetime = self._parse_datetime(datetime_str)
-                            if not event_datetime:
-                                continue
-                            
-                            # Create event data
-                            event_data = {
-                                "title": title,
-                                "location": location,
-                                "datetime": event_datetime,
-                                "channel": channel,
-                                "status": status
-                            }
-                            
-                            # Insert the event if it's not a duplicate
-                            insert_event_if_not_duplicate(event_data)
-                            events_processed += 1
-                            
-                        except Exception as e:
-                            logger.warning(f"Error processing row {row_index + 1} in table {div_index + 1}: {e}")
-                            continue
-                
-                logger.info(f"Scraping completed successfully. Processed {events_processed} events.")
+                self._ingest_rows(rows)
                 return True
                 
             except WebDriverException as e:
                 logger.error(f"WebDriver error on attempt {attempt + 1}: {e}")
+                self._restart_driver()
                 if attempt < self.max_retries - 1:
-                    self._restart_driver()
                     continue
                 else:
                     return False
                     
             except Exception as e:
                 logger.error(f"Unexpected error on attempt {attempt + 1}: {e}")
+                self.page_loaded = False
                 if attempt < self.max_retries - 1:
                     continue
                 else:
@@ -227,62 +442,184 @@ class OptimizedFireScraper:
         
         return False
     
-    def _parse_datetime(self, datetime_str):
-        """Parse datetime string with multiple format attempts"""
-        formats = [
-            '%m/%d/%Y, %I:%M %p',
-            '%m/%d/%Y %I:%M %p',
-            '%m-%d-%Y, %I:%M %p',
-            '%m-%d-%Y %I:%M %p',
-            '%Y-%m-%d %H:%M:%S',
-            '%Y-%m-%d %H:%M'
-        ]
+    def _js_heap_size(self):
+        """Return the page's used JS heap in bytes, or None if it cannot be read"""
+        try:
+            return self.driver.execute_script(
+                "return performance.memory ? performance.memory.usedJSHeapSize : null;"
+            )
+        except WebDriverException:
+            return None
+    
+    def _check_browser_health(self):
+        """Recycle the warm browser if its heap has grown too much or recent cycles keep failing"""
+        failures = self.recent_results.count(False)
+        if len(self.recent_results) == self.recent_results.maxlen and \
+                failures / len(self.recent_results) > config.BROWSER_MAX_ERROR_RATE:
+            logger.warning(f"Recycling browser: {failures}/{len(self.recent_results)} recent cycles failed")
+            self.recent_results.clear()
+            self._restart_driver()
+            return
         
-        for fmt in formats:
+        if self.page_loaded and self.baseline_heap:
+            heap = self._js_heap_size()
+            if heap is not None:
+                growth_mb = (heap - self.baseline_heap) / (1024 * 1024)
+                if growth_mb > config.BROWSER_MAX_HEAP_GROWTH_MB:
+                    logger.warning(f"Recycling browser: JS heap grew {growth_mb:.0f} MB since load")
+                    self._restart_driver()
+    
+    def _extract_rows(self):
+        """
+        Extract the cells of every dashboard table row from the rendered page.
+        
+        The cells are collected by a script running in the page, so only the
+        table text crosses the driver connection; if that fails the page source
+        is parsed instead. Returns a list of cell lists, or None if the page has
+        no tables yet.
+        """
+        try:
+            rows = self.driver.execute_script(TABLE_EXTRACT_SCRIPT, self.source.cells)
+            if rows is not None:
+                rows = self.source.to_rows(rows)
+        except WebDriverException as e:
+            logger.warning(f"In-page table extraction failed, parsing page source: {e}")
+            rows = self._parse_html(self.driver.page_source)
+        
+        if rows is None:
+            logger.warning("No external-html divs found")
+            return None
+        
+        logger.info(f"Extracted {len(rows)} table rows")
+        return rows
+    
+    def _ingest_rows(self, rows, kind='dashboard'):
+        """Convert new or changed rows of the given kind ('dashboard' or 'feed') into events and insert them in one batch"""
+        changed_rows = self.change_tracker.changed_rows(rows)
+        if changed_rows is None:
+            logger.info(f"Table unchanged ({len(rows)} rows), skipping ingest")
+            return None
+        
+        events_batch = []
+        parse_time = 0.0
+        
+        for row_index, row in enumerate(changed_rows):
             try:
-                return datetime.strptime(datetime_str, fmt)
-            except ValueError:
+                title, location, datetime_value, channel, status = (
+                    cell.strip() if isinstance(cell, str) else cell for cell in row
+                )
+                
+                # Skip empty rows
+                if not title or not datetime_value:
+                    continue
+                
+                # Parse datetime with better error handling
+                start_time = time.perf_counter()
+                event_datetime = self._parse_datetime(datetime_value, kind)
+                parse_time += time.perf_counter() - start_time
+                if not event_datetime:
+                    continue
+                
+                # Create event data
+                event_data = {
+                    "title": title,
+                    "location": location or "",
+                    "datetime": event_datetime,
+                    "channel": channel or "",
+                    "status": status or "",
+                    "source": self.source.tag
+                }
+                
+                events_batch.append(event_data)
+                
+            except Exception as e:
+                logger.warning(f"Error processing row {row_index + 1}: {e}")
                 continue
         
-        logger.warning(f"Date parsing failed for string: {datetime_str}")
-        return None
+        # Insert the whole scrape in one batch, skipping duplicates
+        summary = insert_events_bulk(events_batch)
+        self.change_tracker.mark_seen(rows)
+        self.last_changes = summary['inserted'] + summary['updated']
+        
+        self._observe_stage('datetime_parse', parse_time)
+        self._observe_stage('dedup', summary['dedup_elapsed'])
+        self._observe_stage('insert', summary['insert_elapsed'])
+        for outcome in ('inserted', 'updated', 'skipped'):
+            SCRAPER_ROWS.inc(summary[outcome], source=self.source.tag, outcome=outcome)
+        
+        logger.info(f"Scraping completed successfully. Processed {len(events_batch)} of {len(rows)} rows "
+                    f"({summary['inserted']} inserted, {summary['updated']} updated, "
+                    f"{summary['skipped']} skipped).")
+        return summary
+    
+    def _observe_stage(self, stage, seconds):
+        """Record the time a stage of the cycle took, for /metrics"""
+        SCRAPER_STAGE_SECONDS.observe(seconds, source=self.source.tag, stage=stage)
+    
+    def _parse_datetime(self, datetime_str, kind='dashboard'):
+        """Parse a datetime string or epoch milliseconds with the parser for this kind of row"""
+        parser = self.datetime_parsers.get(kind)
+        if parser is None:
+            name = kind if self.source.tag == DEFAULT_SOURCE else f"{self.source.tag} {kind}"
+            parser = self.datetime_parsers[kind] = DatetimeParser(name)
+        return parser.parse(datetime_str)
     
     def _restart_driver(self):
         """Restart the driver in case of issues"""
-        try:
-            if self.driver:
-                self.driver.quit()
-        except:
-            pass
+        if self.browser_pool is not None and self.driver is not None:
+            self.browser_pool.discard(self.driver)
+        else:
+            try:
+                if self.driver:
+                    self.driver.quit()
+            except:
+                pass
         
         self.driver = None
         self.wait = None
+        self.page_loaded = False
+        self.baseline_heap = None
         time.sleep(1)  # Brief pause before restarting
         
+    def new_schedule(self, interval=None):
+        """Create the adaptive schedule of this scraper's source"""
+        return AdaptiveSchedule(self.source.tag, interval or self.source.interval,
+                                self.source.min_interval, self.source.max_interval)
+    
     def start_scraping_interval(self, interval=600):
         """
-        Starts the scraping process and continues to scrape every `interval` seconds.
+        Starts the scraping process and keeps scraping on an adaptive schedule.
         
-        :param interval: Time in seconds between each scrape (default is 600 seconds, or 10 minutes).
+        :param interval: Time in seconds between the first scrapes (default is 600 seconds, or 10 minutes);
+                         afterwards the interval follows how often the dashboard changes.
         """
-        logger.info(f"Starting scraping interval every {interval} seconds")
+        schedule = self.new_schedule(interval)
+        logger.info(f"Starting scraping every {schedule.min_interval:.0f}-{schedule.max_interval:.0f} seconds, "
+                    f"initially every {schedule.interval:.0f}")
         
         try:
-            while True:
-                start_time = time.time()
+            while not self.stop_event.is_set():
+                start_time = time.monotonic()
                 success = self.scrape_website()
                 
                 if not success:
-                    logger.error("Scraping failed, will retry next interval")
+                    logger.error("Scraping failed, will retry after backing off")
+                else:
+                    self._compact_rollups()
                 
-                elapsed_time = time.time() - start_time
+                elapsed_time = time.monotonic() - start_time
                 logger.info(f"Scrape completed in {elapsed_time:.2f} seconds")
                 
-                # Sleep for the remaining interval time
-                sleep_time = max(0, interval - elapsed_time)
+                schedule.record(success, self.last_changes, start_time)
+                save_schedules([schedule])
+                
+                # Sleep until the next scrape is due
+                sleep_time = max(0, schedule.next_due - time.monotonic())
                 if sleep_time > 0:
                     logger.info(f"Sleeping for {sleep_time:.2f} seconds until next scrape")
-                    time.sleep(sleep_time)
+                    self.stop_event.wait(sleep_time)
+            
+            logger.info("Scraping stopped")
                     
         except KeyboardInterrupt:
             logger.info("Scraping interrupted by user")
@@ -291,8 +628,27 @@ class OptimizedFireScraper:
         finally:
             self.cleanup()
     
+    def _compact_rollups(self):
+        """Fold newly ingested events into the rollup tables, then archive old events when due"""
+        try:
+            compacted = compact_rollups()
+            if compacted:
+                logger.info(f"Rolled up {compacted} events")
+        except Exception as e:
+            logger.error(f"Rollup compaction failed: {e}")
+        self.retention.run_if_due()
+    
+    def stop(self):
+        """Ask start_scraping_interval to finish after the current cycle"""
+        self.stop_event.set()
+    
     def cleanup(self):
         """Clean up resources"""
+        if self.fetcher:
+            self.fetcher.close()
+        if self.page_fetcher:
+            self.page_fetcher.close()
+        self._release_driver()
         if self.driver:
             try:
                 self.driver.quit()
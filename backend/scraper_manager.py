@@ -0,0 +1,302 @@
+"""
+Scrapes several dashboards concurrently.
+
+    python scraper_manager.py                          # sources from SCRAPER_SOURCES_FILE
+    python scraper_manager.py --sources sources.json
+    python scraper_manager.py --once                   # one pass over every source, then exit
+    python scraper_manager.py --profile scraper.folded # sample stacks until exit (see profiler.py)
+
+Every source gets its own OptimizedFireScraper, with its own change tracker
+and adaptive schedule (see scheduler.py), run on a bounded pool of
+SCRAPER_WORKERS threads. A source is never scraped twice at the same time,
+and a slow or stalled dashboard only holds its own worker, so the others
+keep their schedule. Selenium sources
+share at most SCRAPER_MAX_BROWSERS browsers, which stay open between cycles
+and go back to the source that last used them, with its page still loaded.
+Fetched HTML is parsed in a pool of SCRAPER_PARSE_PROCESSES processes, so
+large pages do not serialize the workers on the GIL.
+"""
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import argparse
+import logging
+import os
+import signal
+import threading
+import time
+
+from archive import RetentionJob
+from profiler import SamplingProfiler
+from scraper import OptimizedFireScraper, create_chrome_driver
+from rollups import compact_rollups
+from scheduler import save_schedules
+from sources import load_sources
+import config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Longest the scheduler sleeps before checking for due sources and stop requests
+SCHEDULER_TICK = 1.0
+
+class BrowserPool:
+    """
+    A bounded set of reusable browsers shared by the Selenium sources.
+
+    Browsers are started on demand, up to `size`. A free browser last used
+    by the requesting source is preferred, since its dashboard is still
+    loaded; otherwise a new browser is started while there is room, and
+    only then is another source's idle browser taken over.
+    """
+
+    def __init__(self, size, create_driver=create_chrome_driver):
+        self.size = size
+        self.create_driver = create_driver
+        self._condition = threading.Condition()
+        self._idle = []
+        self._busy = {}
+        self._free_slots = list(range(size))
+        self._closed = False
+
+    def acquire(self, tag, timeout=None):
+        """
+        Borrow a browser, waiting for one to be released if all are in use.
+
+        Args:
+            tag (str): Source the browser is for
+            timeout (float): Seconds to wait; None waits until one is free
+
+        Returns:
+            tuple: (driver, warm) where warm is True when the browser still
+            shows the page of `tag`, or (None, False) when the pool was closed
+            or the wait timed out
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                if self._closed:
+                    return None, False
+                for index, (slot, driver, last_tag) in enumerate(self._idle):
+                    if last_tag == tag:
+                        del self._idle[index]
+                        self._busy[driver] = slot
+                        return driver, True
+                if self._free_slots:
+                    slot = self._free_slots.pop(0)
+                    break
+                if self._idle:
+                    # Least recently released first
+                    slot, driver, _ = self._idle.pop(0)
+                    self._busy[driver] = slot
+                    return driver, False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None, False
+                self._condition.wait(remaining)
+
+        # Start the browser outside the lock; it takes seconds
+        try:
+            driver = self.create_driver(slot)
+        except Exception:
+            with self._condition:
+                self._free_slots.append(slot)
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._busy[driver] = slot
+        return driver, False
+
+    def release(self, driver, tag=None):
+        """Return a browser, noting the source whose page it shows (None if no page is loaded)."""
+        with self._condition:
+            slot = self._busy.pop(driver)
+            if not self._closed:
+                self._idle.append((slot, driver, tag))
+                self._condition.notify()
+                return
+        self._quit(driver)
+
+    def discard(self, driver):
+        """Quit a broken browser, making room for a new one."""
+        with self._condition:
+            slot = self._busy.pop(driver)
+            self._free_slots.append(slot)
+            self._condition.notify()
+        self._quit(driver)
+
+    def close(self):
+        """Quit idle browsers; borrowed ones are quit when released."""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+        for _, driver, _ in idle:
+            self._quit(driver)
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"Error closing browser: {e}")
+
+class ScraperManager:
+    """
+    Runs one scraper per source on a shared pool of worker threads.
+
+    Args:
+        sources (list): Source objects to scrape
+        workers (int): Sources scraped at the same time
+        max_browsers (int): Browsers shared by the Selenium sources
+        parse_processes (int): Processes parsing page HTML; 0 means one per CPU core
+        create_driver (callable): Starts a browser for a pool slot
+    """
+
+    def __init__(self, sources, workers=None, max_browsers=None, parse_processes=None,
+                 create_driver=create_chrome_driver):
+        workers = workers or config.SCRAPER_WORKERS
+        max_browsers = max_browsers or config.SCRAPER_MAX_BROWSERS
+        if parse_processes is None:
+            parse_processes = config.SCRAPER_PARSE_PROCESSES
+        self.stop_event = threading.Event()
+        self.results = {}
+
+        # Start the parse processes now, while no worker threads exist to be forked mid-operation
+        self.parse_pool = ProcessPoolExecutor(parse_processes or os.cpu_count())
+        self.parse_pool.submit(int).result()
+
+        self.browser_pool = BrowserPool(max_browsers, create_driver)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scraper')
+        self.scrapers = {
+            source.tag: OptimizedFireScraper(source=source, browser_pool=self.browser_pool,
+                                             parse_pool=self.parse_pool)
+            for source in sources
+        }
+        self.schedules = {tag: scraper.new_schedule() for tag, scraper in self.scrapers.items()}
+        self._compact_lock = threading.Lock()
+        self.retention = RetentionJob()
+
+    def scrape_source(self, tag):
+        """
+        Run one cycle of a source, never letting its failure reach the others,
+        and schedule its next cycle.
+
+        Returns:
+            bool: True if the cycle succeeded
+        """
+        scraper = self.scrapers[tag]
+        start_time = time.monotonic()
+        try:
+            success = bool(scraper.scrape_website())
+        except Exception as e:
+            logger.error(f"[{tag}] Scrape failed: {e}")
+            success = False
+        elapsed = time.monotonic() - start_time
+        self.results[tag] = (success, elapsed)
+        delay = self.schedules[tag].record(success, scraper.last_changes, start_time)
+        logger.info(f"[{tag}] Scrape {'completed' if success else 'failed'} in {elapsed:.2f} seconds, "
+                    f"{scraper.last_changes} changes, next in {max(0, delay - elapsed):.0f} seconds")
+        save_schedules([self.schedules[tag]])
+        if success:
+            self._compact_rollups()
+        return success
+
+    def scrape_all(self):
+        """
+        Scrape every source once, concurrently.
+
+        Returns:
+            dict: Whether each source's cycle succeeded, by tag
+        """
+        futures = {tag: self.executor.submit(self.scrape_source, tag) for tag in self.scrapers}
+        return {tag: future.result() for tag, future in futures.items()}
+
+    def schedule_state(self):
+        """
+        Returns:
+            dict: The current schedule of each source, by tag
+        """
+        return {tag: schedule.state() for tag, schedule in self.schedules.items()}
+
+    def run(self):
+        """
+        Scrape each source on its adaptive schedule until stop() is called.
+
+        A source is only scheduled again once its cycle has finished, so it
+        is never queued twice.
+        """
+        logger.info(f"Scraping {len(self.scrapers)} sources: {', '.join(self.scrapers)}")
+        running = {}
+        try:
+            while not self.stop_event.is_set():
+                now = time.monotonic()
+                for tag, schedule in self.schedules.items():
+                    if schedule.next_due <= now and tag not in running.values():
+                        running[self.executor.submit(self.scrape_source, tag)] = tag
+
+                idle = [schedule.next_due for tag, schedule in self.schedules.items() if tag not in running.values()]
+                timeout = max(0, min(idle, default=now + SCHEDULER_TICK) - time.monotonic())
+                if running:
+                    done, _ = wait(running, timeout=min(timeout, SCHEDULER_TICK), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        del running[future]
+                else:
+                    self.stop_event.wait(min(timeout, SCHEDULER_TICK))
+            logger.info("Scraping stopped")
+        finally:
+            wait(running)
+            self.cleanup()
+
+    def _compact_rollups(self):
+        """Fold newly ingested events into the rollup tables, one source at a time; archive old ones when due"""
+        with self._compact_lock:
+            try:
+                compacted = compact_rollups()
+                if compacted:
+                    logger.info(f"Rolled up {compacted} events")
+            except Exception as e:
+                logger.error(f"Rollup compaction failed: {e}")
+        # Outside the lock, so that other sources' compactions are not held up; one run at a time
+        self.retention.run_if_due()
+
+    def stop(self):
+        """Ask run() to finish after the cycles in progress"""
+        self.stop_event.set()
+
+    def cleanup(self):
+        """Close every scraper, browser and worker pool"""
+        self.executor.shutdown(wait=True)
+        for scraper in self.scrapers.values():
+            scraper.cleanup()
+        self.browser_pool.close()
+        self.parse_pool.shutdown()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Scrape several dashboards concurrently")
+    parser.add_argument('--sources', default=config.SCRAPER_SOURCES_FILE,
+                        help="JSON file listing the sources (default SCRAPER_SOURCES_FILE)")
+    parser.add_argument('--once', action='store_true', help="Scrape every source once and exit")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="Sample the stacks of every thread and write them to PATH in the folded format on exit")
+    args = parser.parse_args()
+
+    manager = ScraperManager(load_sources(args.sources))
+    profiler = SamplingProfiler().start() if args.profile else None
+    try:
+        if args.once:
+            try:
+                results = manager.scrape_all()
+            finally:
+                manager.cleanup()
+            failed = [tag for tag, success in results.items() if not success]
+            raise SystemExit(f"Failed sources: {', '.join(failed)}" if failed else 0)
+
+        def handle_signal(signum, frame):
+            logger.info(f"Scraper manager received signal {signum}, stopping after the current cycles")
+            manager.stop()
+
+        signal.signal(signal.SIGTERM, handle_signal)
+        signal.signal(signal.SIGINT, handle_signal)
+        manager.run()
+    finally:
+        if profiler is not None:
+            profiler.stop().write(args.profile)
+            logger.info(f"Wrote {profiler.samples} stack samples to {args.profile}")
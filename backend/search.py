@@ -0,0 +1,196 @@
+"""
+Full-text and spatial search over events, for /api/search.
+
+Text queries match whole words in the title and location through the
+full-text index (FTS5 on SQLite, a GIN index on PostgreSQL). Spatial queries
+read the event_points index that the geocoder fills at ingest, either within
+a bounding box or within a radius of a point.
+Results are most recently inserted first and paginated by event id.
+"""
+from sqlalchemy import select, desc, func, inspect, literal_column, column, table
+from functools import lru_cache
+import math
+import re
+
+from database import Event, POSTGRESQL_SEARCH_DOCUMENT, engine, event_points
+from queries import EVENT_FIELDS, MAX_PAGE_SIZE, QueryError, parse_datetime_param
+from serialization import serialize_event
+
+# Results per page when the request does not set a limit
+DEFAULT_SEARCH_LIMIT = 50
+
+# Radius in kilometres used with `near` when the request does not set one
+DEFAULT_RADIUS_KM = 1.0
+
+# Decimal places of returned coordinates (about 1 m)
+COORDINATE_DIGITS = 5
+
+# Kilometres per degree of latitude
+KM_PER_DEGREE = 111.32
+
+# SQLite's full-text table; its rowid is the event id
+events_fts = table('events_fts', column('rowid'))
+
+@lru_cache(maxsize=1)
+def text_search_backend():
+    """
+    Which full-text index text queries use: 'postgresql', 'fts5', or None when
+    this SQLite build has no FTS5 and titles and locations are scanned instead.
+    """
+    if engine.dialect.name == 'postgresql':
+        return 'postgresql'
+    return 'fts5' if inspect(engine).has_table('events_fts') else None
+
+def _parse_floats(name, value, count):
+    """Parse a comma separated list of `count` numbers."""
+    try:
+        numbers = [float(part) for part in value.split(',')]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count:
+        raise QueryError(f"{name} must be {count} comma separated numbers")
+    return numbers
+
+def parse_search_params(args):
+    """
+    Converts request query parameters into search_events options.
+
+    Supported parameters: `q` (words that must all appear in the title or location),
+    `bbox` (min_lon,min_lat,max_lon,max_lat), `near` (lat,lon) with `radius`
+    in kilometres, `since` and `until` (ISO 8601), `limit` and `before` (the
+    `next_cursor` of the previous page). At least one of q, bbox and near is
+    required.
+    """
+    params = {
+        'words': re.findall(r'\w+', (args.get('q') or '').lower()) or None,
+        'bbox': None,
+        'near': None,
+        'radius': None,
+        'since': None,
+        'until': None,
+        'limit': DEFAULT_SEARCH_LIMIT,
+        'before': None
+    }
+    if args.get('q') and params['words'] is None:
+        raise QueryError("q must contain at least one letter or digit")
+
+    if args.get('bbox'):
+        min_lon, min_lat, max_lon, max_lat = _parse_floats('bbox', args['bbox'], 4)
+        if min_lon > max_lon or min_lat > max_lat:
+            raise QueryError("bbox must be min_lon,min_lat,max_lon,max_lat")
+        params['bbox'] = (min_lon, min_lat, max_lon, max_lat)
+    if args.get('near'):
+        params['near'] = tuple(_parse_floats('near', args['near'], 2))
+        params['radius'] = DEFAULT_RADIUS_KM
+        if args.get('radius'):
+            params['radius'] = _parse_floats('radius', args['radius'], 1)[0]
+            if params['radius'] <= 0:
+                raise QueryError("radius must be positive")
+    if not (params['words'] or params['bbox'] or params['near']):
+        raise QueryError("Provide q, bbox or near")
+
+    for name in ('since', 'until'):
+        if args.get(name):
+            params[name] = parse_datetime_param(name, args[name])
+    if args.get('limit'):
+        try:
+            params['limit'] = int(args['limit'])
+        except ValueError:
+            raise QueryError(f"Invalid limit: {args['limit']}")
+        if not 0 < params['limit'] <= MAX_PAGE_SIZE:
+            raise QueryError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    if args.get('before'):
+        try:
+            params['before'] = int(args['before'])
+        except ValueError:
+            raise QueryError(f"Invalid cursor: {args['before']}")
+    return params
+
+def radius_box(latitude, longitude, radius):
+    """Bounding box (min_lon, min_lat, max_lon, max_lat) around a circle of `radius` km."""
+    lat_delta = radius / KM_PER_DEGREE
+    lon_delta = radius / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 1e-6))
+    return (longitude - lon_delta, latitude - lat_delta, longitude + lon_delta, latitude + lat_delta)
+
+def build_search_query(words=None, bbox=None, near=None, radius=None, since=None, until=None,
+                       limit=DEFAULT_SEARCH_LIMIT, before=None):
+    """
+    Builds the search SELECT, with each event's coordinates when geocoded.
+
+    Text queries are driven by the full-text index in rowid order, so the
+    first page of a common word stops after `limit` matches; spatial queries
+    are driven by the event_points index and filtered to the exact radius.
+
+    Returns:
+        Select: Statement yielding event rows plus latitude and longitude
+    """
+    # The R*Tree stores 32-bit bounds rounded outwards; their midpoint is the point
+    stmt = select(
+        *(getattr(Event, field) for field in EVENT_FIELDS),
+        ((event_points.c.min_lat + event_points.c.max_lat) / 2).label('latitude'),
+        ((event_points.c.min_lon + event_points.c.max_lon) / 2).label('longitude')
+    )
+    order_key = Event.id
+
+    backend = text_search_backend() if words else None
+    if backend == 'fts5':
+        match = " ".join(f'"{word}"' for word in words)
+        stmt = stmt.select_from(events_fts).join(Event, Event.id == events_fts.c.rowid) \
+            .where(literal_column('events_fts').op('MATCH')(match))
+        order_key = events_fts.c.rowid
+    else:
+        stmt = stmt.select_from(Event)
+        if backend == 'postgresql':
+            tsquery = " & ".join(words)
+            stmt = stmt.where(literal_column(POSTGRESQL_SEARCH_DOCUMENT).op('@@')(func.to_tsquery('simple', tsquery)))
+        elif words:
+            for word in words:
+                stmt = stmt.where(Event.title.icontains(word, autoescape=True)
+                                  | Event.location.icontains(word, autoescape=True))
+
+    boxes = []
+    if bbox is not None:
+        boxes.append(bbox)
+    if near is not None:
+        boxes.append(radius_box(near[0], near[1], radius))
+    if boxes:
+        stmt = stmt.join(event_points, event_points.c.id == Event.id)
+        for min_lon, min_lat, max_lon, max_lat in boxes:
+            stmt = stmt.where(
+                event_points.c.min_lat >= min_lat, event_points.c.max_lat <= max_lat,
+                event_points.c.min_lon >= min_lon, event_points.c.max_lon <= max_lon
+            )
+        if near is not None:
+            # Equirectangular distance, accurate to well under 1% at city scale
+            lat_km = (event_points.c.min_lat - near[0]) * KM_PER_DEGREE
+            lon_km = (event_points.c.min_lon - near[1]) * (KM_PER_DEGREE * math.cos(math.radians(near[0])))
+            stmt = stmt.where(lat_km * lat_km + lon_km * lon_km <= radius * radius)
+    else:
+        stmt = stmt.outerjoin(event_points, event_points.c.id == Event.id)
+
+    if since is not None:
+        stmt = stmt.where(Event.datetime >= since)
+    if until is not None:
+        stmt = stmt.where(Event.datetime < until)
+    if before is not None:
+        stmt = stmt.where(order_key < before)
+    return stmt.order_by(desc(order_key)).limit(limit)
+
+def search_events(session, **params):
+    """
+    Runs a search built from parse_search_params options.
+
+    Returns:
+        dict: The /api/search payload: matching events with their latitude
+        and longitude (null when not geocoded), and the cursor for the next
+        page (null once the last page is reached)
+    """
+    rows = session.execute(build_search_query(**params)).all()
+    events = []
+    for row in rows:
+        event = serialize_event(row)
+        event['latitude'] = None if row.latitude is None else round(row.latitude, COORDINATE_DIGITS)
+        event['longitude'] = None if row.longitude is None else round(row.longitude, COORDINATE_DIGITS)
+        events.append(event)
+    next_cursor = str(rows[-1].id) if len(rows) == params['limit'] else None
+    return {'success': True, 'count': len(events), 'events': events, 'next_cursor': next_cursor}
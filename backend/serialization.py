@@ -0,0 +1,151 @@
+"""
+JSON rendering of event rows for API responses.
+
+Each row is encoded once into a JSON fragment that is cached under its id and
+data version, so a row is only re-encoded after ingest changes it; response
+bodies are assembled by joining fragments. orjson is used when installed.
+"""
+from collections import OrderedDict
+import json
+import threading
+import config
+from queries import EVENT_FIELDS, encode_cursor
+
+# Optional fast JSON encoder; the standard library is used when it is missing
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# English month names, as strftime('%B') renders them in the C locale
+MONTH_NAMES = (
+    'January', 'February', 'March', 'April', 'May', 'June', 'July',
+    'August', 'September', 'October', 'November', 'December'
+)
+
+def encode_json(value):
+    """Encode a value as compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def format_datetime(value):
+    """Same as value.strftime('%Y-%m-%d %H:%M:%S'), without the format parser."""
+    return (f"{value.year:04d}-{value.month:02d}-{value.day:02d} "
+            f"{value.hour:02d}:{value.minute:02d}:{value.second:02d}")
+
+def format_datetime_readable(value):
+    """Same as value.strftime('%B %d, %Y at %I:%M %p') in the C locale."""
+    return (f"{MONTH_NAMES[value.month - 1]} {value.day:02d}, {value.year} at "
+            f"{value.hour % 12 or 12:02d}:{value.minute:02d} {'AM' if value.hour < 12 else 'PM'}")
+
+def serialize_event(row, fields=EVENT_FIELDS):
+    """
+    Convert an event row into a JSON-serializable dictionary.
+
+    Args:
+        row: Row or Event exposing the selected event columns as attributes
+        fields (tuple): Names of the columns to include
+
+    Returns:
+        dict: The event's fields, with datetime rendered in both formats
+    """
+    event = {}
+    for field in fields:
+        if field == 'datetime':
+            event['datetime'] = format_datetime(row.datetime)
+            event['datetime_readable'] = format_datetime_readable(row.datetime)
+        else:
+            event[field] = getattr(row, field)
+    return event
+
+class FragmentCache:
+    """
+    Bounded LRU cache of encoded event JSON.
+
+    Keys include the row's data version, which ingest bumps whenever it
+    changes the row, so entries never go stale; they only age out.
+    """
+
+    def __init__(self, max_rows=50000):
+        self.max_rows = max_rows
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode_rows(self, rows, fields=EVENT_FIELDS):
+        """
+        Encode rows selected by build_events_query.
+
+        Returns:
+            list: One JSON fragment (bytes) per row, in order
+        """
+        keys = [(row.id, row.data_version, fields) for row in rows]
+        with self._lock:
+            fragments = [self._fragments.get(key) for key in keys]
+            for key, fragment in zip(keys, fragments):
+                if fragment is not None:
+                    self._fragments.move_to_end(key)
+
+        missing = [index for index, fragment in enumerate(fragments) if fragment is None]
+        for index in missing:
+            fragments[index] = encode_json(serialize_event(rows[index], fields))
+
+        with self._lock:
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+            for index in missing:
+                self._fragments[keys[index]] = fragments[index]
+            while len(self._fragments) > self.max_rows:
+                self._fragments.popitem(last=False)
+        return fragments
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            return {
+                'rows': len(self._fragments),
+                'max_rows': self.max_rows,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+fragment_cache = FragmentCache(config.SERIALIZATION_CACHE_ROWS)
+
+def render_page(rows, params):
+    """
+    Render a page of event rows as the /api/events JSON document.
+
+    Args:
+        rows (list): Rows returned by build_events_query(**params)
+        params (dict): Options the query was built from
+
+    Returns:
+        bytes: The serialized events and, when the query was limited, the
+        cursor for the next page (null once the last page is reached)
+    """
+    fragments = fragment_cache.encode_rows(rows, params['fields'])
+    body = b'{"success":true,"count":%d,"events":[%s]' % (len(rows), b','.join(fragments))
+    if params['limit'] is not None:
+        # /api/events/latest/0 asks for no rows, which leaves nothing to continue from
+        has_more = bool(rows) and len(rows) == params['limit']
+        cursor = encode_cursor(rows[-1].datetime, rows[-1].id) if has_more else None
+        body += b',"next_cursor":' + encode_json(cursor)
+    return body + b'}'
+
+# Opening of the JSON document streamed for unlimited event queries
+STREAM_HEADER = b'{"success":true,"events":['
+
+def render_stream_batch(rows, fields, first, ndjson=False):
+    """Render a batch of rows of a streamed events response."""
+    if not rows:
+        return b''
+    fragments = fragment_cache.encode_rows(rows, fields)
+    if ndjson:
+        return b''.join(fragment + b'\n' for fragment in fragments)
+    return (b'' if first else b',') + b','.join(fragments)
+
+def stream_footer(count):
+    """Close the JSON document opened by STREAM_HEADER."""
+    return b'],"count":%d}' % count
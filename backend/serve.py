@@ -0,0 +1,180 @@
+"""
+Production entry point: serves the API from a multi-worker gunicorn server and
+runs the scraper in its own process.
+
+    python serve.py                  # API + scraper
+    python serve.py --workers 8      # override API_WORKERS
+    python serve.py --no-scraper     # API only
+    python serve.py --no-api         # scraper only
+    python serve.py --async          # asyncio API (async_app.py) under uvicorn
+
+SIGTERM or Ctrl-C stops both: API workers finish their in-flight requests and
+the scraper finishes its current cycle before exiting.
+"""
+from gunicorn.app.base import BaseApplication
+import argparse
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for the scraper to finish its cycle before killing it
+SCRAPER_SHUTDOWN_TIMEOUT = 60
+
+class APIServer(BaseApplication):
+    """Runs the Flask app under gunicorn with options set from code."""
+
+    def __init__(self, application, options):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+def _post_fork(server, worker):
+    """Give each worker its own database connections instead of the master's."""
+    from database import engine
+    engine.dispose(close=False)
+
+def api_options(bind, workers, threads):
+    """Build the gunicorn settings for the API server."""
+    return {
+        'bind': bind,
+        'workers': workers or multiprocessing.cpu_count() * 2 + 1,
+        'threads': threads,
+        'worker_class': 'gthread',
+        'graceful_timeout': config.API_GRACEFUL_TIMEOUT,
+        # Import the app (and run schema migrations) once, before forking
+        'preload_app': True,
+        'post_fork': _post_fork,
+        'accesslog': '-'
+    }
+
+def run_async_api(bind, workers):
+    """Serve async_app.py with uvicorn, one event loop per worker process."""
+    import uvicorn
+
+    host, _, port = bind.rpartition(':')
+    uvicorn.run(
+        'async_app:app',
+        host=host or '0.0.0.0',
+        port=int(port),
+        workers=workers or multiprocessing.cpu_count() * 2 + 1,
+        timeout_graceful_shutdown=config.API_GRACEFUL_TIMEOUT
+    )
+
+def run_scraper(interval):
+    """
+    Entry point of the scraper process: every source in SCRAPER_SOURCES_FILE
+    on its own schedule when the file is set, otherwise the single dashboard
+    every `interval` seconds.
+    """
+    if config.SCRAPER_SOURCES_FILE:
+        from scraper_manager import ScraperManager
+        from sources import load_sources
+        runner = ScraperManager(load_sources())
+    else:
+        from scraper import scraper as runner
+
+    def handle_signal(signum, frame):
+        logger.info(f"Scraper received signal {signum}, stopping after the current cycle")
+        runner.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    if config.SCRAPER_SOURCES_FILE:
+        runner.run()
+    else:
+        runner.start_scraping_interval(interval)
+
+def start_scraper(interval):
+    """
+    Start the scraper as a separate `serve.py --no-api` process.
+
+    A plain subprocess rather than multiprocessing, so that forked API workers
+    do not inherit it as a child they would try to join on exit.
+    """
+    process = subprocess.Popen([
+        sys.executable, __file__, '--no-api', '--interval', str(interval)
+    ])
+    logger.info(f"Scraper process started (pid {process.pid})")
+    return process
+
+def stop_scraper(process):
+    """Ask the scraper process to stop and wait for it, killing it if it hangs."""
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(SCRAPER_SHUTDOWN_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        logger.warning("Scraper did not stop in time, killing it")
+        process.kill()
+        process.wait()
+    logger.info("Scraper process stopped")
+
+def prepare_metrics_dir():
+    """
+    Give the API workers and the scraper a METRICS_DIR to share their metrics
+    through, so that /metrics reports all of them.
+
+    Returns:
+        str: A temporary directory to remove on exit, or None when METRICS_DIR
+        was set, in which case the snapshots of the previous run are removed
+    """
+    if config.METRICS_DIR:
+        from metrics import clear_snapshots
+        clear_snapshots()
+        return None
+    metrics_dir = tempfile.mkdtemp(prefix='fires-metrics-')
+    # Read by the scraper subprocess and uvicorn workers, which import config afresh
+    os.environ['METRICS_DIR'] = config.METRICS_DIR = metrics_dir
+    return metrics_dir
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the fires API and scraper for production")
+    parser.add_argument('--bind', default=config.API_BIND)
+    parser.add_argument('--workers', type=int, default=config.API_WORKERS)
+    parser.add_argument('--threads', type=int, default=config.API_THREADS)
+    parser.add_argument('--interval', type=int, default=config.SCRAPE_INTERVAL)
+    parser.add_argument('--no-scraper', action='store_true', help="Serve the API only")
+    parser.add_argument('--no-api', action='store_true', help="Run the scraper only")
+    parser.add_argument('--async', dest='async_api', action='store_true', default=config.API_ASYNC,
+                        help="Serve the asyncio API with uvicorn instead of Flask with gunicorn")
+    args = parser.parse_args()
+
+    if args.no_api:
+        if not args.no_scraper:
+            run_scraper(args.interval)
+        return
+
+    metrics_dir = prepare_metrics_dir()
+    scraper_process = None if args.no_scraper else start_scraper(args.interval)
+    try:
+        if args.async_api:
+            run_async_api(args.bind, args.workers)
+        else:
+            from app import app
+            APIServer(app, api_options(args.bind, args.workers, args.threads)).run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_scraper(scraper_process)
+        if metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Definitions of the dashboards the scraper reads.
+
+SCRAPER_SOURCES_FILE points at a JSON list of sources, for example:
+
+    [
+        {"tag": "phoenix", "url": "https://mapportal.phoenix.gov/pfd/apps/dashboards/...", "interval": 600},
+        {"tag": "tempe", "backend": "feed", "feed_url": "https://.../FeatureServer/0/query",
+         "fields": {"title": "Type", "location": "Address", "datetime": "Received",
+                    "channel": "Talkgroup", "status": "Units"}},
+        {"tag": "mesa", "backend": "html", "url": "https://.../incidents.html",
+         "columns": ["datetime", "title", "location", null, "channel", "status"]}
+    ]
+
+`backend` is 'selenium' (the default: render the page in Chrome), 'feed'
+(query the feature service behind it) or 'html' (parse the page as served,
+for dashboards rendered on the server). `columns` is the table layout: the
+event field of each cell, in order, with null for cells to skip; it defaults
+to title, location, datetime, channel, status. `interval` is the starting
+interval of the adaptive schedule (see scheduler.py), kept between
+`min_interval` and `max_interval`.
+
+Without a sources file the single dashboard configured through DASHBOARD_URL,
+SCRAPER_BACKEND and FEED_URL is scraped, tagged 'default'.
+"""
+import json
+import re
+
+from database import DEFAULT_SOURCE
+from fetcher import ROW_FIELDS
+import config
+
+# Ways of reading a dashboard
+SOURCE_BACKENDS = ('selenium', 'feed', 'html')
+
+# Fields every table layout must include
+REQUIRED_COLUMNS = ('title', 'datetime')
+
+class SourceError(ValueError):
+    """Raised when a source definition is invalid."""
+
+class Source:
+    """
+    One dashboard to scrape.
+
+    Attributes:
+        tag (str): Stored with every event scraped from the source
+        backend (str): One of SOURCE_BACKENDS
+        url (str): Dashboard page, for the selenium and html backends and
+            as the fallback of the feed backend
+        feed_url (str): Feature service query endpoint, for the feed backend
+        fields (dict): Feed attribute name of each event field
+        columns (tuple): Event field of each table cell, None for skipped cells
+        interval (int): Seconds between scrapes until the change rate is known
+        min_interval, max_interval (float): Bounds of the adaptive interval
+        timeout (float): Seconds to wait for an HTTP response
+    """
+
+    def __init__(self, tag, backend='selenium', url=None, feed_url=None, fields=None,
+                 columns=ROW_FIELDS, interval=None, min_interval=None, max_interval=None, timeout=None):
+        self.tag = tag
+        self.backend = backend
+        self.url = url
+        self.feed_url = feed_url
+        self.fields = fields or config.FEED_FIELDS
+        self.columns = tuple(columns)
+        self.interval = interval or config.SCRAPE_INTERVAL
+        self.min_interval = min_interval or config.SCRAPE_MIN_INTERVAL
+        self.max_interval = max_interval or config.SCRAPE_MAX_INTERVAL
+        self.timeout = timeout or config.FEED_TIMEOUT
+        # Cell index of each of ROW_FIELDS, None when the table lacks it
+        self._positions = [self.columns.index(field) if field in self.columns else None
+                           for field in ROW_FIELDS]
+
+    @property
+    def cells(self):
+        """Number of cells read from each table row."""
+        return len(self.columns)
+
+    def to_rows(self, rows):
+        """Reorder table rows laid out as `columns` into ROW_FIELDS order."""
+        if self.columns == ROW_FIELDS:
+            return rows
+        return [
+            tuple(None if position is None else row[position] for position in self._positions)
+            for row in rows
+        ]
+
+    @classmethod
+    def from_dict(cls, definition):
+        """
+        Build a source from one entry of the sources file.
+
+        Raises:
+            SourceError: If the entry is incomplete or inconsistent
+        """
+        if not isinstance(definition, dict):
+            raise SourceError(f"Source definitions must be JSON objects: {definition!r}")
+        unknown = set(definition) - {'tag', 'backend', 'url', 'feed_url', 'fields', 'columns', 'interval',
+                                     'min_interval', 'max_interval', 'timeout'}
+        if unknown:
+            raise SourceError(f"Unknown source settings: {', '.join(sorted(unknown))}")
+        tag = definition.get('tag')
+        if not tag or not re.fullmatch(r'[\w-]+', tag):
+            raise SourceError(f"Source tag must be letters, digits, '_' or '-': {tag!r}")
+
+        backend = definition.get('backend', 'selenium')
+        if backend not in SOURCE_BACKENDS:
+            raise SourceError(f"Source {tag}: backend must be one of {', '.join(SOURCE_BACKENDS)}")
+        if backend == 'feed' and not definition.get('feed_url'):
+            raise SourceError(f"Source {tag}: the feed backend needs a feed_url")
+        if backend != 'feed' and not definition.get('url'):
+            raise SourceError(f"Source {tag}: the {backend} backend needs a url")
+
+        columns = definition.get('columns', ROW_FIELDS)
+        named = [column for column in columns if column is not None]
+        if any(column not in ROW_FIELDS for column in named) or len(named) != len(set(named)) \
+                or any(column not in named for column in REQUIRED_COLUMNS):
+            raise SourceError(f"Source {tag}: columns must name each of {', '.join(ROW_FIELDS)} at most once, "
+                              f"including {' and '.join(REQUIRED_COLUMNS)}")
+
+        fields = definition.get('fields')
+        if fields is not None and any(field not in fields for field in ROW_FIELDS):
+            raise SourceError(f"Source {tag}: fields must map each of {', '.join(ROW_FIELDS)}")
+
+        min_interval = definition.get('min_interval') or config.SCRAPE_MIN_INTERVAL
+        max_interval = definition.get('max_interval') or config.SCRAPE_MAX_INTERVAL
+        if min_interval > max_interval:
+            raise SourceError(f"Source {tag}: min_interval is above max_interval")
+
+        return cls(tag, backend, url=definition.get('url'), feed_url=definition.get('feed_url'),
+                   fields=fields, columns=columns, interval=definition.get('interval'),
+                   min_interval=min_interval, max_interval=max_interval,
+                   timeout=definition.get('timeout'))
+
+def default_source():
+    """The dashboard configured through DASHBOARD_URL, SCRAPER_BACKEND and FEED_URL."""
+    return Source(DEFAULT_SOURCE, config.SCRAPER_BACKEND, url=config.DASHBOARD_URL,
+                  feed_url=config.FEED_URL or None)
+
+def load_sources(path=None):
+    """
+    Read the sources file.
+
+    Args:
+        path (str): JSON file to read; defaults to SCRAPER_SOURCES_FILE
+
+    Returns:
+        list: Source objects, or just default_source() when no file is configured
+
+    Raises:
+        SourceError: If the file is malformed or two sources share a tag
+    """
+    path = path or config.SCRAPER_SOURCES_FILE
+    if not path:
+        return [default_source()]
+
+    try:
+        with open(path, encoding='utf-8') as sources_file:
+            definitions = json.load(sources_file)
+    except (OSError, ValueError) as e:
+        raise SourceError(f"Cannot read sources file {path}: {e}")
+    if not isinstance(definitions, list) or not definitions:
+        raise SourceError(f"Sources file {path} must contain a non-empty JSON list")
+
+    sources = [Source.from_dict(definition) for definition in definitions]
+    tags = [source.tag for source in sources]
+    duplicates = sorted({tag for tag in tags if tags.count(tag) > 1})
+    if duplicates:
+        raise SourceError(f"Duplicate source tags: {', '.join(duplicates)}")
+    return sources
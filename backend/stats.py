@@ -0,0 +1,147 @@
+from sqlalchemy import select, func
+from collections import defaultdict
+from datetime import datetime, timedelta
+from database import (
+    Event, EventCounter, COUNTER_DIMENSIONS, engine, normalize_incident_type, status_states
+)
+from queries import QueryError, parse_datetime_param
+
+# strftime patterns used to truncate datetimes into buckets
+BUCKET_FORMATS = {
+    'hour': '%Y-%m-%d %H:00:00',
+    'day': '%Y-%m-%d 00:00:00'
+}
+
+# Window used for the timeline when a bucket is requested without `since`
+DEFAULT_BUCKET_WINDOW = {
+    'hour': timedelta(days=1),
+    'day': timedelta(days=30)
+}
+
+def parse_stats_params(args):
+    """
+    Converts request query parameters into compute_stats options.
+
+    Supported parameters: `since`, `until` (ISO 8601) and `bucket` ('hour' or 'day').
+    """
+    params = {'since': None, 'until': None, 'bucket': args.get('bucket') or None}
+    for name in ('since', 'until'):
+        if args.get(name):
+            params[name] = parse_datetime_param(name, args[name])
+    if params['bucket'] is not None and params['bucket'] not in BUCKET_FORMATS:
+        raise QueryError(f"bucket must be one of: {', '.join(BUCKET_FORMATS)}")
+    return params
+
+def read_counters(session):
+    """
+    Loads the running counters maintained at ingest time.
+
+    Returns:
+        dict: Mapping of dimension to a {key: count} breakdown
+    """
+    breakdowns = {dimension: {} for dimension in COUNTER_DIMENSIONS}
+    rows = session.execute(
+        select(EventCounter.dimension, EventCounter.key, EventCounter.count)
+        .where(EventCounter.count > 0)
+    )
+    for dimension, key, count in rows:
+        breakdowns.setdefault(dimension, {})[key] = count
+    return breakdowns
+
+def count_since(session, since):
+    """Count events at or after `since` using the datetime index."""
+    return session.execute(
+        select(func.count()).select_from(Event).where(Event.datetime >= since)
+    ).scalar_one()
+
+def window_breakdowns(session, since=None, until=None):
+    """
+    Computes status, incident type and channel breakdowns for a time window
+    with a single grouped query. Like the running counters, the status
+    breakdown counts events per unit state they list.
+
+    Returns:
+        dict: total plus `status`, `type` and `channel` breakdowns
+    """
+    stmt = select(Event.status, Event.channel, Event.title, func.count())
+    if since is not None:
+        stmt = stmt.where(Event.datetime >= since)
+    if until is not None:
+        stmt = stmt.where(Event.datetime < until)
+    stmt = stmt.group_by(Event.status, Event.channel, Event.title)
+
+    total = 0
+    breakdowns = {dimension: defaultdict(int) for dimension in COUNTER_DIMENSIONS}
+    for status, channel, title, count in session.execute(stmt):
+        total += count
+        for state in status_states(status):
+            breakdowns['status'][state] += count
+        breakdowns['type'][normalize_incident_type(title)] += count
+        breakdowns['channel'][channel or ''] += count
+
+    result = {dimension: dict(counts) for dimension, counts in breakdowns.items()}
+    result['total'] = total
+    return result
+
+def bucket_expression(bucket):
+    """SQL expression truncating the event datetime to the start of its bucket."""
+    if engine.dialect.name == 'postgresql':
+        return func.to_char(func.date_trunc(bucket, Event.datetime), 'YYYY-MM-DD HH24:MI:SS')
+    return func.strftime(BUCKET_FORMATS[bucket], Event.datetime)
+
+def timeline(session, bucket, since, until=None):
+    """
+    Counts events per hourly or daily bucket between `since` and `until`.
+
+    Returns:
+        list: [{'bucket': 'YYYY-MM-DD HH:MM:SS', 'count': n}, ...] in ascending order
+    """
+    bucket_expr = bucket_expression(bucket)
+    stmt = select(bucket_expr, func.count()).where(Event.datetime >= since)
+    if until is not None:
+        stmt = stmt.where(Event.datetime < until)
+    stmt = stmt.group_by(bucket_expr).order_by(bucket_expr)
+    return [{'bucket': key, 'count': count} for key, count in session.execute(stmt)]
+
+def compute_stats(session, since=None, until=None, bucket=None, now=None):
+    """
+    Builds the /api/stats payload.
+
+    All-time totals come from the ingest-maintained counters, so their cost does
+    not depend on table size; windowed breakdowns and timelines only scan the
+    requested range of the datetime index.
+
+    Args:
+        session: Database session
+        since, until (datetime): Optional window for the breakdowns
+        bucket (str): Optional timeline granularity, 'hour' or 'day'
+        now (datetime): Reference time for the 24 hour count
+
+    Returns:
+        dict: Statistics including total count and breakdowns
+    """
+    now = now or datetime.now()
+    recent_count = count_since(session, now - timedelta(days=1))
+
+    if since is None and until is None:
+        breakdowns = read_counters(session)
+        # Every event has exactly one channel key; it may list several states
+        total_events = sum(breakdowns['channel'].values())
+    else:
+        breakdowns = window_breakdowns(session, since, until)
+        total_events = breakdowns['total']
+
+    stats = {
+        'total_events': total_events,
+        'status_breakdown': breakdowns['status'],
+        'type_breakdown': breakdowns['type'],
+        'channel_breakdown': breakdowns['channel'],
+        'recent_24h': recent_count
+    }
+
+    if bucket is not None:
+        timeline_since = since or now - DEFAULT_BUCKET_WINDOW[bucket]
+        stats['bucket'] = bucket
+        stats['timeline'] = timeline(session, bucket, timeline_since, until)
+
+    return stats
@@ -0,0 +1,117 @@
+from bs4 import BeautifulSoup
+
+# Optional fast HTML parsers; BeautifulSoup is used when neither is installed
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    HTMLParser = None
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# Minimum number of cells in a data row; shorter rows are headers or padding
+MIN_CELLS = 5
+
+# Runs in the page and returns the cell text of every data row in the first
+# table of each .external-html div, or null when those divs are not present
+TABLE_EXTRACT_SCRIPT = """
+var divs = document.querySelectorAll('div.external-html');
+if (!divs.length) { return null; }
+var rows = [];
+for (var i = 0; i < divs.length; i++) {
+    var table = divs[i].querySelector('table');
+    if (!table) { continue; }
+    var trs = table.querySelectorAll('tr');
+    for (var j = 0; j < trs.length; j++) {
+        var tds = trs[j].querySelectorAll('td');
+        if (tds.length < arguments[0]) { continue; }
+        var cells = [];
+        for (var k = 0; k < arguments[0]; k++) { cells.push(tds[k].textContent); }
+        rows.push(cells);
+    }
+}
+return rows;
+"""
+
+def parse_table_rows_bs4(html, cells=MIN_CELLS):
+    """
+    Extract dashboard table rows with BeautifulSoup's pure-Python parser.
+
+    Args:
+        html (str): Page source
+        cells (int): Cells per data row; shorter rows are skipped
+
+    Returns:
+        list: Rows of `cells` cell strings, or None if the page has no
+        external-html divs
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    divs = soup.find_all('div', class_='external-html')
+    if not divs:
+        return None
+
+    rows = []
+    for div in divs:
+        table = div.find('table')
+        if table is None:
+            continue
+        for row in table.find_all('tr'):
+            cols = row.find_all('td')
+            if len(cols) >= cells:
+                rows.append([col.text for col in cols[:cells]])
+    return rows
+
+def parse_table_rows_selectolax(html, cells=MIN_CELLS):
+    """Same as parse_table_rows_bs4, using selectolax's C parser."""
+    divs = HTMLParser(html).css('div.external-html')
+    if not divs:
+        return None
+
+    rows = []
+    for div in divs:
+        table = div.css_first('table')
+        if table is None:
+            continue
+        for row in table.css('tr'):
+            cols = row.css('td')
+            if len(cols) >= cells:
+                rows.append([col.text(deep=True) for col in cols[:cells]])
+    return rows
+
+def parse_table_rows_lxml(html, cells=MIN_CELLS):
+    """Same as parse_table_rows_bs4, using lxml."""
+    divs = lxml.html.fromstring(html).find_class('external-html')
+    divs = [div for div in divs if div.tag == 'div']
+    if not divs:
+        return None
+
+    rows = []
+    for div in divs:
+        table = next(div.iter('table'), None)
+        if table is None:
+            continue
+        for row in table.iter('tr'):
+            cols = list(row.iter('td'))
+            if len(cols) >= cells:
+                rows.append([col.text_content() for col in cols[:cells]])
+    return rows
+
+def parse_table_rows(html, cells=MIN_CELLS):
+    """
+    Extract dashboard table rows from page HTML with the fastest available parser.
+
+    Args:
+        html (str): Page source
+        cells (int): Cells per data row; shorter rows are skipped
+
+    Returns:
+        list: Rows of `cells` cell strings, or None if the page has no
+        external-html divs
+    """
+    if HTMLParser is not None:
+        return parse_table_rows_selectolax(html, cells)
+    if lxml is not None:
+        return parse_table_rows_lxml(html, cells)
+    return parse_table_rows_bs4(html, cells)